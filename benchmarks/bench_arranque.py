@@ -0,0 +1,115 @@
+"""Tiempo de arranque de la linea de comandos, con un presupuesto que hace fallar el benchmark si se supera.
+
+Ejecuta varias veces "python -X importtime conversor_hojas_coste/main.py ..." con --version, --help y
+"todos --help" y mide el tiempo hasta que termina, que es lo que tarda en aparecer la ayuda o la pregunta
+de confirmacion. Con la salida de -X importtime muestra los modulos que mas tardan en importarse.
+
+Ademas comprueba que estos comandos no importan openpyxl ni pkg_resources, que solo hacen falta para convertir.
+Termina con codigo 1 si se supera el presupuesto o se importa alguno de esos modulos, para poder usarlo
+como comprobacion antes de publicar una version. La comprobacion de los modulos tambien esta en
+tests/test_arranque.py; la del tiempo no, porque depende de la maquina.
+
+Uso:
+    python benchmarks/bench_arranque.py --presupuesto-ms 400
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MAIN = os.path.join(RAIZ, "conversor_hojas_coste", "main.py")
+
+COMANDOS = [
+    ["--version"],
+    ["--help"],
+    ["todos", "--help"],
+]
+
+# Modulos que no se deben importar solo para arrancar
+
+PROHIBIDOS = ["openpyxl", "pkg_resources"]
+
+
+def importaciones(salida_importtime: str) -> dict[str, int]:
+
+    # Tiempo acumulado en microsegundos de cada modulo importado, de la salida de -X importtime:
+    # import time: self [us] | cumulative | imported package
+
+    tiempos: dict[str, int] = {}
+    for linea in salida_importtime.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, modulo = linea[len("import time:") :].split("|")
+        tiempos[modulo.strip()] = int(acumulado)
+    return tiempos
+
+
+def arranque(comando: list[str]) -> tuple[float, dict[str, int]]:
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN, *comando],
+        capture_output=True,
+        text=True,
+    )
+    segundos = time.perf_counter() - inicio
+
+    if proceso.returncode != 0:
+        sys.stderr.write(proceso.stderr)
+        raise RuntimeError(f"main.py {' '.join(comando)} ha fallado")
+
+    return segundos, importaciones(proceso.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--presupuesto-ms", type=float, default=400)
+    parser.add_argument("--modulos", type=int, default=5, help="modulos mas lentos a mostrar")
+    args = parser.parse_args()
+
+    errores: list[str] = []
+
+    print(f"{'comando':>14} {'mediana ms':>11} {'minimo ms':>10}")
+
+    for comando in COMANDOS:
+        medidas = [arranque(comando) for _ in range(args.repeticiones)]
+        segundos = [medida for medida, _ in medidas]
+        modulos = medidas[-1][1]
+
+        mediana_ms = statistics.median(segundos) * 1000
+        nombre = " ".join(comando)
+        print(f"{nombre:>14} {mediana_ms:>11.0f} {min(segundos) * 1000:>10.0f}")
+
+        # Solo los modulos de primer nivel, el acumulado ya incluye sus submodulos
+
+        lentos = sorted(
+            (modulo for modulo in modulos.items() if "." not in modulo[0]),
+            key=lambda modulo: -modulo[1],
+        )[: args.modulos]
+        for modulo, microsegundos in lentos:
+            print(f"{'':>14}   {modulo:<24} {microsegundos / 1000:>7.1f} ms")
+
+        if mediana_ms > args.presupuesto_ms:
+            errores.append(
+                f"{nombre}: {mediana_ms:.0f} ms supera el presupuesto de {args.presupuesto_ms:.0f} ms"
+            )
+        for prohibido in PROHIBIDOS:
+            if prohibido in modulos:
+                errores.append(f"{nombre}: importa {prohibido}")
+
+    for error in errores:
+        print(f"ERROR {error}")
+
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
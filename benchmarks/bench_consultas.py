@@ -0,0 +1,97 @@
+"""Benchmark de "cargar" y "consultar" sobre un conjunto sintetico de proyectos.
+
+Genera N pares de informes de coste y venta con genera_informe, los carga en una base de datos SQLite
+nueva y mide el tiempo de carga y el de cada consulta predefinida, sin filtros y filtrando por un proyecto
+y por un mes. Las consultas filtradas deben usar los indices y tardar pocos milisegundos.
+
+Uso:
+    python benchmarks/bench_consultas.py --proyectos 20 --materiales 20000 --mano-obra 4000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "conversor_hojas_coste"),
+)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch_report import InformeConversiones  # noqa: E402
+from genera_informe import genera_informe  # noqa: E402
+from project_files import busca_proyectos  # noqa: E402
+from warehouse import CONSULTAS, BaseDatosCostes, carga_proyectos, sql_consulta  # noqa: E402
+
+
+def mide(base: BaseDatosCostes, sql: str, parametros: dict, repeticiones: int) -> tuple[float, int]:
+
+    # Mejor tiempo en milisegundos de la consulta y numero de filas
+
+    mejor = float("inf")
+    filas = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        _, resultado = base.consulta(sql, parametros)
+        mejor = min(mejor, time.perf_counter() - inicio)
+        filas = len(resultado)
+    return mejor * 1000, filas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--proyectos", type=int, default=20)
+    parser.add_argument("--materiales", type=int, default=20_000)
+    parser.add_argument("--mano-obra", type=int, default=4_000)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        for i in range(args.proyectos):
+            genera_informe(carpeta, f"{900000 + i:06d}", args.materiales, args.mano_obra, semilla=i)
+
+        proyectos = sorted(busca_proyectos(carpeta, os.listdir(carpeta)).items())
+        filename = os.path.join(carpeta, "costes.sqlite")
+
+        with BaseDatosCostes(filename) as base:
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                carga_proyectos(
+                    proyectos,
+                    base,
+                    False,
+                    False,
+                    InformeConversiones(carpeta, carpeta),
+                    args.jobs,
+                )
+            segundos = time.perf_counter() - inicio
+
+            lineas = args.proyectos * (args.materiales + args.mano_obra)
+            print(
+                f"Carga: {args.proyectos} proyectos, {lineas} lineas en {segundos:.2f} s "
+                f"({lineas / segundos:,.0f} lineas/s), {os.path.getsize(filename) / 2**20:.1f} MiB"
+            )
+
+            filtros = {
+                "sin filtros": (None, None, None),
+                "un proyecto": (proyectos[0][0], None, None),
+                "un mes": (None, "2024-06-01", "2024-06-30"),
+            }
+
+            print(f"{'consulta':<14}{'filtro':<14}{'ms':>10}{'filas':>10}")
+            for nombre in CONSULTAS:
+                for filtro, (ot, desde, hasta) in filtros.items():
+                    sql, parametros = sql_consulta(nombre, ot, desde, hasta)
+                    milisegundos, filas = mide(base, sql, parametros, args.repeticiones)
+                    print(f"{nombre:<14}{filtro:<14}{milisegundos:>10.1f}{filas:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Coste por campo de la conversion de fechas y numeros: codigo anterior frente al modulo decoder.
+
+Toma los textos de fecha y de importe de las secciones de materiales y mano de obra de
+tests/ejemplos/230838coste.txt, en el orden en que aparecen, y los convierte con:
+- datetime.datetime.strptime(texto, "%d/%m/%Y").date() y float(texto.replace(".", "").replace(",", "."))
+- decoder.decode_fecha y decoder.decode_numero
+
+Uso:
+    python benchmarks/bench_decoder.py --repeticiones 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, os.path.join(RAIZ, "conversor_hojas_coste"))
+
+import job_line  # noqa: E402
+import material_line  # noqa: E402
+from decoder import decode_fecha, decode_numero  # noqa: E402
+
+EJEMPLO = os.path.join(RAIZ, "tests", "ejemplos", "230838coste.txt")
+
+
+def fecha_anterior(texto: str) -> datetime.date:
+    return datetime.datetime.strptime(texto, "%d/%m/%Y").date()
+
+
+def numero_anterior(texto: str) -> float:
+    return float(texto.replace(".", "").replace(",", "."))
+
+
+def textos_de_campos(
+    lineas: list[str], campos: list[tuple[int, int]]
+) -> tuple[list[str], list[str]]:
+
+    # Fechas e importes de las lineas con fecha dd/mm/aaaa, el primer campo es el de la fecha
+
+    (inicio_fecha, fin_fecha), *numericos = campos
+    fechas: list[str] = []
+    numeros: list[str] = []
+
+    for linea in lineas:
+        fecha = linea[inicio_fecha:fin_fecha].strip()
+        if len(fecha) != 10 or fecha.count("/") != 2:
+            continue
+        fechas.append(fecha)
+        numeros.extend(linea[inicio:fin].strip() for inicio, fin in numericos)
+
+    return fechas, numeros
+
+
+def nanosegundos_por_campo(funcion, textos: list[str], repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for texto in textos:
+            funcion(texto)
+    return (time.perf_counter() - inicio) / (len(textos) * repeticiones) * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(EJEMPLO, "r", encoding="UTF-16LE") as file:
+        lineas = file.readlines()
+
+    fechas_materiales, numeros_materiales = textos_de_campos(
+        lineas,
+        [
+            (material_line.DESCRIPCION_END, material_line.FECHA_END),
+            (material_line.FECHA_END, material_line.CANTIDAD_END),
+            (material_line.CANTIDAD_END, material_line.PRECIO_END),
+            (material_line.PRECIO_END, material_line.IMPORTE_END),
+        ],
+    )
+    fechas_mano_obra, numeros_mano_obra = textos_de_campos(
+        lineas,
+        [
+            (job_line.OPERACION_END, job_line.FECHA_END),
+            (job_line.OPERARIO_NOMBRE_END, job_line.CANTIDAD_END),
+            (job_line.CANTIDAD_END, job_line.PRECIO_END),
+            (job_line.PRECIO_END, job_line.DIETRAS_END),
+            (job_line.DIETRAS_END, job_line.DESPLAZAMIENTO_END),
+            (job_line.DESPLAZAMIENTO_END, job_line.IMPORTE_END),
+        ],
+    )
+
+    fechas = fechas_materiales + fechas_mano_obra
+    numeros = numeros_materiales + numeros_mano_obra
+
+    if list(map(fecha_anterior, fechas)) != list(map(decode_fecha, fechas)):
+        raise RuntimeError("decode_fecha no da las mismas fechas que strptime")
+    if list(map(numero_anterior, numeros)) != list(map(decode_numero, numeros)):
+        raise RuntimeError("decode_numero no da los mismos numeros que float")
+
+    print(f"{'campo':>7} {'textos':>7} {'distintos':>9} {'anterior':>10} {'decoder':>10} {'mejora':>7}")
+
+    for nombre, anterior, nuevo, textos in [
+        ("fecha", fecha_anterior, decode_fecha, fechas),
+        ("numero", numero_anterior, decode_numero, numeros),
+    ]:
+        ns_anterior = nanosegundos_por_campo(anterior, textos, args.repeticiones)
+        ns_nuevo = nanosegundos_por_campo(nuevo, textos, args.repeticiones)
+        print(
+            f"{nombre:>7} {len(textos):>7} {len(set(textos)):>9} {ns_anterior:>8.0f}ns {ns_nuevo:>8.0f}ns {ns_anterior / ns_nuevo:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark de "juntar" sobre un conjunto sintetico de ficheros de OT.
+
+Genera N ficheros xxxxxx_de_ddmmaaaa_a_ddmmaaaa.xlsx (500 por defecto) con el mismo formato que ParseFile
+y mide el tiempo de juntar subconjuntos crecientes. Si el coste es lineal, el tiempo por fila se mantiene
+constante al aumentar el numero de ficheros.
+
+Termina con codigo 1 si el tiempo por fila con todos los ficheros es mas de --maximo-cociente veces el del
+subconjunto mas pequeño (un cuarto de los ficheros). Con un coste cuadratico ese cociente seria de 4.
+
+Uso:
+    python benchmarks/bench_juntar.py --ficheros 500 --maximo-cociente 1.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "conversor_hojas_coste"),
+)
+
+from join_ot import juntar_ficheros  # noqa: E402
+from xlsx_writer import XlsxWriter  # noqa: E402
+
+
+def genera_ficheros_ot(
+    carpeta: str, ficheros: int, materiales: int, mano_obra: int
+) -> list[str]:
+    nombres: list[str] = []
+    fecha = datetime.date(2025, 1, 1)
+
+    for i in range(ficheros):
+        numero_ot = f"{230000 + i:06d}"
+        nombre = os.path.join(carpeta, f"{numero_ot}_de_01012025_a_31122025.xlsx")
+
+        writer = XlsxWriter(nombre)
+        for linea in range(materiales):
+            writer.add_material_row(
+                [
+                    linea + 19,
+                    numero_ot,
+                    f"REF{linea:06d}",
+                    f"MATERIAL SINTETICO {linea}",
+                    fecha + datetime.timedelta(days=linea % 365),
+                    float(linea % 17 + 1),
+                    1.25,
+                    1.25 * (linea % 17 + 1),
+                    1.5,
+                    1.5 * (linea % 17 + 1),
+                ]
+            )
+        for linea in range(mano_obra):
+            writer.add_job_row(
+                [
+                    linea + materiales + 40,
+                    numero_ot,
+                    "1",
+                    "MONTAJE",
+                    fecha + datetime.timedelta(days=linea % 365),
+                    str(linea % 120),
+                    f"OPERARIO SINTETICO {linea % 120}",
+                    8.0,
+                    25.0,
+                    200.0,
+                    0.0,
+                    0.0,
+                    30.0,
+                    240.0,
+                    0.0,
+                    0.0,
+                ]
+            )
+        writer.close()
+        nombres.append(nombre)
+
+    return nombres
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ficheros", type=int, default=500)
+    parser.add_argument("--materiales", type=int, default=40)
+    parser.add_argument("--mano-obra", type=int, default=20)
+    parser.add_argument("--maximo-cociente", type=float, default=1.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        print(f"Generando {args.ficheros} ficheros de OT en {carpeta}...")
+        ficheros = genera_ficheros_ot(
+            carpeta, args.ficheros, args.materiales, args.mano_obra
+        )
+
+        filas_por_fichero = args.materiales + args.mano_obra
+        salida = os.path.join(carpeta, "OT_juntadas.xlsx")
+
+        print(f"{'ficheros':>9} {'filas':>9} {'segundos':>9} {'us/fila':>9}")
+
+        por_fila: list[float] = []
+
+        n = max(1, args.ficheros // 4)
+        while True:
+            n = min(n, args.ficheros)
+
+            # La salida de juntar_ficheros se descarta, solo interesa el tiempo
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, "w")
+            inicio = time.perf_counter()
+            try:
+                juntar_ficheros(ficheros[:n], salida, False, False)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            segundos = time.perf_counter() - inicio
+
+            filas = n * filas_por_fichero
+            por_fila.append(segundos / filas)
+            print(
+                f"{n:>9} {filas:>9} {segundos:>9.2f} {segundos / filas * 1e6:>9.1f}"
+            )
+
+            if n == args.ficheros:
+                break
+            n *= 2
+
+    cociente = por_fila[-1] / por_fila[0]
+    print(f"Tiempo por fila con todos los ficheros / con los menos: {cociente:.2f}")
+    if cociente > args.maximo_cociente:
+        print(
+            f"ERROR el tiempo por fila crece {cociente:.2f} veces, más de {args.maximo_cociente:.2f}: "
+            "juntar no es lineal"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
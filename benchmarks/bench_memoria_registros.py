@@ -0,0 +1,123 @@
+"""Memoria de las lineas parseadas como objetos MaterialLine / JobLine frente al almacen por columnas.
+
+Toma las lineas de las secciones de materiales y mano de obra de tests/ejemplos/230838coste.txt,
+las repite hasta el numero de lineas pedido y mide con tracemalloc la memoria que ocupan:
+- una lista con un objeto MaterialLine / JobLine por linea, como se guardaban antes
+- un AlmacenColumnas llenado con MaterialLine.parse_batch / JobLine.parse_batch
+
+Uso:
+    python benchmarks/bench_memoria_registros.py --lineas 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, os.path.join(RAIZ, "conversor_hojas_coste"))
+
+from job_line import JobLine, FORMATO_MANO_OBRA  # noqa: E402
+from material_line import MaterialLine, FORMATO_MATERIALES  # noqa: E402
+from parse_file import TAMANO_LOTE  # noqa: E402
+from record_store import AlmacenColumnas  # noqa: E402
+
+EJEMPLO = os.path.join(RAIZ, "tests", "ejemplos", "230838coste.txt")
+
+
+def lineas_de_seccion(lineas: list[str], inicio: str, fin: str) -> list[str]:
+    primera = next(i for i, l in enumerate(lineas) if inicio in l) + 3
+    ultima = next(i for i, l in enumerate(lineas) if i > primera and l.startswith(fin))
+    return lineas[primera:ultima]
+
+
+def como_objetos(clase, lineas: list[str]) -> list:
+    objetos = []
+    for numero, linea in enumerate(lineas):
+        try:
+            objetos.append(clase.parse(linea, linea, "", numero, True, False))
+        except (clase.NotValidError, clase.IncongruentError):
+            pass
+    return objetos
+
+
+def como_columnas(clase, formato, lineas: list[str]) -> AlmacenColumnas:
+    almacen = AlmacenColumnas(formato)
+    for inicio in range(0, len(lineas), TAMANO_LOTE):
+        lote = lineas[inicio : inicio + TAMANO_LOTE]
+        columnas, _ = clase.parse_batch(
+            lote,
+            [""] * len(lote),
+            list(range(inicio, inicio + len(lote))),
+            True,
+            False,
+        )
+        almacen.extend(columnas)
+    return almacen
+
+
+def memoria(funcion, *args) -> tuple[int, int]:
+
+    # Memoria que sigue ocupada por el resultado de la funcion y numero de filas
+
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcion(*args)
+    gc.collect()
+    ocupada, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ocupada, len(resultado)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lineas", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with open(EJEMPLO, "r", encoding="UTF-16LE") as file:
+        lineas = file.readlines()
+
+    secciones = [
+        (
+            "materiales",
+            MaterialLine,
+            FORMATO_MATERIALES,
+            lineas_de_seccion(lineas, "M A T E R I A L", " " * 69 + "___"),
+        ),
+        (
+            "mano de obra",
+            JobLine,
+            FORMATO_MANO_OBRA,
+            lineas_de_seccion(lineas, "M A N O   D E   O B R A", " " * 68 + "___"),
+        ),
+    ]
+
+    print(f"{'seccion':>13} {'filas':>9} {'objetos':>10} {'columnas':>10} {'mejora':>7}")
+
+    for nombre, clase, formato, seccion in secciones:
+        repetidas = (seccion * (args.lineas // len(seccion) + 1))[: args.lineas]
+
+        # Las lineas se copian para que los textos no compartan memoria con las del ejemplo
+        repetidas = [linea[:1] + linea[1:] for linea in repetidas]
+
+        bytes_objetos, filas_objetos = memoria(como_objetos, clase, repetidas)
+        bytes_columnas, filas_columnas = memoria(
+            como_columnas, clase, formato, repetidas
+        )
+
+        if filas_objetos != filas_columnas:
+            raise RuntimeError(
+                f"El almacen tiene {filas_columnas} filas y la lista de objetos {filas_objetos}"
+            )
+
+        print(
+            f"{nombre:>13} {filas_objetos:>9} {bytes_objetos / 2**20:>8.1f}MB {bytes_columnas / 2**20:>8.1f}MB {bytes_objetos / bytes_columnas:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
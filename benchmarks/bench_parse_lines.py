@@ -0,0 +1,134 @@
+"""Benchmark del parseo linea a linea frente al parseo por lotes de las secciones de un informe.
+
+Toma las lineas de las secciones de materiales y mano de obra de tests/ejemplos/230838coste.txt,
+las repite hasta el numero de lineas pedido y las parsea de tres formas:
+- con MaterialLine.parse / JobLine.parse tal como estaban antes del parseo por lotes (parser_original.py),
+- con MaterialLine.parse / JobLine.parse actuales,
+- con MaterialLine.parse_batch / JobLine.parse_batch en lotes del mismo tamaño que usa ParseFile.
+La mejora es la del parseo por lotes frente al parser original. Termina con codigo 1 si en alguna seccion
+es menor que --minimo.
+
+Uso:
+    python benchmarks/bench_parse_lines.py --lineas 1000000 --minimo 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, os.path.join(RAIZ, "conversor_hojas_coste"))
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from job_line import JobLine  # noqa: E402
+from material_line import MaterialLine  # noqa: E402
+from parse_file import TAMANO_LOTE  # noqa: E402
+import parser_original  # noqa: E402
+
+EJEMPLO = os.path.join(RAIZ, "tests", "ejemplos", "230838coste.txt")
+
+
+def lineas_de_seccion(lineas: list[str], inicio: str, fin: str) -> list[str]:
+    primera = next(i for i, l in enumerate(lineas) if inicio in l) + 3
+    ultima = next(i for i, l in enumerate(lineas) if i > primera and l.startswith(fin))
+    return lineas[primera:ultima]
+
+
+def por_linea(clase, lineas: list[str]) -> int:
+    validas = 0
+    for numero, linea in enumerate(lineas):
+        try:
+            clase.parse(linea, linea, "", numero, True, False)
+            validas += 1
+        except (clase.NotValidError, clase.IncongruentError):
+            pass
+    return validas
+
+
+def por_lotes(clase, lineas: list[str]) -> int:
+    validas = 0
+    for inicio in range(0, len(lineas), TAMANO_LOTE):
+        lote = lineas[inicio : inicio + TAMANO_LOTE]
+        columnas, _ = clase.parse_batch(
+            lote,
+            [""] * len(lote),
+            list(range(inicio, inicio + len(lote))),
+            True,
+            False,
+        )
+        validas += len(columnas["line_number"])
+    return validas
+
+
+def mide(funcion, clase, lineas: list[str]) -> tuple[float, int]:
+    inicio = time.perf_counter()
+    validas = funcion(clase, lineas)
+    return time.perf_counter() - inicio, validas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lineas", type=int, default=1_000_000)
+    parser.add_argument("--minimo", type=float, default=5.0, help="mejora minima frente al parser original")
+    args = parser.parse_args()
+
+    with open(EJEMPLO, "r", encoding="UTF-16LE") as file:
+        lineas = file.readlines()
+
+    secciones = [
+        (
+            "materiales",
+            parser_original.MaterialLine,
+            MaterialLine,
+            lineas_de_seccion(lineas, "M A T E R I A L", " " * 69 + "___"),
+        ),
+        (
+            "mano de obra",
+            parser_original.JobLine,
+            JobLine,
+            lineas_de_seccion(lineas, "M A N O   D E   O B R A", " " * 68 + "___"),
+        ),
+    ]
+
+    print(
+        f"{'seccion':>13} {'lineas':>9} {'original':>10} {'por linea':>10} {'por lotes':>10} {'mejora':>7}"
+    )
+
+    errores: list[str] = []
+
+    for nombre, original, clase, seccion in secciones:
+        repetidas = (seccion * (args.lineas // len(seccion) + 1))[: args.lineas]
+
+        segundos_original, validas_original = mide(por_linea, original, repetidas)
+        segundos_linea, validas_linea = mide(por_linea, clase, repetidas)
+        segundos_lote, validas_lote = mide(por_lotes, clase, repetidas)
+
+        if not validas_original == validas_linea == validas_lote:
+            raise RuntimeError(
+                f"Lineas validas: {validas_original} con el parser original, {validas_linea} por linea "
+                f"y {validas_lote} por lotes"
+            )
+
+        mejora = segundos_original / segundos_lote
+        print(
+            f"{nombre:>13} {len(repetidas):>9} {segundos_original:>9.2f}s {segundos_linea:>9.2f}s "
+            f"{segundos_lote:>9.2f}s {mejora:>6.1f}x"
+        )
+
+        if mejora < args.minimo:
+            errores.append(f"{nombre}: mejora de {mejora:.1f}x, menor que {args.minimo:.1f}x")
+
+    for error in errores:
+        print(f"ERROR {error}")
+
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark del servicio "servir" frente a ejecutar el programa para cada proyecto.
+
+Genera N pares de informes de coste y venta con genera_informe, cada uno en su carpeta, y mide:
+- en frio: "python main.py todos --si" en la carpeta de cada proyecto, uno detras de otro, que paga cada vez
+  el arranque del interprete y la importacion de openpyxl;
+- en caliente: las mismas conversiones pedidas al servicio por ruta, con 1 cliente y con varios a la vez.
+Al final muestra las metricas del servicio (/metrics).
+
+Uso:
+    python benchmarks/bench_servir.py --proyectos 8 --materiales 2000 --mano-obra 400 --clientes 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "conversor_hojas_coste"),
+)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conversion_service import crea_servidor  # noqa: E402
+from genera_informe import genera_informe  # noqa: E402
+
+MAIN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "conversor_hojas_coste", "main.py"
+)
+
+
+def pide(url: str, carpeta: str, numero_ot: str) -> float:
+
+    # Segundos que tarda el servicio en devolver el xlsx del proyecto
+
+    datos = json.dumps(
+        {
+            "coste": os.path.join(carpeta, f"{numero_ot}coste.txt"),
+            "venta": os.path.join(carpeta, f"{numero_ot}venta.txt"),
+        }
+    ).encode()
+    peticion = urllib.request.Request(
+        f"{url}/convertir", data=datos, headers={"Content-Type": "application/json"}
+    )
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(peticion) as respuesta:
+        respuesta.read()
+    return time.perf_counter() - inicio
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--proyectos", type=int, default=8)
+    parser.add_argument("--materiales", type=int, default=2_000)
+    parser.add_argument("--mano-obra", type=int, default=400)
+    parser.add_argument("--clientes", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as raiz:
+        proyectos = []
+        for i in range(args.proyectos):
+            numero_ot = f"{900000 + i:06d}"
+            carpeta = os.path.join(raiz, numero_ot)
+            os.mkdir(carpeta)
+            genera_informe(carpeta, numero_ot, args.materiales, args.mano_obra, semilla=i)
+            proyectos.append((carpeta, numero_ot))
+
+        frio = []
+        for carpeta, _ in proyectos:
+            inicio = time.perf_counter()
+            subprocess.run(
+                [sys.executable, MAIN, "todos", "--si", "-j", "1"],
+                cwd=carpeta,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+            frio.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        servidor = crea_servidor("127.0.0.1", 0, args.jobs, args.proyectos * 2)
+        arranque = time.perf_counter() - inicio
+        url = f"http://127.0.0.1:{servidor.server_address[1]}"
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+        try:
+            caliente = [pide(url, carpeta, numero_ot) for carpeta, numero_ot in proyectos]
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clientes) as clientes:
+                concurrente = list(
+                    clientes.map(lambda proyecto: pide(url, *proyecto), proyectos)
+                )
+            total_concurrente = time.perf_counter() - inicio
+
+            with urllib.request.urlopen(f"{url}/metrics") as respuesta:
+                metricas = json.load(respuesta)
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+
+    print(
+        f"{args.proyectos} proyectos de {args.materiales} líneas de materiales "
+        f"y {args.mano_obra} de mano de obra"
+    )
+    print(f"Arranque del servicio con {args.jobs} procesos: {arranque:.3f} s")
+    print(f"  {'modo':<28} {'media s':>9} {'mediana s':>10} {'total s':>9}")
+    for nombre, tiempos, total in (
+        ("en frío (todos)", frio, sum(frio)),
+        ("en caliente, 1 cliente", caliente, sum(caliente)),
+        (f"en caliente, {args.clientes} clientes", concurrente, total_concurrente),
+    ):
+        print(
+            f"  {nombre:<28} {statistics.mean(tiempos):>9.3f} "
+            f"{statistics.median(tiempos):>10.3f} {total:>9.3f}"
+        )
+    print("Métricas del servicio:")
+    print(json.dumps(metricas["convertir"], indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Mide por separado cada etapa de la conversion sobre un informe sintetico y guarda los resultados en JSON.
+
+Genera con genera_informe.py un par de informes de coste y venta del tamaño pedido y mide, cada etapa
+en su propio proceso para que el pico de memoria sea solo el suyo:
+- parseo_por_linea: MaterialLine.parse / JobLine.parse sobre las filas de las secciones
+- parseo_por_lotes: MaterialLine.parse_batch / JobLine.parse_batch en lotes de TAMANO_LOTE filas
+- parse_file: ParseFile completo, de los ficheros de texto al xlsx
+- escritura_xlsx: XlsxWriter con las filas ya parseadas
+- juntar: juntar_ot_en_workbook con el xlsx generado por ParseFile
+
+Para cada etapa se guarda el tiempo, las lineas por segundo y el pico de memoria (RSS) del proceso.
+Con --comparar se muestra la diferencia con un resultado anterior, para ver las regresiones entre versiones.
+
+Uso:
+    python benchmarks/bench_suite.py --materiales 100000 --mano-obra 20000 --salida actual.json
+    python benchmarks/bench_suite.py --comparar anterior.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, os.path.join(RAIZ, "conversor_hojas_coste"))
+
+from genera_informe import genera_informe  # noqa: E402
+
+NUMERO_OT = "900000"
+
+ETAPAS = [
+    "parseo_por_linea",
+    "parseo_por_lotes",
+    "parse_file",
+    "escritura_xlsx",
+    "juntar",
+]
+
+
+def rss_pico_mb() -> float | None:
+
+    # Pico de memoria residente del proceso. El modulo resource no existe en Windows.
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        pico /= 1024
+    return round(pico / 1024, 1)
+
+
+def filas_de_secciones(fichero: str) -> tuple[list[str], list[str]]:
+
+    # Filas de materiales y de mano de obra del informe, clasificadas igual que en ParseFile
+
+    from line_classifier import ClasificadorLineas, TipoLinea
+
+    with open(fichero, "r", encoding="UTF-16LE") as file:
+        lineas = file.readlines()
+
+    materiales: list[str] = []
+    mano_obra: list[str] = []
+    for tipo, desde, hasta in ClasificadorLineas().segmentos(lineas):
+        if tipo is TipoLinea.FILA_MATERIAL:
+            materiales.extend(lineas[desde:hasta])
+        elif tipo is TipoLinea.FILA_MANO_OBRA:
+            mano_obra.extend(lineas[desde:hasta])
+
+    return materiales, mano_obra
+
+
+def secciones(coste: str, venta: str) -> list[tuple[type, list[str], list[str]]]:
+    from job_line import JobLine
+    from material_line import MaterialLine
+
+    materiales_coste, mano_obra_coste = filas_de_secciones(coste)
+    materiales_venta, mano_obra_venta = filas_de_secciones(venta)
+
+    return [
+        (MaterialLine, materiales_coste, materiales_venta),
+        (JobLine, mano_obra_coste, mano_obra_venta),
+    ]
+
+
+def etapa_parseo_por_linea(coste: str, venta: str) -> tuple[float, int]:
+    filas = secciones(coste, venta)
+
+    inicio = time.perf_counter()
+    lineas = 0
+    for clase, filas_coste, filas_venta in filas:
+        for numero, (linea_coste, linea_venta) in enumerate(zip(filas_coste, filas_venta)):
+            try:
+                clase.parse(linea_coste, linea_coste, linea_venta, numero, True, True)
+            except (clase.NotValidError, clase.IncongruentError):
+                pass
+        lineas += len(filas_coste)
+
+    return time.perf_counter() - inicio, lineas
+
+
+def etapa_parseo_por_lotes(coste: str, venta: str) -> tuple[float, int]:
+    from parse_file import TAMANO_LOTE
+
+    filas = secciones(coste, venta)
+
+    inicio = time.perf_counter()
+    lineas = 0
+    for clase, filas_coste, filas_venta in filas:
+        for desde in range(0, len(filas_coste), TAMANO_LOTE):
+            hasta = desde + TAMANO_LOTE
+            clase.parse_batch(
+                filas_coste[desde:hasta],
+                filas_venta[desde:hasta],
+                list(range(desde, min(hasta, len(filas_coste)))),
+                True,
+                True,
+            )
+        lineas += len(filas_coste)
+
+    return time.perf_counter() - inicio, lineas
+
+
+def etapa_parse_file(coste: str, venta: str) -> tuple[float, int]:
+    from parse_file import ParseFile
+
+    with open(coste, "r", encoding="UTF-16LE") as file:
+        lineas = sum(1 for _ in file)
+
+    inicio = time.perf_counter()
+    ParseFile(coste, venta, NUMERO_OT, False, False)
+    return time.perf_counter() - inicio, lineas
+
+
+def etapa_escritura_xlsx(coste: str, venta: str) -> tuple[float, int]:
+    from parse_file import ParseFile
+    from xlsx_writer import XlsxWriter
+
+    materiales, mano_obra = ParseFile(
+        coste, venta, NUMERO_OT, False, False, conserva_filas=True
+    )
+
+    inicio = time.perf_counter()
+    writer = XlsxWriter("escritura_xlsx.xlsx")
+    writer.add_material_rows(materiales, NUMERO_OT)
+    writer.add_job_rows(mano_obra, NUMERO_OT)
+    writer.close()
+    return time.perf_counter() - inicio, len(materiales) + len(mano_obra)
+
+
+def etapa_juntar(coste: str, venta: str) -> tuple[float, int]:
+    from join_ot import juntar_ot_en_workbook
+    from xlsx_writer import XlsxWriter
+
+    fichero_ot = next(
+        fichero
+        for fichero in sorted(os.listdir("."))
+        if fichero.startswith(f"{NUMERO_OT}_de_") and fichero.endswith(".xlsx")
+    )
+
+    inicio = time.perf_counter()
+    writer = XlsxWriter("OT_juntadas.xlsx")
+    filas_materiales, filas_mano_obra = juntar_ot_en_workbook(
+        writer, fichero_ot, False, False
+    )
+    writer.close()
+    return time.perf_counter() - inicio, filas_materiales + filas_mano_obra
+
+
+def ejecuta_etapa(etapa: str, coste: str, venta: str) -> dict:
+
+    # Se ejecuta en el proceso hijo; lo que imprime la conversion se descarta
+
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        segundos, lineas = globals()[f"etapa_{etapa}"](coste, venta)
+
+    return {
+        "segundos": round(segundos, 4),
+        "lineas": lineas,
+        "lineas_por_segundo": round(lineas / segundos) if segundos > 0 else None,
+        "rss_pico_mb": rss_pico_mb(),
+    }
+
+
+def commit_actual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def muestra(resultados: dict, anterior: dict | None) -> None:
+    print(f"{'etapa':>17} {'lineas':>9} {'segundos':>9} {'lineas/s':>10} {'RSS MB':>8} {'vs anterior':>12}")
+
+    for etapa, medida in resultados["etapas"].items():
+        comparacion = ""
+        if anterior is not None:
+            medida_anterior = anterior.get("etapas", {}).get(etapa)
+            if medida_anterior and medida_anterior.get("lineas_por_segundo") and medida["lineas_por_segundo"]:
+                comparacion = f"{medida['lineas_por_segundo'] / medida_anterior['lineas_por_segundo']:.2f}x"
+
+        rss = "-" if medida["rss_pico_mb"] is None else f"{medida['rss_pico_mb']:.1f}"
+        print(
+            f"{etapa:>17} {medida['lineas']:>9} {medida['segundos']:>9.3f} {medida['lineas_por_segundo'] or 0:>10} {rss:>8} {comparacion:>12}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--materiales", type=int, default=100_000)
+    parser.add_argument("--mano-obra", type=int, default=20_000)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=ETAPAS)
+    parser.add_argument("--salida", help="fichero JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="fichero JSON con un resultado anterior")
+
+    # Uso interno: ejecuta una sola etapa en la carpeta actual e imprime su resultado en JSON
+
+    parser.add_argument("--etapa", choices=ETAPAS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    coste = f"{NUMERO_OT}coste.txt"
+    venta = f"{NUMERO_OT}venta.txt"
+
+    if args.etapa is not None:
+        print(json.dumps(ejecuta_etapa(args.etapa, coste, venta)))
+        return
+
+    from parse_file import VERSION_CONVERSOR
+
+    resultados = {
+        "version": VERSION_CONVERSOR,
+        "commit": commit_actual(),
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "materiales": args.materiales,
+            "mano_obra": args.mano_obra,
+            "semilla": args.semilla,
+        },
+        "etapas": {},
+    }
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        print(f"Generando informe sintetico en {carpeta}...")
+        genera_informe(carpeta, NUMERO_OT, args.materiales, args.mano_obra, args.semilla)
+
+        # juntar usa el xlsx que genera parse_file
+
+        etapas = [etapa for etapa in ETAPAS if etapa in args.etapas]
+        if "juntar" in etapas and "parse_file" not in etapas:
+            etapas.insert(etapas.index("juntar"), "parse_file")
+
+        for etapa in etapas:
+            proceso = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--etapa", etapa],
+                cwd=carpeta,
+                capture_output=True,
+                text=True,
+            )
+            if proceso.returncode != 0:
+                sys.stderr.write(proceso.stderr)
+                raise RuntimeError(f"La etapa {etapa} ha fallado")
+            resultados["etapas"][etapa] = json.loads(proceso.stdout.splitlines()[-1])
+
+    anterior = None
+    if args.comparar is not None:
+        with open(args.comparar, "r", encoding="utf-8") as file:
+            anterior = json.load(file)
+
+    muestra(resultados, anterior)
+
+    if args.salida is not None:
+        with open(args.salida, "w", encoding="utf-8") as file:
+            json.dump(resultados, file, indent=2)
+        print(f"Resultados guardados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark del comando "vigilar": tiempo desde que llegan los informes hasta que esta su xlsx.
+
+Genera N pares de informes de coste y venta con genera_informe en una carpeta aparte y, con la vigilancia
+en marcha sobre otra carpeta, los mueve a ella de uno en uno (como los dejaria el ERP) cada --cada segundos.
+Para cada proyecto mide el tiempo desde que llegan sus dos informes hasta que su xlsx esta guardado. Ese tiempo es,
+como minimo, --espera (para dar los informes por completos) mas hasta un --intervalo y la conversion.
+
+Uso:
+    python benchmarks/bench_vigilar.py --proyectos 8 --materiales 2000 --mano-obra 400 --cada 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "conversor_hojas_coste"),
+)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from folder_watch import VigilanteCarpeta  # noqa: E402
+from genera_informe import genera_informe  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--proyectos", type=int, default=8)
+    parser.add_argument("--materiales", type=int, default=2_000)
+    parser.add_argument("--mano-obra", type=int, default=400)
+    parser.add_argument("--cada", type=float, default=0.5)
+    parser.add_argument("--intervalo", type=float, default=0.5)
+    parser.add_argument("--espera", type=float, default=1.0)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as raiz:
+        preparados = os.path.join(raiz, "erp")
+        vigilada = os.path.join(raiz, "compartida")
+        os.mkdir(preparados)
+        os.mkdir(vigilada)
+
+        numeros_ot = [f"{900000 + i:06d}" for i in range(args.proyectos)]
+        for i, numero_ot in enumerate(numeros_ot):
+            genera_informe(preparados, numero_ot, args.materiales, args.mano_obra, semilla=i)
+
+        vigilante = VigilanteCarpeta(
+            vigilada,
+            vigilada,
+            args.jobs,
+            intervalo=args.intervalo,
+            espera=args.espera,
+        )
+        hilo = threading.Thread(target=vigilante.vigila)
+
+        # La salida de las conversiones no se muestra
+
+        with open(os.devnull, "w") as nulo:
+            salida_original, sys.stdout = sys.stdout, nulo
+            try:
+                hilo.start()
+                llegadas = {}
+                for numero_ot in numeros_ot:
+                    for tipo in ("coste", "venta"):
+                        nombre = f"{numero_ot}{tipo}.txt"
+                        os.replace(
+                            os.path.join(preparados, nombre), os.path.join(vigilada, nombre)
+                        )
+                    llegadas[numero_ot] = time.perf_counter()
+                    time.sleep(args.cada)
+
+                # Un proyecto esta listo cuando la vigilancia ha recogido su conversion terminada
+
+                latencias = {}
+                while len(latencias) < len(numeros_ot):
+                    for numero_ot in list(vigilante.hechos):
+                        if numero_ot not in latencias:
+                            latencias[numero_ot] = time.perf_counter() - llegadas[numero_ot]
+                    time.sleep(0.01)
+            finally:
+                vigilante.para()
+                hilo.join()
+                vigilante.close()
+                sys.stdout = salida_original
+
+    tiempos = list(latencias.values())
+    print(
+        f"{args.proyectos} proyectos de {args.materiales} líneas de materiales "
+        f"y {args.mano_obra} de mano de obra, uno cada {args.cada} s"
+    )
+    print(
+        f"Intervalo {args.intervalo} s, espera {args.espera} s, {args.jobs} procesos; "
+        f"convertidos: {vigilante.convertidos}, con errores: {vigilante.con_errores}"
+    )
+    print(
+        f"Hasta que está el xlsx: media {statistics.mean(tiempos):.3f} s, "
+        f"mediana {statistics.median(tiempos):.3f} s, máximo {max(tiempos):.3f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Genera pares sinteticos de informes de coste y venta con el mismo formato que los reales.
+
+Los ficheros tienen la cabecera del informe, los encabezados y totales de las secciones de materiales y
+mano de obra, saltos de pagina "Pág." con la cabecera repetida, y las columnas de ancho fijo que leen
+MaterialLine y JobLine. Estan en UTF-16LE con BOM, y coste y venta tienen las mismas lineas: solo cambian
+los precios e importes. Se escriben linea a linea, asi que pueden ser de cualquier tamaño.
+
+Uso:
+    python benchmarks/genera_informe.py --materiales 100000 --mano-obra 20000 --carpeta /tmp/informes
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import random
+from typing import Iterator, TextIO
+
+LINEAS_POR_PAGINA = 60
+
+FECHA_DESDE = datetime.date(2024, 3, 20)
+FECHA_HASTA = datetime.date(2025, 3, 20)
+
+# Textos de los que se eligen las referencias, descripciones, operaciones y operarios.
+# En los informes reales se repiten mucho, asi que se usa un numero limitado de cada uno.
+
+PREFIJOS_REFERENCIA = ["PHO", "EUR", "DAN", "LEG", "OMR", "WAG", "CAB", "EDH", "SCH", "ABB"]
+PALABRAS_DESCRIPCION = [
+    "BORNE", "TAPA", "FINAL", "CABLE", "RELE", "PUENTE", "ENCHUFABLE", "INTERRUPTOR", "CAJA",
+    "FUSIBLE", "CONVERT.", "FRECUENCIA", "GRIS", "AZUL", "CPR", "LH", "4P", "125A", "2,5", "1,5/S",
+    "PASAMUROS", "REP.", "MOD.", "CARRIL", "TIERRA", "CONEXION", "PANEL", "EMERGENCIA", "SALZER",
+]
+OPERACIONES = [
+    "ARMADO DE CUADRO ELECTRIC", "CABLEADO CUADRO ELECTRIC", "TEST DE PUNTOS CUADRO DI",
+    "VERIFICAR MATERIAL CUADR", "PROGRAMACION PLC", "PUESTA EN MARCHA", "MONTAJE EN OBRA",
+    "TUNNEL", "ESQUEMAS ELECTRICOS", "DESPLAZAMIENTO A OBRA",
+]
+NOMBRES = ["GARCIA", "LOPEZ", "OLMO", "RIVERA", "MARTIN", "SANCHEZ", "PEREZ", "GOMEZ", "RUIZ", "DIAZ"]
+
+
+def numero_es(valor: float, decimales: int = 2) -> str:
+
+    # 1234.5 -> "1.234,50"
+
+    return f"{valor:,.{decimales}f}".translate(str.maketrans(",.", ".,"))
+
+
+def cabecera(numero_ot: str, bom: bool) -> list[str]:
+    return [
+        f"{chr(0xFEFF) if bom else ''}   Hoja de Coste Nº {numero_ot}\n",
+        "\n",
+        " INSTALACIONES SINTETICAS, SL" + " " * 85 + "jueves, 20 de marzo de 2025\n",
+        "\n",
+        "      Cliente     230 CLIENTE SINTETICO, SL" + " " * 34 + "Responsable\n",
+        f"      Desde Fecha  {FECHA_DESDE:%d/%m/%Y}      Hasta Fecha  {FECHA_HASTA:%d/%m/%Y}"
+        "                 Valoración Coste\n",
+        f"      Descripción {numero_ot} PROYECTO SINTETICO\n",
+        "                  Oferta nº 1000v1\n",
+        "                  - ENTREGA DE CUADROS ELÉCTRICOS --> 21.906,69€\n",
+    ]
+
+
+class _Catalogo:
+    """Referencias, descripciones y operarios elegidos al azar con una semilla fija."""
+
+    def __init__(self, aleatorio: random.Random, referencias: int, operarios: int):
+        self.aleatorio = aleatorio
+        self.materiales: list[tuple[str, str, float]] = []
+        for _ in range(referencias):
+            referencia = aleatorio.choice(PREFIJOS_REFERENCIA) + str(
+                aleatorio.randrange(10**5, 10**10)
+            )
+            descripcion = " ".join(aleatorio.choices(PALABRAS_DESCRIPCION, k=5))[:40]
+            precio = round(aleatorio.lognormvariate(1, 1.5), 3)
+            self.materiales.append((referencia[:16], descripcion, precio))
+
+        self.operarios = [
+            (
+                str(aleatorio.randrange(1, 200)),
+                f"{aleatorio.choice(NOMBRES)} {aleatorio.choice(NOMBRES)}, OPERARIO"[:24],
+            )
+            for _ in range(operarios)
+        ]
+
+    def fecha(self) -> str:
+        dias = (FECHA_HASTA - FECHA_DESDE).days
+        return f"{FECHA_DESDE + datetime.timedelta(days=self.aleatorio.randrange(dias)):%d/%m/%Y}"
+
+
+def _filas_materiales(
+    catalogo: _Catalogo, filas: int, totales: list[float]
+) -> Iterator[tuple[str, str]]:
+    aleatorio = catalogo.aleatorio
+    for _ in range(filas):
+        referencia, descripcion, precio = aleatorio.choice(catalogo.materiales)
+        if aleatorio.random() < 0.05:
+            referencia = ""
+        cantidad = float(aleatorio.choice([1, 1, 2, 4, 5, 10, 25, 50, 100, -1, -5]))
+        precio_venta = round(precio * 1.3, 2)
+        importe = round(cantidad * precio, 2)
+        importe_venta = round(cantidad * precio_venta, 2)
+        totales[0] += cantidad
+        totales[1] += importe
+        totales[2] += importe_venta
+
+        comun = f"{referencia:<16} {descripcion:<40} {catalogo.fecha()}{numero_es(cantidad):>12}"
+        yield (
+            f"{comun}{numero_es(precio, 3):>16}{numero_es(importe):>16}\n",
+            f"{comun}{numero_es(precio_venta):>16}{numero_es(importe_venta):>16}\n",
+        )
+
+
+def _filas_mano_obra(
+    catalogo: _Catalogo, filas: int, totales: list[float]
+) -> Iterator[tuple[str, str]]:
+    aleatorio = catalogo.aleatorio
+    for _ in range(filas):
+        operacion = aleatorio.choice(OPERACIONES)[:24]
+        operario_id, operario = aleatorio.choice(catalogo.operarios)
+        horas = aleatorio.choice([0.5, 1.0, 1.5, 2.0, 4.0, 8.0, 8.0, 8.0])
+        dietas = aleatorio.choice([0.0, 0.0, 0.0, 12.5])
+        importe = round(horas * 25.0, 2)
+        importe_venta = round(horas * 30.0, 2)
+        totales[0] += horas
+        totales[1] += importe
+        totales[2] += importe_venta
+        totales[3] += dietas
+
+        comun = f"{aleatorio.randrange(1, 4):>4} {operacion:<24} {catalogo.fecha()}{operario_id:>5} {operario:<24}{numero_es(horas):>8}"
+        yield (
+            f"{comun}{numero_es(25.0, 3):>8}{numero_es(dietas):>9}{numero_es(0.0):>7}{numero_es(importe):>11}\n",
+            f"{comun}{numero_es(30.0):>8}{numero_es(dietas):>9}{numero_es(0.0):>7}{numero_es(importe_venta):>11}\n",
+        )
+
+
+class _Paginador:
+    """Escribe las lineas de coste y venta a la vez, con un salto de pagina cada LINEAS_POR_PAGINA lineas."""
+
+    def __init__(self, coste: TextIO, venta: TextIO, numero_ot: str):
+        self.coste = coste
+        self.venta = venta
+        self.numero_ot = numero_ot
+        self.pagina = 1
+        self.en_pagina = 0
+
+    def escribe(self, linea_coste: str, linea_venta: str | None = None) -> None:
+        self.coste.write(linea_coste)
+        self.venta.write(linea_coste if linea_venta is None else linea_venta)
+        self.en_pagina += 1
+
+    def fila(self, linea_coste: str, linea_venta: str) -> None:
+        if self.en_pagina >= LINEAS_POR_PAGINA:
+            self.salto_pagina()
+        self.escribe(linea_coste, linea_venta)
+
+    def salto_pagina(self) -> None:
+        self.escribe("\n")
+        self.escribe(" " * 84 + f"Pág. {self.pagina:>5}\n")
+        self.pagina += 1
+        self.en_pagina = 0
+        for linea in cabecera(self.numero_ot, False):
+            self.escribe(linea)
+
+
+def genera_informe(
+    carpeta: str,
+    numero_ot: str,
+    materiales: int,
+    mano_obra: int,
+    semilla: int = 0,
+) -> tuple[str, str]:
+
+    # Escribe xxxxxxcoste.txt y xxxxxxventa.txt en la carpeta y devuelve sus rutas
+
+    aleatorio = random.Random(semilla)
+    catalogo = _Catalogo(aleatorio, referencias=2000, operarios=40)
+
+    fichero_coste = os.path.join(carpeta, f"{numero_ot}coste.txt")
+    fichero_venta = os.path.join(carpeta, f"{numero_ot}venta.txt")
+
+    with open(fichero_coste, "w", encoding="UTF-16LE", newline="") as coste, open(
+        fichero_venta, "w", encoding="UTF-16LE", newline=""
+    ) as venta:
+        paginas = _Paginador(coste, venta, numero_ot)
+
+        for linea in cabecera(numero_ot, True):
+            paginas.escribe(linea)
+
+        paginas.escribe("\n")
+        paginas.escribe("_" * 49 + "M A T E R I A L" + "_" * 49 + "\n")
+        paginas.escribe(
+            "Referencia       Descripción                              Fecha         Cantidad          Precio         Importe\n"
+        )
+        paginas.escribe("_" * 113 + "\n")
+
+        totales = [0.0, 0.0, 0.0]
+        for linea_coste, linea_venta in _filas_materiales(catalogo, materiales, totales):
+            paginas.fila(linea_coste, linea_venta)
+
+        cantidad, importe, importe_venta = totales
+        total_materiales = (importe, importe_venta)
+        paginas.escribe(" " * 69 + "_" * 11 + " " * 17 + "_" * 15 + "\n")
+        paginas.escribe(
+            f"{numero_es(cantidad):>80}{numero_es(importe):>32}\n",
+            f"{numero_es(cantidad):>80}{numero_es(importe_venta):>32}\n",
+        )
+        paginas.escribe("\n")
+
+        paginas.escribe("_" * 45 + "M A N O   D E   O B R A" + "_" * 45 + "\n")
+        paginas.escribe(
+            "Operación                     Fecha      Operario                        Cant.  Precio   Dietas Despl.    Importe\n"
+        )
+        paginas.escribe("_" * 113 + "\n")
+
+        totales = [0.0, 0.0, 0.0, 0.0]
+        for linea_coste, linea_venta in _filas_mano_obra(catalogo, mano_obra, totales):
+            paginas.fila(linea_coste, linea_venta)
+
+        horas, importe, importe_venta, dietas = totales
+        paginas.escribe(" " * 68 + "_" * 10 + " " * 9 + "_" * 8 + " " + "_" * 6 + " " + "_" * 10 + "\n")
+        paginas.escribe(
+            f"{numero_es(horas):>78}{numero_es(dietas):>17}{numero_es(0.0):>7}{numero_es(importe):>11}\n",
+            f"{numero_es(horas):>78}{numero_es(dietas):>17}{numero_es(0.0):>7}{numero_es(importe_venta):>11}\n",
+        )
+        paginas.escribe("\n")
+        paginas.escribe(
+            " " * 72 + f"Total Hoja Coste..........{numero_es(total_materiales[0] + importe):>15}\n",
+            " " * 72 + f"Total Hoja Coste..........{numero_es(total_materiales[1] + importe_venta):>15}\n",
+        )
+        paginas.escribe("\n")
+        paginas.escribe(" " * 72 + f"Total Presupuestado.......{numero_es(30833.11):>15}\n")
+        paginas.escribe("\n")
+        paginas.escribe(" " * 84 + f"Pág. {paginas.pagina:>5}\n")
+
+    return fichero_coste, fichero_venta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carpeta", default=".")
+    parser.add_argument("--numero-ot", default="900000")
+    parser.add_argument("--materiales", type=int, default=10_000)
+    parser.add_argument("--mano-obra", type=int, default=2_000)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.carpeta, exist_ok=True)
+    for fichero in genera_informe(
+        args.carpeta, args.numero_ot, args.materiales, args.mano_obra, args.semilla
+    ):
+        print(f"Generado: {fichero}")
+
+
+if __name__ == "__main__":
+    main()
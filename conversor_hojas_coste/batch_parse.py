@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+from itertools import compress
+from operator import itemgetter
+from typing import Any, Callable
+import datetime
+
+from decoder import fecha_dd_mm_aaaa
+from stage_timing import etapa
+
+
+# Parseo por lotes de las lineas candidatas de una seccion del informe, columna a columna.
+#
+# En lugar de trocear cada linea campo a campo, se hace una pasada por columna sobre todas las lineas:
+# - Las fechas se decodifican una vez por cada texto distinto. Las lineas sin fecha (cabeceras de pagina,
+#   lineas en blanco, totales) se descartan aqui mismo, antes de extraer el resto de campos.
+# - Los campos numericos de cada linea son contiguos, asi que se extrae un solo bloque por linea, se unen
+#   todos los bloques en un solo texto y se comprueban y convierten todos los numeros de una vez.
+# - Los campos comunes a coste y venta se comparan de una vez sobre el principio de las dos lineas, y solo en las
+#   lineas que no coinciden se comparan campo a campo para dar el error de incongruencia.
+# Las lineas que no pasan estas comprobaciones se parsean una a una con el parser de linea original,
+# de modo que los resultados y los mensajes de error son exactamente los mismos.
+
+
+def decode_fechas(textos: list[str]) -> list[datetime.date | None]:
+
+    # Las fechas se repiten mucho, asi que cada texto distinto se convierte una sola vez.
+    # Devuelve None para los textos que no tienen el formato dd/mm/aaaa.
+
+    fechas: dict[str, datetime.date | None] = {
+        texto: fecha_dd_mm_aaaa(texto.strip()) for texto in set(textos)
+    }
+
+    return list(map(fechas.__getitem__, textos))
+
+
+class CamposNumericos:
+    """Bloque de campos numericos contiguos, de ancho fijo y alineados a la derecha, como "    8,00   23,86"."""
+
+    def __init__(self, inicio: int, campos: list[tuple[str, int]]):
+        self.inicio = inicio
+        self.fin = inicio + sum(ancho for _, ancho in campos)
+        self.nombres = [nombre for nombre, _ in campos]
+
+        # Posiciones, dentro del bloque, del primer y el ultimo caracter de cada campo
+
+        self.primeros: list[int] = []
+        self.ultimos: list[int] = []
+        posicion = 0
+        for _, ancho in campos:
+            self.primeros.append(posicion)
+            posicion += ancho
+            self.ultimos.append(posicion - 1)
+
+    def decode(
+        self, lineas: list[str]
+    ) -> tuple[dict[str, list[float]], list[bool]]:
+
+        # Devuelve los valores de cada campo y si el bloque de cada linea es valido.
+        #
+        # Si cada campo empieza por un espacio y acaba en un caracter que no lo es, ningun numero puede pasar
+        # de un campo al siguiente y cada campo tiene al menos un numero. Si ademas al separar por espacios
+        # salen exactamente tantos numeros como campos, cada numero es su campo sin espacios, igual que en parse().
+        # Estas comprobaciones se hacen a la vez para todas las lineas tomando una columna de caracteres del texto
+        # unido, y solo si alguna falla se revisan los bloques uno a uno.
+        #
+        # Los puntos de miles se cambian por "_", que float() acepta entre digitos, en lugar de quitarlos.
+        # Asi los campos mantienen su ancho y el mismo texto sirve para las comprobaciones y para convertir.
+        # Si algun "_" no queda entre digitos float() falla y el bloque se revisa como los demas.
+
+        n = len(lineas)
+        k = len(self.nombres)
+        ancho = self.fin - self.inicio
+        bloques = list(map(itemgetter(slice(self.inicio, self.fin)), lineas))
+        texto = "\n".join(bloques).replace(".", "_").replace(",", ".")
+        numeros_str = texto.split()
+
+        if (
+            n > 0
+            and len(texto) == n * (ancho + 1) - 1
+            and len(numeros_str) == n * k
+            and all(texto[p :: ancho + 1].isspace() for p in self.primeros)
+            and all(
+                texto[p :: ancho + 1].split() == [texto[p :: ancho + 1]]
+                for p in self.ultimos
+            )
+        ):
+            try:
+                numeros = list(map(float, numeros_str))
+            except ValueError:
+                pass
+            else:
+                return {
+                    nombre: numeros[j::k] for j, nombre in enumerate(self.nombres)
+                }, [True] * n
+
+        # Algun bloque no es valido, se comprueban uno a uno
+
+        columnas: dict[str, list[float]] = {
+            nombre: [0.0] * n for nombre in self.nombres
+        }
+        validas = [False] * n
+
+        for i, bloque in enumerate(bloques):
+            bloque = bloque.replace(".", "_").replace(",", ".")
+            numeros_str = bloque.split()
+            if (
+                len(bloque) != ancho
+                or len(numeros_str) != k
+                or not all(bloque[p].isspace() for p in self.primeros)
+                or any(bloque[p].isspace() for p in self.ultimos)
+            ):
+                continue
+            try:
+                valores = list(map(float, numeros_str))
+            except ValueError:
+                continue
+            for nombre, valor in zip(self.nombres, valores):
+                columnas[nombre][i] = valor
+            validas[i] = True
+
+        return columnas, validas
+
+
+class FormatoSeccion:
+    """Posiciones de los campos de una seccion y parser de linea de respaldo."""
+
+    def __init__(
+        self,
+        fecha: tuple[int, int],
+        textos: list[tuple[str, int, int]],
+        numeros_coste: CamposNumericos,
+        numeros_solo_venta: CamposNumericos,
+        numeros_venta: CamposNumericos,
+        congruencia: list[tuple[str, int, int]],
+        numericas: list[str],
+        parse: Callable[..., Any],
+        errores_linea: tuple[type[Exception], ...],
+        error_fecha: Callable[[str, int], Exception],
+        error_incongruencia: Callable[[str, str, str, int], Exception],
+    ):
+        # numeros_coste: bloque de la linea guia cuando hay fichero de coste (cantidad + campos de coste)
+        # numeros_solo_venta: el mismo bloque cuando solo hay fichero de venta (cantidad + campos de venta)
+        # numeros_venta: bloque de la linea de venta cuando hay los dos ficheros
+        # congruencia: campos comunes a coste y venta, que deben coincidir; van seguidos desde el principio de la linea
+        # numericas: todos los campos numericos, los que no se parsean quedan a 0.0
+
+        self.fecha = fecha
+        self.textos = textos
+        self.numeros_coste = numeros_coste
+        self.numeros_solo_venta = numeros_solo_venta
+        self.numeros_venta = numeros_venta
+        self.congruencia = congruencia
+        self.congruencia_end = congruencia[-1][2]
+        self.numericas = numericas
+        self.parse = parse
+        self.errores_linea = errores_linea
+        self.error_fecha = error_fecha
+        self.error_incongruencia = error_incongruencia
+
+    def incongruencia(
+        self, linea_coste: str, linea_venta: str, numero_linea: int
+    ) -> Exception | None:
+
+        # Error del primer campo comun que no coincide entre coste y venta, o None si todos coinciden
+
+        for nombre, inicio, fin in self.congruencia:
+            valor_coste = linea_coste[inicio:fin].strip()
+            valor_venta = linea_venta[inicio:fin].strip()
+            if valor_coste != valor_venta:
+                return self.error_incongruencia(
+                    nombre, valor_coste, valor_venta, numero_linea
+                )
+        return None
+
+    @property
+    def columnas(self) -> list[str]:
+        return (
+            ["line_number"]
+            + [nombre for nombre, _, _ in self.textos]
+            + ["Fecha"]
+            + self.numericas
+        )
+
+
+def parse_lote(
+    formato: FormatoSeccion,
+    lineas_coste: list[str],
+    lineas_venta: list[str],
+    numeros_linea: list[int],
+    use_coste: bool,
+    use_venta: bool,
+) -> tuple[dict[str, list[Any]], list[Exception]]:
+
+    # Igual que en ParseFile, la linea guia es la de coste si hay fichero de coste y si no la de venta
+
+    lineas_guia = lineas_coste if use_coste else lineas_venta
+    n = len(lineas_guia)
+
+    inicio_fecha, fin_fecha = formato.fecha
+    fechas_str = list(map(itemgetter(slice(inicio_fecha, fin_fecha)), lineas_guia))
+    fechas = decode_fechas(fechas_str)
+
+    # Solo se siguen procesando en bloque las lineas con una fecha valida
+
+    candidatas = list(compress(range(n), fechas))
+    guia = [lineas_guia[i] for i in candidatas]
+
+    columnas: dict[str, list[Any]] = {
+        "line_number": [numeros_linea[i] for i in candidatas],
+    }
+    for nombre, inicio, fin in formato.textos:
+        columnas[nombre] = list(
+            map(str.strip, map(itemgetter(slice(inicio, fin)), guia))
+        )
+    columnas["Fecha"] = [fechas[i] for i in candidatas]
+    for nombre in formato.numericas:
+        columnas[nombre] = [0.0] * len(candidatas)
+
+    if use_coste:
+        numeros, validas = formato.numeros_coste.decode(guia)
+    else:
+        numeros, validas = formato.numeros_solo_venta.decode(guia)
+    columnas.update(numeros)
+
+    errores: dict[int, Exception] = {}
+
+    if use_coste and use_venta:
+        venta = [lineas_venta[i] for i in candidatas]
+        numeros, validas_venta = formato.numeros_venta.decode(venta)
+        columnas.update(numeros)
+
+        # Si el principio de las lineas de coste y venta es identico, los campos comunes son congruentes.
+        # Si no, y los numeros de las dos lineas son validos, solo falta comparar los campos comunes sin espacios:
+        # se anota el error del primero que no coincide, sin volver a parsear la linea.
+
+        fin = formato.congruencia_end
+        with etapa("congruencia", len(guia)):
+            numeros_validos = [
+                valida and valida_venta
+                for valida, valida_venta in zip(validas, validas_venta)
+            ]
+            validas = [
+                valida and coste[0:fin] == venta_linea[0:fin]
+                for valida, coste, venta_linea in zip(numeros_validos, guia, venta)
+            ]
+
+            for j in compress(
+                range(len(guia)),
+                [
+                    valida and not congruente
+                    for valida, congruente in zip(numeros_validos, validas)
+                ],
+            ):
+                error = formato.incongruencia(
+                    guia[j], venta[j], numeros_linea[candidatas[j]]
+                )
+                if error is None:
+                    validas[j] = True
+                else:
+                    errores[candidatas[j]] = error
+
+    # Lineas que hay que revisar una a una: las candidatas que no han pasado las comprobaciones
+    # y las que no tienen una fecha dd/mm/aaaa pero quiza si una que acepte strptime (por ejemplo 1/5/2024)
+
+    dudosas: list[int] = [
+        i
+        for i, valida in zip(candidatas, validas)
+        if not valida and i not in errores
+    ]
+
+    for i in compress(range(n), [fecha is None for fecha in fechas]):
+        fecha_str = fechas_str[i].strip()
+
+        # Un texto sin exactamente dos "/" nunca es una fecha para strptime, el error se da directamente
+
+        if fecha_str.count("/") != 2:
+            errores[i] = formato.error_fecha(fecha_str, numeros_linea[i])
+        else:
+            dudosas.append(i)
+
+    recuperadas: dict[int, Any] = {}
+
+    for i in sorted(dudosas):
+        try:
+            recuperadas[i] = formato.parse(
+                lineas_guia[i],
+                lineas_coste[i] if use_coste else "",
+                lineas_venta[i] if use_venta else "",
+                numeros_linea[i],
+                use_coste,
+                use_venta,
+            )
+        except formato.errores_linea as e:
+            errores[i] = e
+
+    if not recuperadas:
+        if not all(validas):
+            for nombre in columnas:
+                columnas[nombre] = list(compress(columnas[nombre], validas))
+    else:
+        # Caso poco frecuente: se mezclan en orden de linea las lineas del bloque y las recuperadas
+
+        filas: list[tuple[int, list[Any]]] = [
+            (i, [columnas[nombre][j] for nombre in columnas])
+            for j, (i, valida) in enumerate(zip(candidatas, validas))
+            if valida
+        ]
+        filas += [
+            (i, [getattr(linea, nombre) for nombre in columnas])
+            for i, linea in recuperadas.items()
+        ]
+        filas.sort(key=lambda fila: fila[0])
+
+        for j, nombre in enumerate(list(columnas)):
+            columnas[nombre] = [valores[j] for _, valores in filas]
+
+    return columnas, [errores[i] for i in sorted(errores)]
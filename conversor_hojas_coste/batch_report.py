@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+
+from version import VERSION_CONVERSOR
+
+
+# Informe en JSON del comando "todos", para poder seguir las conversiones desatendidas (por ejemplo, cada noche
+# desde el programador de tareas) sin leer la salida por pantalla.
+#
+# Para cada proyecto guarda su estado ("convertido", "sin_cambios" o "error"), los ficheros de coste y venta,
+# las lineas parseadas y rechazadas, las incongruencias entre coste y venta, el tiempo y el xlsx generado.
+# En "conciliacion" van las diferencias de estructura entre coste y venta y el detalle de las incongruencias,
+# y en "totales" los totales del propio informe que no coinciden con las lineas parseadas.
+
+
+class InformeConversiones:
+    """Resultado de cada proyecto del comando "todos"."""
+
+    def __init__(self, carpeta_entrada: str, carpeta_salida: str):
+        self.carpeta_entrada = carpeta_entrada
+        self.carpeta_salida = carpeta_salida
+        self.inicio = datetime.datetime.now()
+        self.proyectos: dict[str, dict] = {}
+
+    def _proyecto(
+        self, proyecto: str, estado: str, archivo_coste: str, archivo_venta: str
+    ) -> dict:
+        datos = {
+            "estado": estado,
+            "archivo_coste": archivo_coste,
+            "archivo_venta": archivo_venta,
+        }
+        self.proyectos[proyecto] = datos
+        return datos
+
+    def sin_cambios(
+        self, proyecto: str, archivo_coste: str, archivo_venta: str, salida: str
+    ) -> None:
+        self._proyecto(proyecto, "sin_cambios", archivo_coste, archivo_venta)["salida"] = salida
+
+    def convertido(
+        self, proyecto: str, archivo_coste: str, archivo_venta: str, resultado: dict
+    ) -> None:
+
+        # resultado: lo que devuelve convierte_proyecto para el proyecto
+
+        estado = "error" if resultado.get("error") is not None else "convertido"
+        self._proyecto(proyecto, estado, archivo_coste, archivo_venta).update(resultado)
+
+    def errores(self) -> int:
+        return sum(1 for datos in self.proyectos.values() if datos["estado"] == "error")
+
+    def guarda(self, filename: str, segundos: float) -> None:
+
+        # Se escribe en un fichero temporal y se renombra, para que quien lo vigile no lo lea a medias
+
+        datos = {
+            "version_conversor": VERSION_CONVERSOR,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "segundos": round(segundos, 6),
+            "carpeta_entrada": os.path.abspath(self.carpeta_entrada),
+            "carpeta_salida": os.path.abspath(self.carpeta_salida),
+            "convertidos": sum(
+                1 for datos in self.proyectos.values() if datos["estado"] == "convertido"
+            ),
+            "sin_cambios": sum(
+                1 for datos in self.proyectos.values() if datos["estado"] == "sin_cambios"
+            ),
+            "errores": self.errores(),
+            "proyectos": dict(sorted(self.proyectos.items())),
+        }
+
+        temporal = f"{filename}.tmp"
+        with open(temporal, "w", encoding="utf-8") as file:
+            json.dump(datos, file, indent=2, ensure_ascii=False)
+        os.replace(temporal, filename)
+
+        print(f"Informe guardado en: {filename}")
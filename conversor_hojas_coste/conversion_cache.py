@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+
+# Cache de conversiones del comando "todos".
+#
+# Se guarda en un fichero JSON en la carpeta de los proyectos, junto a los xlsx generados. Para cada proyecto
+# guarda el hash SHA-256 de sus ficheros de coste y venta, la version del conversor, el formato y el fichero generado
+# (el de materiales si el formato genera dos).
+# Un proyecto esta al dia si sus ficheros y la version del conversor no han cambiado y el xlsx sigue
+# existiendo con el mismo tamaño y fecha de modificacion que cuando se genero.
+
+FICHERO_CACHE = ".conversor_ot_cache.json"
+
+VERSION_CACHE = 1
+
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+
+def hash_fichero(filename: str) -> str:
+
+    # Hash del contenido del fichero, leido por bloques. Un fichero que no se usa ("") tiene hash "".
+
+    if filename == "":
+        return ""
+
+    hash_contenido = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for bloque in iter(lambda: file.read(TAMANO_BLOQUE_HASH), b""):
+            hash_contenido.update(bloque)
+
+    return hash_contenido.hexdigest()
+
+
+class CacheConversiones:
+    """Proyectos ya convertidos, con los hashes de sus ficheros, para no volver a convertir los que no han cambiado."""
+
+    def __init__(
+        self, version_conversor: str, filename: str = FICHERO_CACHE, formato: str = "xlsx"
+    ):
+        self.version_conversor = version_conversor
+        self.filename = filename
+        self.formato = formato
+        self.proyectos: dict[str, dict] = self._lee()
+        self.cambiada = False
+
+    def _lee(self) -> dict[str, dict]:
+        if not os.path.isfile(self.filename):
+            return {}
+
+        try:
+            with open(self.filename, "r", encoding="utf-8") as file:
+                datos = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"No se ha podido leer la cache de conversiones {self.filename}, se ignora: {e}")
+            return {}
+
+        if not isinstance(datos, dict) or datos.get("version") != VERSION_CACHE:
+            return {}
+
+        proyectos = datos.get("proyectos")
+        return proyectos if isinstance(proyectos, dict) else {}
+
+    def _entrada(
+        self, archivo_coste: str, archivo_venta: str, hash_coste: str, hash_venta: str
+    ) -> dict:
+        return {
+            "version_conversor": self.version_conversor,
+            "archivo_coste": archivo_coste,
+            "archivo_venta": archivo_venta,
+            "hash_coste": hash_coste,
+            "hash_venta": hash_venta,
+        }
+
+    def salida_al_dia(
+        self,
+        proyecto: str,
+        archivo_coste: str,
+        archivo_venta: str,
+        hash_coste: str,
+        hash_venta: str,
+    ) -> str | None:
+
+        # Devuelve el xlsx del proyecto si esta al dia, o None si hay que convertirlo
+
+        guardado = self.proyectos.get(proyecto)
+        if guardado is None:
+            return None
+
+        entrada = self._entrada(archivo_coste, archivo_venta, hash_coste, hash_venta)
+        if any(guardado.get(clave) != valor for clave, valor in entrada.items()):
+            return None
+
+        # Las entradas anteriores a los formatos de salida son de xlsx
+
+        if guardado.get("formato", "xlsx") != self.formato:
+            return None
+
+        salida = guardado.get("salida")
+        if not isinstance(salida, str):
+            return None
+
+        try:
+            estado = os.stat(salida)
+        except OSError:
+            return None
+
+        if (
+            guardado.get("tamano_salida") != estado.st_size
+            or guardado.get("mtime_salida") != estado.st_mtime_ns
+        ):
+            return None
+
+        return salida
+
+    def salida_guardada(self, proyecto: str) -> str | None:
+
+        # Fichero generado en la ultima conversion del proyecto que esta en la cache, este o no al dia
+
+        guardado = self.proyectos.get(proyecto)
+        if guardado is None:
+            return None
+        salida = guardado.get("salida")
+        return salida if isinstance(salida, str) else None
+
+    def guarda_proyecto(
+        self,
+        proyecto: str,
+        archivo_coste: str,
+        archivo_venta: str,
+        hash_coste: str,
+        hash_venta: str,
+        salida: str,
+    ) -> None:
+        try:
+            estado = os.stat(salida)
+        except OSError:
+            self.olvida_proyecto(proyecto)
+            return
+
+        entrada = self._entrada(archivo_coste, archivo_venta, hash_coste, hash_venta)
+        entrada["formato"] = self.formato
+        entrada["salida"] = salida
+        entrada["tamano_salida"] = estado.st_size
+        entrada["mtime_salida"] = estado.st_mtime_ns
+
+        self.proyectos[proyecto] = entrada
+        self.cambiada = True
+
+    def olvida_proyecto(self, proyecto: str) -> None:
+        if self.proyectos.pop(proyecto, None) is not None:
+            self.cambiada = True
+
+    def guarda(self) -> None:
+
+        # Escribe la cache en un fichero temporal y lo renombra, para no dejarla a medias si se interrumpe
+
+        if not self.cambiada:
+            return
+
+        temporal = f"{self.filename}.tmp"
+        with open(temporal, "w", encoding="utf-8") as file:
+            json.dump(
+                {"version": VERSION_CACHE, "proyectos": self.proyectos},
+                file,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(temporal, self.filename)
+        self.cambiada = False
@@ -0,0 +1,587 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, BinaryIO, Callable
+import io
+import ipaddress
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+from version import VERSION_CONVERSOR
+
+
+# Servicio HTTP local de conversion (comando "servir").
+#
+# Cada ejecucion de ConversorOT.exe paga el arranque del interprete y la importacion de openpyxl. El servicio
+# arranca una vez, con un grupo de procesos ya calentados (con los modulos de la conversion importados), y lo
+# pueden usar a la vez varios usuarios y el programador de tareas:
+#
+#   POST /convertir  informe de coste y/o venta, subido (multipart/form-data, campos "coste", "venta" y "ot")
+#                    o por ruta (JSON {"coste": ..., "venta": ..., "ot": ...}). Devuelve el xlsx del proyecto.
+#   POST /juntar     ficheros OT, subidos (multipart, campo "ficheros" repetido) o por ruta
+#                    (JSON {"ficheros": [...]}). Devuelve el xlsx juntado, como "juntar".
+#   GET  /metrics    peticiones atendidas, con error y rechazadas, rendimiento y latencias, en JSON.
+#
+# Las conversiones se hacen en los procesos del grupo; los hilos del servidor solo reciben y envian ficheros.
+# La cola de trabajos esta limitada: si ya hay COLA trabajos aceptados (en curso o esperando un proceso),
+# la peticion se rechaza con 503 en lugar de acumular ficheros en memoria y en disco. Los ficheros subidos se
+# escriben en disco segun llegan, por bloques, sin leer el cuerpo entero en memoria.
+#
+# Las rutas se leen en la maquina del servicio, asi que solo se aceptan si el servicio escucha en una direccion
+# local (por defecto, 127.0.0.1). Escuchando en otra, los ficheros se tienen que subir.
+
+TAMANO_MAXIMO_PETICION = 512 * 1024 * 1024
+
+# Bloque en el que se leen los ficheros subidos, y tamano maximo de lo que si se lee en memoria: un JSON, las
+# cabeceras de una parte multipart o el valor de un campo
+
+BLOQUE_LECTURA = 1024 * 1024
+TAMANO_MAXIMO_CAMPO = 1024 * 1024
+
+# Latencias que se guardan de cada tipo de peticion para las metricas, y ventana del rendimiento reciente
+
+MUESTRAS_LATENCIA = 1000
+VENTANA_RENDIMIENTO = 60
+
+TIPO_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _calienta() -> None:
+
+    # Inicializacion de cada proceso del grupo: importa los modulos de la conversion, y con ellos openpyxl
+
+    import join_ot  # noqa: F401
+    import parse_file  # noqa: F401
+
+
+def _pid() -> int:
+    return os.getpid()
+
+
+def convierte(coste: str, venta: str, numero_ot: str, carpeta_salida: str) -> tuple[str, bool, dict]:
+
+    # Se ejecuta en un proceso del grupo. Devuelve lo que imprime la conversion, si se ha convertido
+    # y su resultado, con el xlsx generado en "salida".
+
+    from parse_file import convierte_proyecto
+
+    salida, procesado, _, resultado, _ = convierte_proyecto(
+        coste, venta, numero_ot, False, False, carpeta_salida=carpeta_salida
+    )
+    return salida, procesado, resultado
+
+
+def junta(ficheros: list[str], salida: str) -> str:
+
+    # Se ejecuta en un proceso del grupo. Devuelve lo que imprime el juntado.
+
+    from join_ot import juntar_ficheros
+
+    texto = io.StringIO()
+    with redirect_stdout(texto):
+        juntar_ficheros(ficheros, salida, False, False)
+    return texto.getvalue()
+
+
+class MetricasServicio:
+    """Peticiones atendidas, con error y rechazadas, y latencias de cada tipo de peticion."""
+
+    def __init__(self, tipos: list[str]):
+        self._lock = threading.Lock()
+        self.inicio = time.monotonic()
+        self.pendientes = 0
+        self.por_tipo: dict[str, dict[str, Any]] = {
+            tipo: {
+                "completadas": 0,
+                "errores": 0,
+                "rechazadas": 0,
+                "latencias": deque(maxlen=MUESTRAS_LATENCIA),
+                "fines": deque(),
+            }
+            for tipo in tipos
+        }
+
+    def acepta(self) -> None:
+        with self._lock:
+            self.pendientes += 1
+
+    def rechaza(self, tipo: str) -> None:
+        with self._lock:
+            self.por_tipo[tipo]["rechazadas"] += 1
+
+    def termina(self, tipo: str, segundos: float, correcta: bool) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self.pendientes -= 1
+            datos = self.por_tipo[tipo]
+            datos["completadas" if correcta else "errores"] += 1
+            datos["latencias"].append(segundos)
+            fines = datos["fines"]
+            fines.append(ahora)
+            while fines[0] < ahora - VENTANA_RENDIMIENTO:
+                fines.popleft()
+
+    def como_dict(self) -> dict:
+        ahora = time.monotonic()
+        activo = ahora - self.inicio
+
+        with self._lock:
+            datos = {"segundos_activo": round(activo, 3), "pendientes": self.pendientes}
+
+            for tipo, por_tipo in self.por_tipo.items():
+                latencias = sorted(por_tipo["latencias"])
+                recientes = sum(
+                    1 for fin in por_tipo["fines"] if fin >= ahora - VENTANA_RENDIMIENTO
+                )
+                atendidas = por_tipo["completadas"] + por_tipo["errores"]
+
+                datos[tipo] = {
+                    "completadas": por_tipo["completadas"],
+                    "errores": por_tipo["errores"],
+                    "rechazadas": por_tipo["rechazadas"],
+                    "por_segundo": round(atendidas / activo, 3) if activo > 0 else 0.0,
+                    "por_minuto_reciente": recientes * 60 // VENTANA_RENDIMIENTO,
+                    "latencia_ms": _percentiles(latencias),
+                }
+
+        return datos
+
+
+def _percentiles(latencias: list[float]) -> dict[str, float] | None:
+
+    # Latencias ordenadas de las ultimas MUESTRAS_LATENCIA peticiones, en milisegundos
+
+    if not latencias:
+        return None
+
+    def percentil(p: float) -> float:
+        return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 1)
+
+    return {
+        "media": round(sum(latencias) / len(latencias) * 1000, 1),
+        "p50": percentil(0.5),
+        "p95": percentil(0.95),
+        "max": round(latencias[-1] * 1000, 1),
+    }
+
+
+class ServicioConversion:
+    """Grupo de procesos calentados que hacen las conversiones, con una cola de trabajos limitada."""
+
+    class Ocupado(Exception):
+        pass
+
+    def __init__(self, jobs: int, cola: int):
+        self.jobs = jobs
+        self.cola = cola
+        self._plazas = threading.BoundedSemaphore(cola)
+        self._executor = ProcessPoolExecutor(max_workers=jobs, initializer=_calienta)
+        self.metricas = MetricasServicio(["convertir", "juntar"])
+
+    def calienta(self) -> None:
+
+        # Arranca ya todos los procesos del grupo (con "spawn", como en Windows, solo se arrancan segun hacen
+        # falta), para que la primera peticion no pague su arranque
+
+        futuros = [self._executor.submit(_pid) for _ in range(self.jobs)]
+        for futuro in futuros:
+            futuro.result()
+
+    def reserva(self, tipo: str) -> None:
+
+        # Reserva una plaza en la cola antes de recibir los ficheros de la peticion
+
+        if not self._plazas.acquire(blocking=False):
+            self.metricas.rechaza(tipo)
+            raise ServicioConversion.Ocupado(
+                f"Hay {self.cola} trabajos pendientes, vuelva a intentarlo más tarde."
+            )
+        self.metricas.acepta()
+
+    def ejecuta(self, funcion: Callable, *args) -> Any:
+
+        # Ejecuta la funcion en un proceso del grupo, con una plaza ya reservada
+
+        return self._executor.submit(funcion, *args).result()
+
+    def libera(self, tipo: str, inicio: float, correcta: bool) -> None:
+
+        # Libera la plaza al acabar la peticion, con su latencia desde que se reservo
+
+        self.metricas.termina(tipo, time.perf_counter() - inicio, correcta)
+        self._plazas.release()
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+
+class PeticionNoValida(Exception):
+    """Error en los datos de una peticion, que se devuelve con el codigo HTTP dado."""
+
+    def __init__(self, mensaje: str, codigo: int = 400):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+def _cabeceras(texto: bytes) -> EmailMessage:
+    return BytesParser(policy=policy.HTTP).parsebytes(texto + b"\r\n\r\n", headersonly=True)
+
+
+def _partes_multipart(
+    entrada: BinaryIO, tamano: int, tipo_contenido: str, carpeta: str
+) -> tuple[dict[str, Any], dict[str, list[tuple[str, str]]]]:
+
+    # Lee un cuerpo multipart/form-data de tamano bytes por bloques: los ficheros se escriben en la carpeta
+    # temporal segun llegan y solo los campos de texto se guardan en memoria. Devuelve los campos y los ficheros
+    # por campo, cada uno con su ruta y su nombre original. Cada fichero se guarda con un nombre propio (campo e
+    # indice), porque dos partes pueden venir con el mismo nombre de fichero.
+
+    frontera = _cabeceras(b"Content-Type: " + tipo_contenido.encode("latin-1")).get_boundary()
+    if not frontera:
+        raise PeticionNoValida("Falta el boundary del cuerpo multipart/form-data.")
+    separador = b"\r\n--" + frontera.encode("latin-1")
+
+    # El primer separador no lleva el salto de linea delante
+
+    pendiente = b"\r\n"
+    restante = tamano
+
+    def lee() -> bytes:
+        nonlocal restante
+        bloque = entrada.read(min(BLOQUE_LECTURA, restante))
+        if not bloque:
+            raise PeticionNoValida("El cuerpo multipart/form-data está incompleto.")
+        restante -= len(bloque)
+        return bloque
+
+    def copia_hasta(marca: bytes, destino: BinaryIO, maximo: int) -> None:
+
+        # Copia el cuerpo en destino hasta la marca, que se salta. Se deja sin copiar el final de cada bloque
+        # por si la marca queda partida entre dos bloques.
+
+        nonlocal pendiente
+        copiados = 0
+        while (posicion := pendiente.find(marca)) < 0:
+            corte = max(0, len(pendiente) - len(marca) + 1)
+            copiados += corte
+            if copiados > maximo:
+                raise PeticionNoValida("Una parte del cuerpo multipart/form-data es demasiado grande.", 413)
+            destino.write(pendiente[:corte])
+            pendiente = pendiente[corte:] + lee()
+        if copiados + posicion > maximo:
+            raise PeticionNoValida("Una parte del cuerpo multipart/form-data es demasiado grande.", 413)
+        destino.write(pendiente[:posicion])
+        pendiente = pendiente[posicion + len(marca) :]
+
+    campos: dict[str, Any] = {}
+    ficheros: dict[str, list[tuple[str, str]]] = {}
+    copia_hasta(separador, io.BytesIO(), TAMANO_MAXIMO_CAMPO)
+
+    for indice in itertools.count():
+        # Tras cada separador: "--" si es el ultimo, o las cabeceras de la parte hasta la linea en blanco
+
+        while len(pendiente) < 2:
+            pendiente += lee()
+        if pendiente.startswith(b"--"):
+            break
+
+        texto = io.BytesIO()
+        copia_hasta(b"\r\n\r\n", texto, TAMANO_MAXIMO_CAMPO)
+        cabeceras = _cabeceras(texto.getvalue().lstrip())
+
+        nombre = cabeceras.get_param("name", header="content-disposition")
+        if not nombre:
+            raise PeticionNoValida("Hay una parte del cuerpo multipart/form-data sin nombre de campo (name).")
+        nombre_fichero = cabeceras.get_filename()
+
+        if nombre_fichero is None:
+            valor = io.BytesIO()
+            copia_hasta(separador, valor, TAMANO_MAXIMO_CAMPO)
+            try:
+                campos[nombre] = valor.getvalue().decode("utf-8")
+            except UnicodeDecodeError:
+                raise PeticionNoValida(f'El campo "{nombre}" no está en UTF-8.')
+            continue
+
+        nombre_original = _nombre_seguro(nombre_fichero)
+        ruta = os.path.join(
+            carpeta, f"{_nombre_seguro(nombre)}_{indice}{os.path.splitext(nombre_original)[1]}"
+        )
+        with open(ruta, "wb") as file:
+            copia_hasta(separador, file, tamano)
+        ficheros.setdefault(nombre, []).append((ruta, nombre_original))
+
+    return campos, ficheros
+
+
+def _nombre_seguro(nombre: str) -> str:
+
+    # Nombre de un fichero subido, sin carpetas, para guardarlo en la carpeta temporal de la peticion
+
+    nombre = os.path.basename(nombre.replace("\\", "/"))
+    if nombre in ("", ".", ".."):
+        raise PeticionNoValida(f"Nombre de fichero no válido: {nombre!r}")
+    return nombre
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    server: ServidorConversion
+    server_version = f"ConversorOT/{VERSION_CONVERSOR}"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verboso:
+            print(f"{self.address_string()} {format % args}")
+
+    def _responde(
+        self, codigo: int, cuerpo: bytes, tipo: str, cabeceras: dict[str, str] | None = None
+    ) -> None:
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _responde_json(self, codigo: int, datos: dict, cabeceras: dict[str, str] | None = None) -> None:
+        self._responde(
+            codigo,
+            json.dumps(datos, ensure_ascii=False, indent=2).encode("utf-8"),
+            "application/json; charset=utf-8",
+            cabeceras,
+        )
+
+    def _responde_fichero(self, fichero: str) -> None:
+        with open(fichero, "rb") as file:
+            datos = file.read()
+        self._responde(
+            200,
+            datos,
+            TIPO_XLSX,
+            {"Content-Disposition": f'attachment; filename="{os.path.basename(fichero)}"'},
+        )
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            datos = self.server.servicio.metricas.como_dict()
+            datos["procesos"] = self.server.servicio.jobs
+            datos["cola"] = self.server.servicio.cola
+            self._responde_json(200, datos)
+        else:
+            self._responde_json(404, {"error": f"No existe {self.path}"})
+
+    def do_POST(self) -> None:
+        peticiones = {"/convertir": self._convierte, "/juntar": self._junta}
+        atiende = peticiones.get(self.path)
+        if atiende is None:
+            self._responde_json(404, {"error": f"No existe {self.path}"})
+            return
+
+        tipo = self.path[1:]
+        servicio = self.server.servicio
+        inicio = time.perf_counter()
+
+        try:
+            servicio.reserva(tipo)
+        except ServicioConversion.Ocupado as e:
+            self.close_connection = True
+            self._responde_json(503, {"error": str(e)}, {"Retry-After": "1"})
+            return
+
+        # La carpeta temporal guarda los ficheros subidos y el xlsx generado hasta enviarlo
+
+        correcta = False
+        try:
+            with tempfile.TemporaryDirectory(prefix="conversor_ot_") as carpeta:
+                correcta = atiende(carpeta)
+        except PeticionNoValida as e:
+            self._responde_json(e.codigo, {"error": str(e)})
+        except Exception as e:
+            self._responde_json(500, {"error": str(e)})
+        finally:
+            servicio.libera(tipo, inicio, correcta)
+
+    # Cada peticion devuelve si se ha atendido sin error, para las metricas
+
+    def _lee_peticion(
+        self, carpeta: str
+    ) -> tuple[dict[str, Any], dict[str, list[tuple[str, str]]]]:
+
+        # Devuelve los campos de la peticion y, si es multipart, los ficheros subidos por campo, ya guardados en
+        # la carpeta temporal
+
+        tamano = self.headers.get("Content-Length", "")
+        if not tamano.isdigit():
+            raise PeticionNoValida("Falta la cabecera Content-Length.", 411)
+        tamano = int(tamano)
+        if tamano > TAMANO_MAXIMO_PETICION:
+            self.close_connection = True
+            raise PeticionNoValida("La petición es demasiado grande.", 413)
+
+        tipo_contenido = self.headers.get("Content-Type", "")
+
+        if tipo_contenido.startswith("application/json"):
+            if tamano > TAMANO_MAXIMO_CAMPO:
+                self.close_connection = True
+                raise PeticionNoValida("El JSON es demasiado grande.", 413)
+            try:
+                campos = json.loads(self.rfile.read(tamano))
+            except ValueError as e:
+                raise PeticionNoValida(f"El JSON no es válido: {e}")
+            if not isinstance(campos, dict):
+                raise PeticionNoValida("El JSON tiene que ser un objeto.")
+            return campos, {}
+
+        if tipo_contenido.startswith("multipart/form-data"):
+            try:
+                return _partes_multipart(self.rfile, tamano, tipo_contenido, carpeta)
+            except PeticionNoValida:
+                self.close_connection = True
+                raise
+
+        raise PeticionNoValida(
+            "El cuerpo tiene que ser application/json o multipart/form-data.", 415
+        )
+
+    def _ruta_local(self, ruta: Any, descripcion: str) -> str:
+
+        # Ruta de un fichero en la maquina del servicio, que solo se acepta si escucha en una direccion local
+
+        if not self.server.acepta_rutas:
+            raise PeticionNoValida(
+                "El servicio no escucha solo en este equipo: los ficheros se tienen que subir, no se aceptan rutas.",
+                403,
+            )
+        ruta = str(ruta)
+        if not os.path.isfile(ruta):
+            raise PeticionNoValida(f"No existe el {descripcion}: {ruta}")
+        return ruta
+
+    def _convierte(self, carpeta: str) -> bool:
+        campos, ficheros = self._lee_peticion(carpeta)
+
+        informes: dict[str, str] = {}
+        nombres_originales: dict[str, str] = {}
+        for nombre in ("coste", "venta"):
+            if nombre in ficheros:
+                informes[nombre], nombres_originales[nombre] = ficheros[nombre][0]
+            elif campos.get(nombre):
+                informes[nombre] = self._ruta_local(campos[nombre], f"fichero de {nombre}")
+            else:
+                informes[nombre] = ""
+
+        if not informes["coste"] and not informes["venta"]:
+            raise PeticionNoValida('Falta el informe de coste o de venta ("coste" o "venta").')
+
+        # Sin "ot", el numero de OT son los 6 primeros caracteres del nombre del informe, como en "todos"
+
+        numero_ot = str(campos.get("ot") or "")
+        if not numero_ot:
+            nombres = {
+                nombre: nombres_originales.get(nombre) or os.path.basename(ruta)
+                for nombre, ruta in informes.items()
+            }
+            numero_ot = (nombres["venta"] or nombres["coste"])[:6]
+        if not numero_ot.isdigit():
+            raise PeticionNoValida('Falta el número de OT ("ot").')
+
+        # Los informes subidos se guardan con el nombre que tendrian en la carpeta de los proyectos
+
+        for nombre, ruta in informes.items():
+            if nombre in ficheros:
+                destino = os.path.join(carpeta, f"{numero_ot}{nombre}.txt")
+                os.replace(ruta, destino)
+                informes[nombre] = destino
+
+        salida = os.path.join(carpeta, "salida")
+        os.mkdir(salida)
+
+        texto, procesado, resultado = self.server.servicio.ejecuta(
+            convierte, informes["coste"], informes["venta"], numero_ot, salida
+        )
+
+        if not procesado:
+            self._responde_json(422, {"error": resultado["error"], "salida": texto})
+            return False
+
+        self._responde_fichero(resultado["salida"])
+        return True
+
+    def _junta(self, carpeta: str) -> bool:
+        campos, ficheros = self._lee_peticion(carpeta)
+
+        if "ficheros" in ficheros:
+            # Se juntan ordenados por nombre, asi que los ficheros subidos recuperan su nombre original,
+            # que no se puede repetir
+
+            subidos = os.path.join(carpeta, "ficheros")
+            os.mkdir(subidos)
+            ficheros_de_ot = []
+            for ruta, nombre_original in ficheros["ficheros"]:
+                destino = os.path.join(subidos, nombre_original)
+                if os.path.exists(destino):
+                    raise PeticionNoValida(
+                        f"Hay dos ficheros OT subidos con el mismo nombre: {nombre_original}"
+                    )
+                os.replace(ruta, destino)
+                ficheros_de_ot.append(destino)
+        else:
+            rutas = campos.get("ficheros")
+            if not isinstance(rutas, list) or not rutas:
+                raise PeticionNoValida('Falta la lista de ficheros OT ("ficheros").')
+            ficheros_de_ot = [self._ruta_local(ruta, "fichero OT") for ruta in rutas]
+
+        salida = os.path.join(carpeta, "salida")
+        os.mkdir(salida)
+        juntado = os.path.join(salida, "OT_juntadas.xlsx")
+
+        try:
+            self.server.servicio.ejecuta(junta, ficheros_de_ot, juntado)
+        except Exception as e:
+            self._responde_json(422, {"error": str(e)})
+            return False
+
+        self._responde_fichero(juntado)
+        return True
+
+
+class ServidorConversion(ThreadingHTTPServer):
+    """Servidor HTTP con un hilo por peticion y el grupo de procesos de conversion."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str, puerto: int, servicio: ServicioConversion, verboso: bool):
+        super().__init__((host, puerto), _Manejador)
+        self.servicio = servicio
+        self.verboso = verboso
+
+        # Las rutas de las peticiones se leen en la maquina del servicio: solo se aceptan si nadie mas puede
+        # conectarse, escuchando en una direccion local
+
+        self.acepta_rutas = ipaddress.ip_address(self.server_address[0]).is_loopback
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.servicio.close()
+
+
+def crea_servidor(
+    host: str, puerto: int, jobs: int, cola: int, verboso: bool = False
+) -> ServidorConversion:
+
+    # Servidor con el grupo de procesos ya arrancado, listo para serve_forever(). Con puerto 0 se elige
+    # uno libre (ver server_address).
+
+    servicio = ServicioConversion(jobs, cola)
+    servicio.calienta()
+    return ServidorConversion(host, puerto, servicio, verboso)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Iterator
+import datetime
+import os
+
+from batch_report import InformeConversiones
+from join_manifest import ManifiestoJuntadas, ruta_manifiesto
+from output_formats import escritor
+from parse_file import convierte_proyecto
+from project_files import FicherosProyecto
+from stage_timing import etapa
+from summaries import ResumenCostes
+from xlsx_writer import filas_mano_obra, filas_materiales
+
+
+# Conversion y juntado en una sola pasada (comando "todo-en-uno").
+#
+# Con "todos" y despues "juntar", cada fila se escribe en el xlsx de su proyecto y se vuelve a leer de el
+# para copiarla en OT_juntadas.xlsx. Aqui cada proyecto se parsea conservando sus filas por columnas y,
+# si se ha convertido sin errores, sus filas se escriben directamente en el fichero juntado, en orden de proyecto.
+# Las filas de un proyecto solo se escriben cuando se ha parseado entero, para no dejar en el fichero juntado
+# las filas de un proyecto que falla a medias (por ejemplo, un informe cortado).
+#
+# El fichero de cada proyecto es opcional. Si se genera en xlsx, se guarda tambien el manifiesto de "juntar",
+# de modo que un "juntar" posterior en la misma carpeta encuentra el fichero juntado al dia.
+#
+# Las hojas de resumen del fichero juntado suman, en orden de proyecto, los totales que cada proyecto
+# ha acumulado al parsearse, sin volver a recorrer sus filas.
+
+
+def _como_en_ot(filas: Iterator[list[Any]]) -> Iterator[list[Any]]:
+
+    # Las filas tal como las lee "juntar" de un xlsx de proyecto: los textos vacios son celdas vacias
+    # y las fechas son datetime. Asi el fichero juntado es el mismo que con "todos" y "juntar".
+
+    for fila in filas:
+        yield [
+            None
+            if valor == ""
+            else datetime.datetime.combine(valor, datetime.time())
+            if type(valor) is datetime.date
+            else valor
+            for valor in fila
+        ]
+
+
+def _convierte(
+    proyecto_id: str,
+    archivos: FicherosProyecto,
+    errores: bool,
+    verboso: bool,
+    carpeta_salida: str,
+    por_proyecto: bool,
+    formato: str,
+) -> tuple:
+    return convierte_proyecto(
+        archivos.archivo_coste,
+        archivos.archivo_venta,
+        proyecto_id,
+        errores,
+        verboso,
+        carpeta_salida=carpeta_salida,
+        conserva_filas=True,
+        escribe_fichero=por_proyecto,
+        formato=formato,
+    )
+
+
+def convierte_proyectos(
+    proyectos: list[tuple[str, FicherosProyecto]],
+    errores: bool,
+    verboso: bool,
+    carpeta_salida: str,
+    por_proyecto: bool,
+    formato: str,
+    jobs: int = 1,
+) -> Iterator[tuple[str, FicherosProyecto, tuple]]:
+
+    # Convierte los proyectos conservando sus filas y los devuelve en el mismo orden, con lo que devuelve
+    # convierte_proyecto para cada uno. Con varios procesos, igual que al juntar, solo se mantienen 2 proyectos
+    # pendientes por proceso para no acumular en memoria las filas de los proyectos que aun no se han usado.
+
+    if jobs <= 1 or len(proyectos) <= 1:
+        for proyecto_id, archivos in proyectos:
+            yield proyecto_id, archivos, _convierte(
+                proyecto_id, archivos, errores, verboso, carpeta_salida, por_proyecto, formato
+            )
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(proyectos))) as executor:
+
+        def lanza(proyecto_id: str, archivos: FicherosProyecto) -> Future:
+            return executor.submit(
+                _convierte,
+                proyecto_id,
+                archivos,
+                errores,
+                verboso,
+                carpeta_salida,
+                por_proyecto,
+                formato,
+            )
+
+        pendientes: deque[tuple[str, FicherosProyecto, Future]] = deque()
+        siguientes = iter(proyectos)
+
+        for proyecto_id, archivos in siguientes:
+            pendientes.append((proyecto_id, archivos, lanza(proyecto_id, archivos)))
+            if len(pendientes) >= jobs * 2:
+                break
+
+        while pendientes:
+            proyecto_id, archivos, futuro = pendientes.popleft()
+
+            # Con varios procesos, la espera a que llegue cada proyecto no cuenta en ninguna etapa
+
+            convertido = futuro.result()
+
+            siguiente = next(siguientes, None)
+            if siguiente is not None:
+                pendientes.append((*siguiente, lanza(*siguiente)))
+
+            yield proyecto_id, archivos, convertido
+
+
+def convierte_y_junta(
+    proyectos: list[tuple[str, FicherosProyecto]],
+    nombre_fichero_salida: str,
+    carpeta_salida: str,
+    errores: bool,
+    verboso: bool,
+    resultados: InformeConversiones,
+    jobs: int = 1,
+    por_proyecto: bool = False,
+    formato: str = "xlsx",
+) -> dict[str, dict]:
+
+    # Convierte los proyectos y escribe sus filas en el fichero juntado, ordenados por numero de proyecto.
+    # Anota el resultado de cada proyecto en resultados y devuelve los tiempos de cada proyecto.
+    # Con otro formato que xlsx, el nombre de la salida sin extension es la base de los ficheros de ese formato.
+
+    proyectos = sorted(proyectos, key=lambda proyecto: proyecto[0])
+    tiempos_por_proyecto: dict[str, dict] = {}
+    filas_por_fichero: list[tuple[str, int, int, ResumenCostes]] = []
+    resumen = ResumenCostes()
+
+    with etapa("escritura"):
+        writer = escritor(formato, os.path.splitext(nombre_fichero_salida)[0])
+
+    def junta(proyecto_id: str, archivos: FicherosProyecto, convertido: tuple) -> None:
+        salida, _, tiempos, resultado, filas = convertido
+
+        print(salida, end="")
+        tiempos_por_proyecto[proyecto_id] = tiempos
+        resultados.convertido(
+            proyecto_id, archivos.archivo_coste, archivos.archivo_venta, resultado
+        )
+
+        if filas is None:
+            return
+
+        materiales, mano_obra, resumen_proyecto = filas
+        with etapa("escritura", len(materiales) + len(mano_obra)):
+            if formato == "xlsx":
+                for fila in _como_en_ot(filas_materiales(materiales, proyecto_id)):
+                    writer.add_material_row(fila)
+                for fila in _como_en_ot(filas_mano_obra(mano_obra, proyecto_id)):
+                    writer.add_job_row(fila)
+            else:
+                writer.add_material_rows(materiales, proyecto_id)
+                writer.add_job_rows(mano_obra, proyecto_id)
+
+        with etapa("resumen"):
+            resumen.junta(resumen_proyecto)
+
+        if resultado["salida"] is not None:
+            filas_por_fichero.append(
+                (resultado["salida"], len(materiales), len(mano_obra), resumen_proyecto)
+            )
+
+    try:
+        for proyecto_id, archivos, convertido in convierte_proyectos(
+            proyectos, errores, verboso, carpeta_salida, por_proyecto, formato, jobs
+        ):
+            junta(proyecto_id, archivos, convertido)
+
+    except BaseException:
+        writer.descarta()
+        raise
+
+    with etapa("guardado", 1):
+        writer.add_resumen(resumen)
+        writer.close()
+
+    # Si el fichero juntado esta formado exactamente por los xlsx de los proyectos, "juntar" puede seguir
+    # de forma incremental a partir de el. Si no, se quita el manifiesto de un "juntar" anterior.
+
+    if formato != "xlsx":
+        return tiempos_por_proyecto
+
+    if por_proyecto and len(filas_por_fichero) == len(proyectos):
+        ManifiestoJuntadas.de_filas(nombre_fichero_salida, filas_por_fichero).guarda()
+    elif os.path.exists(ruta_manifiesto(nombre_fichero_salida)):
+        os.remove(ruta_manifiesto(nombre_fichero_salida))
+
+    return tiempos_por_proyecto
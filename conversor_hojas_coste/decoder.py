@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from functools import lru_cache
+import datetime
+
+
+# Conversion de los numeros y fechas de los informes, en formato español: "1.234,56" y "dd/mm/aaaa".
+#
+# En una hoja se repiten mucho las mismas fechas y los mismos precios, asi que los textos ya convertidos
+# se guardan en una cache limitada a los TAMANO_CACHE textos usados mas recientemente.
+# Los errores son los mismos que antes: ValueError si el texto no es un numero o una fecha valida.
+
+TAMANO_CACHE = 4096
+
+
+def fecha_dd_mm_aaaa(texto: str) -> datetime.date | None:
+
+    # Fecha de un texto con exactamente el formato dd/mm/aaaa, calculada directamente con los codigos de los digitos.
+    # Devuelve None si el texto no tiene ese formato o no es una fecha valida.
+
+    if (
+        len(texto) != 10
+        or texto[2] != "/"
+        or texto[5] != "/"
+        or not texto.isascii()
+    ):
+        return None
+
+    digitos = texto[0:2] + texto[3:5] + texto[6:10]
+    if not digitos.isdigit():
+        return None
+
+    d0, d1, m0, m1, a0, a1, a2, a3 = map(ord, digitos)
+
+    try:
+        return datetime.date(
+            a0 * 1000 + a1 * 100 + a2 * 10 + a3 - 53328,
+            m0 * 10 + m1 - 528,
+            d0 * 10 + d1 - 528,
+        )
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def decode_fecha(texto: str) -> datetime.date:
+
+    # Igual que datetime.datetime.strptime(texto, "%d/%m/%Y").date().
+    # strptime solo se usa para los textos que no son exactamente dd/mm/aaaa, como "1/5/2024",
+    # y para dar el mismo error con los que no son una fecha valida.
+
+    fecha = fecha_dd_mm_aaaa(texto)
+    if fecha is not None:
+        return fecha
+
+    return datetime.datetime.strptime(texto, "%d/%m/%Y").date()
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def decode_numero(texto: str) -> float:
+
+    # Numero con punto de miles y coma decimal: "1.234,56" -> 1234.56
+
+    return float(texto.replace(".", "").replace(",", "."))
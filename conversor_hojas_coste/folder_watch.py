@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import datetime
+import os
+import re
+import signal
+import threading
+import time
+
+from conversion_cache import FICHERO_CACHE, CacheConversiones, hash_fichero
+from join_manifest import juntar_incremental
+from parse_file import convierte_proyecto
+from project_files import FicherosProyecto, busca_proyectos, es_informe, ruta_en_carpeta
+from version import VERSION_CONVERSOR
+
+
+# Vigilancia de una carpeta para convertir los informes segun llegan (comando "vigilar").
+#
+# El ERP deja los ficheros "xxxxxxcoste.txt" y "xxxxxxventa.txt" en una carpeta compartida a lo largo del dia.
+# En lugar de esperar a que alguien ejecute "todos", se revisa la carpeta cada INTERVALO segundos: un solo
+# listado de la carpeta (os.scandir) y un stat de cada informe, sin leer su contenido. Se hace asi, y no con
+# inotify o ReadDirectoryChangesW, porque funciona igual en Windows, en Linux y en carpetas de red, donde
+# las notificaciones de cambios no son fiables.
+#
+# Un informe se da por terminado de escribir cuando su tamano y su fecha de modificacion no han cambiado
+# en ESPERA segundos y se puede abrir (en Windows no se puede mientras el ERP lo tiene abierto para escribir).
+# Un proyecto se convierte cuando estan terminados sus dos informes; si solo llega uno, se espera ESPERA_PAREJA
+# segundos a que llegue el otro y despues se convierte solo con el que hay, como haria "todos".
+#
+# Cada proyecto se convierte en un proceso del grupo, sin parar la vigilancia. Se usa la misma cache que "todos":
+# al arrancar no se vuelven a convertir los proyectos ya convertidos, y un informe que se vuelve a exportar
+# sin cambios no se convierte de nuevo. Si un informe cambia mientras se convierte, se convierte otra vez
+# cuando vuelva a estar terminado.
+#
+# Con "juntar", cuando no queda ningun proyecto convirtiendose, se actualiza de forma incremental el fichero
+# juntado de la carpeta de salida, con el fichero OT de la ultima conversion de cada proyecto. Se hace en este
+# proceso: mientras se junta no se revisa la carpeta, pero los proyectos que ya se estan convirtiendo siguen.
+
+INTERVALO = 1.0
+ESPERA = 2.0
+ESPERA_PAREJA = 60.0
+
+NOMBRE_JUNTADAS = "OT_juntadas.xlsx"
+FICHERO_OT_RE = re.compile(r"^(\d{6})_de_(\d{8})_a_(\d{8})\.xlsx$")
+
+# Tamano y fecha de modificacion (en ns) de un fichero
+
+Firma = tuple[int, int]
+
+
+def _ignora_ctrl_c() -> None:
+
+    # Inicializacion de cada proceso del grupo: Ctrl+C solo para la vigilancia, que deja terminar las conversiones en curso
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _hora() -> str:
+    return datetime.datetime.now().strftime("%H:%M:%S")
+
+
+class VigilanteCarpeta:
+    """Revisa una carpeta y convierte en segundo plano los proyectos cuyos informes han terminado de llegar."""
+
+    def __init__(
+        self,
+        entrada: str,
+        salida: str,
+        jobs: int,
+        errores: bool = False,
+        verboso: bool = False,
+        juntar: bool = False,
+        intervalo: float = INTERVALO,
+        espera: float = ESPERA,
+        espera_pareja: float = ESPERA_PAREJA,
+    ):
+        self.entrada = entrada
+        self.salida = salida
+        self.errores = errores
+        self.verboso = verboso
+        self.juntar = juntar
+        self.intervalo = intervalo
+        self.espera = espera
+        self.espera_pareja = espera_pareja
+
+        self.cache = CacheConversiones(
+            VERSION_CONVERSOR, ruta_en_carpeta(salida, FICHERO_CACHE)
+        )
+        self.jobs = jobs
+        self._executor = self._grupo()
+
+        # Por informe: su firma, desde cuando (time.monotonic) no cambia y si se ha visto ya en otra revision
+
+        self.informes: dict[str, tuple[Firma, float, bool]] = {}
+
+        # Por proyecto: la firma de sus informes ya convertidos (o al dia en la cache) y los que se estan convirtiendo
+
+        self.hechos: dict[str, tuple] = {}
+        self.en_curso: dict[str, tuple[FicherosProyecto, tuple, tuple[str, str], float, Future]] = {}
+
+        # Con "juntar", el fichero juntado se pone al dia al arrancar y despues de cada conversion
+
+        self.juntar_pendiente = juntar
+        self.convertidos = 0
+        self.con_errores = 0
+
+        # Se activa al terminar una conversion o al parar, para no esperar al final del intervalo
+
+        self._aviso = threading.Event()
+        self._parado = False
+
+    def _grupo(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=_ignora_ctrl_c)
+
+    def _lee_carpeta(self) -> None:
+
+        # Un listado de la carpeta y un stat por informe. Un informe que cambia vuelve a empezar la espera;
+        # uno que ya estaba al arrancar y lleva ESPERA segundos sin modificarse no cambia desde su fecha de modificacion.
+
+        ahora = time.monotonic()
+        informes: dict[str, tuple[Firma, float, bool]] = {}
+
+        with os.scandir(self.entrada) as entradas:
+            for entrada in entradas:
+                if not es_informe(entrada.name):
+                    continue
+                try:
+                    if not entrada.is_file():
+                        continue
+                    estado = entrada.stat()
+                except OSError:
+                    continue
+
+                firma = (estado.st_size, estado.st_mtime_ns)
+                antiguedad = time.time() - estado.st_mtime
+                anterior = self.informes.get(entrada.name)
+                if anterior is not None and anterior[0] == firma:
+                    informes[entrada.name] = (firma, anterior[1], True)
+                elif anterior is None and antiguedad >= self.espera:
+                    informes[entrada.name] = (firma, ahora - antiguedad, False)
+                else:
+                    informes[entrada.name] = (firma, ahora, False)
+
+        self.informes = informes
+
+    def _terminado(self, nombre: str, ahora: float) -> bool:
+        _, desde, repetido = self.informes[nombre]
+        return repetido and ahora - desde >= self.espera
+
+    def _se_puede_abrir(self, archivos: FicherosProyecto) -> bool:
+        for filename in (archivos.archivo_coste, archivos.archivo_venta):
+            if filename == "":
+                continue
+            try:
+                with open(filename, "rb"):
+                    pass
+            except OSError:
+                return False
+        return True
+
+    def _listos(self) -> list[tuple[str, FicherosProyecto, tuple]]:
+
+        # Proyectos con los informes terminados que no se han convertido con esos mismos informes
+
+        ahora = time.monotonic()
+        listos = []
+
+        for proyecto_id, archivos in sorted(
+            busca_proyectos(self.entrada, list(self.informes)).items()
+        ):
+            if proyecto_id in self.en_curso:
+                continue
+
+            nombres = [
+                os.path.basename(filename)
+                for filename in (archivos.archivo_coste, archivos.archivo_venta)
+                if filename != ""
+            ]
+            firma = tuple((nombre, self.informes[nombre][0]) for nombre in nombres)
+            if self.hechos.get(proyecto_id) == firma:
+                continue
+
+            if not all(self._terminado(nombre, ahora) for nombre in nombres):
+                continue
+
+            if len(nombres) == 1 and ahora - self.informes[nombres[0]][1] < self.espera_pareja:
+                continue
+
+            if not self._se_puede_abrir(archivos):
+                continue
+
+            listos.append((proyecto_id, archivos, firma))
+
+        return listos
+
+    def _lanza(self, proyecto_id: str, archivos: FicherosProyecto, firma: tuple) -> None:
+        try:
+            hashes = (
+                hash_fichero(archivos.archivo_coste),
+                hash_fichero(archivos.archivo_venta),
+            )
+        except OSError:
+            # El informe se ha movido o borrado despues de listar la carpeta; se vera en la siguiente revision
+            return
+
+        salida_al_dia = self.cache.salida_al_dia(
+            proyecto_id, archivos.archivo_coste, archivos.archivo_venta, *hashes
+        )
+        if salida_al_dia is not None:
+            self.hechos[proyecto_id] = firma
+            if self.verboso:
+                print(f"[{_hora()}] Proyecto {proyecto_id} sin cambios, ya convertido en: {salida_al_dia}")
+            return
+
+        print(f"[{_hora()}] Proyecto {proyecto_id}: informes recibidos, convirtiendo...")
+        argumentos = (
+            convierte_proyecto,
+            archivos.archivo_coste,
+            archivos.archivo_venta,
+            proyecto_id,
+            self.errores,
+            self.verboso,
+        )
+        try:
+            futuro = self._executor.submit(*argumentos, carpeta_salida=self.salida)
+        except BrokenProcessPool:
+            # Si un proceso del grupo ha muerto (por ejemplo, sin memoria), el grupo ya no admite trabajos
+            self._executor.shutdown(wait=False)
+            self._executor = self._grupo()
+            futuro = self._executor.submit(*argumentos, carpeta_salida=self.salida)
+        self.en_curso[proyecto_id] = (archivos, firma, hashes, time.monotonic(), futuro)
+        futuro.add_done_callback(lambda _: self._aviso.set())
+
+    def _recoge(self) -> None:
+
+        # Resultados de las conversiones terminadas: su salida, la cache y, con "juntar", el fichero juntado pendiente
+
+        for proyecto_id, (archivos, firma, hashes, inicio, futuro) in list(self.en_curso.items()):
+            if not futuro.done():
+                continue
+            del self.en_curso[proyecto_id]
+
+            # Las conversiones que no habian empezado al parar se convertiran al volver a vigilar
+
+            if futuro.cancelled():
+                continue
+
+            # El fichero generado es el que devuelve la conversion: si el informe se ha vuelto a exportar
+            # mientras se convertia, volver a leerlo podria dar otro rango de fechas y otro nombre
+
+            salida = None
+            try:
+                salida_proyecto, procesado, _, resultado, _ = futuro.result()
+                print(salida_proyecto, end="")
+                if procesado:
+                    salida = resultado["salida"]
+            except Exception as e:
+                print(f"Error procesando proyecto {proyecto_id}: {e}")
+
+            if salida is None:
+                self.cache.olvida_proyecto(proyecto_id)
+                self.con_errores += 1
+            else:
+                self.cache.guarda_proyecto(
+                    proyecto_id, archivos.archivo_coste, archivos.archivo_venta, *hashes, salida
+                )
+                self.convertidos += 1
+                self.juntar_pendiente = self.juntar
+                print(
+                    f"[{_hora()}] Proyecto {proyecto_id} convertido en "
+                    f"{time.monotonic() - inicio:.1f} s: {salida}"
+                )
+
+            # Con error tampoco se reintenta hasta que cambie algun informe
+
+            self.hechos[proyecto_id] = firma
+            self.cache.guarda()
+
+    def _ficheros_de_ot(self) -> list[str]:
+
+        # Ficheros OT de la carpeta de salida que se juntan. Si el ERP vuelve a exportar un proyecto con otro
+        # rango de fechas, el xlsx del rango anterior sigue en la carpeta: de cada proyecto que esta en la cache
+        # solo se junta el fichero de su ultima conversion. De los demas (por ejemplo, convertidos a mano
+        # con "todos" en otra carpeta) se juntan todos sus ficheros, como hace "juntar".
+
+        por_proyecto: dict[str, list[str]] = {}
+        for fichero in sorted(os.listdir(self.salida)):
+            match_ot = FICHERO_OT_RE.match(fichero)
+            if match_ot:
+                por_proyecto.setdefault(match_ot.group(1), []).append(fichero)
+
+        ficheros_de_ot = []
+        for proyecto_id, ficheros in por_proyecto.items():
+            salida = self.cache.salida_guardada(proyecto_id)
+            actual = os.path.basename(salida) if salida is not None else None
+            if actual in ficheros:
+                ficheros = [actual]
+            ficheros_de_ot.extend(ruta_en_carpeta(self.salida, fichero) for fichero in ficheros)
+
+        return ficheros_de_ot
+
+    def _junta(self) -> None:
+        self.juntar_pendiente = False
+        ficheros_de_ot = self._ficheros_de_ot()
+        if len(ficheros_de_ot) == 0:
+            return
+
+        nombre_fichero_salida = ruta_en_carpeta(self.salida, NOMBRE_JUNTADAS)
+        try:
+            juntar_incremental(ficheros_de_ot, nombre_fichero_salida, self.errores, self.verboso)
+        except Exception as e:
+            print(f"[{_hora()}] Error juntando los ficheros OT: {e}")
+            return
+        print(f"[{_hora()}] Fichero OT juntado guardado como: {nombre_fichero_salida}")
+
+    def revisa(self) -> None:
+
+        # Una revision: recoge las conversiones terminadas, lee la carpeta y lanza los proyectos listos
+
+        self._recoge()
+
+        try:
+            self._lee_carpeta()
+        except OSError as e:
+            # Por ejemplo, una carpeta de red que no esta disponible un momento
+            print(f"[{_hora()}] No se puede leer la carpeta {self.entrada}: {e}")
+            return
+
+        for proyecto_id, archivos, firma in self._listos():
+            self._lanza(proyecto_id, archivos, firma)
+
+        if self.juntar_pendiente and not self.en_curso:
+            self._junta()
+
+    def vigila(self) -> None:
+
+        # Revisa la carpeta hasta que se llame a para()
+
+        while not self._parado:
+            self.revisa()
+            self._aviso.wait(self.intervalo)
+            self._aviso.clear()
+
+    def para(self) -> None:
+        self._parado = True
+        self._aviso.set()
+
+    def close(self) -> None:
+
+        # Deja terminar las conversiones en curso, para no dejar ficheros a medias, y guarda sus resultados
+
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._recoge()
+        self.cache.guarda()
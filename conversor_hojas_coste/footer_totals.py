@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from operator import mul
+import re
+
+from decoder import decode_numero
+from record_store import AlmacenColumnas
+
+
+# Comprobacion de las lineas parseadas con los totales del propio informe.
+#
+# Cada seccion acaba con una linea de guiones bajos y debajo sus totales:
+#
+#                                                                      ___________                 _______________
+#                                                                         1.677,10                       14.845,22
+#
+# (cantidad e importe en materiales; cantidad, dietas, desplazamiento e importe en mano de obra) y al final
+# esta el "Total Hoja Coste", la suma de los totales de importe de las dos secciones. El fichero de coste tiene los totales
+# a coste y el de venta a venta.
+#
+# Las sumas de las lineas parseadas se llevan por lotes, segun se parsean, y los totales se leen al pasar por
+# ellos, asi que no hace falta otra pasada por el fichero. Si no coinciden, se ha perdido o se ha leido mal
+# alguna linea (por ejemplo, una rechazada o incongruente).
+#
+# El informe suma los importes sin redondear (cantidad por precio, con los decimales del precio), asi que
+# su total de importe puede no ser la suma de los importes redondeados de las lineas: se da por bueno si
+# coincide con cualquiera de las dos sumas.
+#
+# Los totales grandes no caben en su columna y ocupan parte de la de al lado, asi que no se leen por posicion:
+# son los ultimos numeros de la linea, alineados a la derecha.
+
+MATERIALES = "materiales"
+MANO_OBRA = "mano de obra"
+HOJA = "hoja"
+
+# Columnas del almacen que corresponden a cada total, por seccion y fichero
+
+COLUMNAS_TOTALES: dict[str, dict[str, list[tuple[str, str]]]] = {
+    MATERIALES: {
+        "coste": [("cantidad", "Cantidad"), ("importe", "ImporteTotalCoste")],
+        "venta": [("cantidad", "Cantidad"), ("importe", "ImporteTotalVenta")],
+    },
+    MANO_OBRA: {
+        "coste": [
+            ("cantidad", "Cantidad"),
+            ("dietas", "DietasCoste"),
+            ("desplazamiento", "DesplazamientoCoste"),
+            ("importe", "ImporteTotalCoste"),
+        ],
+        "venta": [
+            ("cantidad", "Cantidad"),
+            ("dietas", "DietasVenta"),
+            ("desplazamiento", "DesplazamientoVenta"),
+            ("importe", "ImporteTotalVenta"),
+        ],
+    },
+}
+
+IMPORTES = {"coste": "ImporteTotalCoste", "venta": "ImporteTotalVenta"}
+PRECIOS = {"coste": "PrecioUnitarioCoste", "venta": "PrecioUnitarioVenta"}
+
+TOTAL_HOJA_RE = re.compile(r"^\s+Total Hoja Coste\.*\s+(\S+)\s*$")
+CIFRA_RE = re.compile(r"\d")
+
+# Diferencia que se admite entre un total del informe, con 2 decimales, y la suma de las lineas
+
+TOLERANCIA = 0.005
+
+
+class ComprobacionTotales:
+    """Sumas de las lineas parseadas y totales del informe de cada seccion y fichero."""
+
+    def __init__(self):
+
+        # Sumas por seccion y columna del almacen
+
+        self.sumas: dict[str, dict[str, float]] = {
+            seccion: {
+                columna: 0.0
+                for columnas in por_fichero.values()
+                for _, columna in columnas
+            }
+            for seccion, por_fichero in COLUMNAS_TOTALES.items()
+        }
+
+        # Sumas de cantidad por precio por seccion y fichero, los importes sin redondear
+
+        self.productos: dict[str, dict[str, float]] = {
+            seccion: {fichero: 0.0 for fichero in PRECIOS} for seccion in COLUMNAS_TOTALES
+        }
+
+        # Totales leidos por (seccion, fichero) y linea (desde 0) en la que estan los de cada seccion y el de la hoja
+
+        self.informe: dict[tuple[str, str], list[float]] = {}
+        self.lineas: dict[str, int] = {}
+        self.total_hoja: dict[str, float] = {}
+
+        # Lineas de totales que no se han podido leer
+
+        self.no_leidas: list[str] = []
+
+    def _suma(self, seccion: str, almacen: AlmacenColumnas, desde: int) -> None:
+        sumas = self.sumas[seccion]
+        for columna in sumas:
+            sumas[columna] += sum(almacen.columna(columna, desde))
+
+        cantidades = almacen.columna("Cantidad", desde)
+        productos = self.productos[seccion]
+        for fichero, precio in PRECIOS.items():
+            productos[fichero] += sum(map(mul, cantidades, almacen.columna(precio, desde)))
+
+    def anade_materiales(self, almacen: AlmacenColumnas, desde: int = 0) -> None:
+        self._suma(MATERIALES, almacen, desde)
+
+    def anade_mano_obra(self, almacen: AlmacenColumnas, desde: int = 0) -> None:
+        self._suma(MANO_OBRA, almacen, desde)
+
+    def _lee_totales(
+        self, seccion: str, fichero: str, linea: str, numero_linea: int
+    ) -> None:
+        campos = COLUMNAS_TOTALES[seccion][fichero]
+        textos = linea.split()
+        try:
+            if len(textos) != len(campos):
+                raise ValueError(linea)
+            self.informe[(seccion, fichero)] = [decode_numero(texto) for texto in textos]
+        except ValueError:
+            self.no_leidas.append(
+                f"No se han podido leer los totales de {seccion} del fichero de {fichero} "
+                f"en la línea {numero_linea + 1}: {linea.strip()}"
+            )
+
+    def lee_pie(
+        self,
+        seccion: str,
+        guias: list[str],
+        costes: list[str],
+        ventas: list[str],
+        primera: int,
+        desde: int,
+        hasta: int,
+        use_cost: bool,
+        use_sell: bool,
+    ) -> None:
+
+        # Segmento de totales de la seccion: los totales son la primera linea con alguna cifra, despues de
+        # la de guiones y de las lineas en blanco. El segmento puede llegar partido en dos bloques.
+
+        if seccion in self.lineas:
+            return
+
+        for i in range(desde, hasta):
+            if CIFRA_RE.search(guias[i]) is None:
+                continue
+
+            self.lineas[seccion] = primera + i
+            if use_cost:
+                self._lee_totales(seccion, "coste", costes[i], primera + i)
+            if use_sell:
+                self._lee_totales(seccion, "venta", ventas[i], primera + i)
+            return
+
+    def lee_fin(
+        self,
+        guias: list[str],
+        costes: list[str],
+        ventas: list[str],
+        primera: int,
+        desde: int,
+        hasta: int,
+        use_cost: bool,
+        use_sell: bool,
+    ) -> bool:
+
+        # Lineas despues de los guiones de mano de obra: sus totales y el total de la hoja.
+        # Devuelve True cuando ya se ha leido el total de la hoja y no hace falta seguir leyendo.
+
+        for i in range(desde, hasta):
+            if MANO_OBRA not in self.lineas:
+                self.lee_pie(
+                    MANO_OBRA, guias, costes, ventas, primera, i, i + 1, use_cost, use_sell
+                )
+                continue
+
+            if TOTAL_HOJA_RE.match(guias[i]) is None:
+                continue
+
+            self.lineas[HOJA] = primera + i
+            for fichero, linea, usado in (
+                ("coste", costes[i], use_cost),
+                ("venta", ventas[i], use_sell),
+            ):
+                if not usado:
+                    continue
+                match = TOTAL_HOJA_RE.match(linea)
+                try:
+                    if match is None:
+                        raise ValueError(linea)
+                    self.total_hoja[fichero] = decode_numero(match.group(1))
+                except ValueError:
+                    self.no_leidas.append(
+                        f"No se ha podido leer el total de la hoja del fichero de {fichero} "
+                        f"en la línea {primera + i + 1}: {linea.strip()}"
+                    )
+            return True
+
+        return False
+
+    def _importes(self, seccion: str, fichero: str) -> tuple[float, float]:
+
+        # Suma de los importes de las lineas y de los importes sin redondear, con las dietas y desplazamientos
+
+        sin_redondear = self.productos[seccion][fichero]
+        if seccion == MANO_OBRA:
+            sufijo = fichero.capitalize()
+            sin_redondear += self.sumas[seccion][f"Dietas{sufijo}"]
+            sin_redondear += self.sumas[seccion][f"Desplazamiento{sufijo}"]
+        return self.sumas[seccion][IMPORTES[fichero]], sin_redondear
+
+    def diferencias(self) -> list[dict]:
+
+        # Totales del informe que no coinciden con las lineas; de los importes se da la suma mas cercana
+
+        diferencias = []
+
+        def compara(seccion: str, fichero: str, campo: str, linea: int, valor: float, sumas) -> None:
+            calculado = min(sumas, key=lambda suma: abs(suma - valor))
+            if abs(calculado - valor) > TOLERANCIA:
+                diferencias.append(
+                    {
+                        "seccion": seccion,
+                        "fichero": fichero,
+                        "campo": campo,
+                        "linea": linea + 1,
+                        "informe": valor,
+                        "lineas": round(calculado, 2),
+                    }
+                )
+
+        for (seccion, fichero), valores in self.informe.items():
+            for (campo, columna), valor in zip(COLUMNAS_TOTALES[seccion][fichero], valores):
+                sumas = (
+                    self._importes(seccion, fichero)
+                    if campo == "importe"
+                    else (self.sumas[seccion][columna],)
+                )
+                compara(seccion, fichero, campo, self.lineas[seccion], valor, sumas)
+
+        # El total de la hoja es la suma de los totales de importe de las dos secciones, que ya se han comparado
+        # con las lineas. Si falta el de alguna, se usan las sumas de sus lineas.
+
+        for fichero, valor in self.total_hoja.items():
+            materiales, mano_obra = (
+                (self.informe[(seccion, fichero)][-1],)
+                if (seccion, fichero) in self.informe
+                else self._importes(seccion, fichero)
+                for seccion in (MATERIALES, MANO_OBRA)
+            )
+            sumas = [importe + otro for importe in materiales for otro in mano_obra]
+            compara(HOJA, fichero, "importe", self.lineas[HOJA], valor, sumas)
+
+        return diferencias
+
+    def sin_totales(self) -> list[str]:
+
+        # Secciones (o la hoja) de las que no se han encontrado los totales
+
+        return [
+            seccion for seccion in (MATERIALES, MANO_OBRA, HOJA) if seccion not in self.lineas
+        ]
+
+    def muestra(self) -> None:
+        diferencias = self.diferencias()
+        sin_totales = self.sin_totales()
+        if not diferencias and not sin_totales and not self.no_leidas:
+            return
+
+        print(f"Totales del informe: {len(diferencias)} no coinciden con las líneas parseadas")
+        for diferencia in diferencias:
+            print(
+                f"Total de {diferencia['campo']} de {diferencia['seccion']} del fichero de {diferencia['fichero']} "
+                f"(línea {diferencia['linea']}): {diferencia['informe']:.2f} en el informe, "
+                f"{diferencia['lineas']:.2f} en las líneas parseadas"
+            )
+        for seccion in sin_totales:
+            if seccion == HOJA:
+                print("No se ha encontrado el total de la hoja.")
+            else:
+                print(f"No se han encontrado los totales de {seccion}.")
+        for mensaje in self.no_leidas:
+            print(mensaje)
+
+    def como_dict(self) -> dict:
+        return {
+            "diferencias": self.diferencias(),
+            "sin_totales": self.sin_totales(),
+            "no_leidos": self.no_leidas,
+        }
@@ -1,6 +1,23 @@
 from __future__ import annotations
+from typing import Any
 import datetime
 
+from decoder import decode_fecha, decode_numero
+from batch_parse import CamposNumericos, FormatoSeccion, parse_lote
+
+
+# Los campos tienen un ancho de caracteres constante, asi que podemos usar slicing para extraer los campos:
+OPERACION_ID_END = 4
+OPERACION_END = 29
+FECHA_END = 40
+OPERARIO_ID_END = 45
+OPERARIO_NOMBRE_END = 70
+CANTIDAD_END = 78
+PRECIO_END = 86
+DIETRAS_END = 95
+DESPLAZAMIENTO_END = 102
+IMPORTE_END = 113
+
 
 class JobLine:
     def __init__(
@@ -37,12 +54,47 @@ class JobLine:
         return f"{self.Operacion} | {self.FechaStr} | {self.OperarioId} | {self.OperarioNombre} | {self.CantidadStr} | {self.PrecioUnitarioCosteStr} | {self.DietasCosteStr} | {self.DesplazamientoCosteStr} | {self.DietasVentaStr} | {self.DesplazamientoVentaStr} | {self.ImporteTotalCosteStr} | {self.ImporteTotalVentaStr}"
 
     class NotValidError(Exception):
-        def __init__(self, message: str):
-            super().__init__(message)
+        pass
 
     class IncongruentError(Exception):
-        def __init__(self, message: str):
-            super().__init__(message)
+
+        # Guarda ademas el campo y los valores de coste y venta, para el informe de conciliacion
+
+        def __init__(
+            self,
+            mensaje: str,
+            campo: str = "",
+            coste: str = "",
+            venta: str = "",
+            numero_linea: int = -1,
+        ):
+            super().__init__(mensaje)
+            self.campo = campo
+            self.coste = coste
+            self.venta = venta
+            self.numero_linea = numero_linea
+
+    @staticmethod
+    def error_fecha(fecha_str: str, line_number: int) -> JobLine.NotValidError:
+        if fecha_str == "":
+            return JobLine.NotValidError(
+                f"Error Linea invalida - Fecha vacia en linea {line_number + 1}: {fecha_str}"
+            )
+        return JobLine.NotValidError(
+            f"Error Linea invalida - Fecha con formato incorrecto en linea {line_number + 1}: {fecha_str}"
+        )
+
+    @staticmethod
+    def error_incongruencia(
+        field_name: str, cost_value: str, sell_value: str, line_number: int
+    ) -> JobLine.IncongruentError:
+        return JobLine.IncongruentError(
+            f"Error Incongruencia - {field_name} no congruente entre coste y venta en linea {line_number + 1}: {cost_value} != {sell_value}",
+            field_name,
+            cost_value,
+            sell_value,
+            line_number,
+        )
 
     @staticmethod
     def parse(
@@ -61,18 +113,6 @@ class JobLine:
 
         job_line = JobLine(line_number)
 
-        # Los campos tienen un ancho de caracteres constante, asi que podemos usar slicing para extraer los campos:
-        OPERACION_ID_END = 4
-        OPERACION_END = 29
-        FECHA_END = 40
-        OPERARIO_ID_END = 45
-        OPERARIO_NOMBRE_END = 70
-        CANTIDAD_END = 78
-        PRECIO_END = 86
-        DIETRAS_END = 95
-        DESPLAZAMIENTO_END = 102
-        IMPORTE_END = 113
-
         job_line.OperacionId = line_guide[0:OPERACION_ID_END].strip()
         job_line.Operacion = line_guide[OPERACION_ID_END:OPERACION_END].strip()
         job_line.FechaStr = line_guide[OPERACION_END:FECHA_END].strip()
@@ -107,18 +147,12 @@ class JobLine:
         # Checkear que los campos tienen un formato correcto, ya sean numeros o fechas
 
         if job_line.FechaStr == "":
-            raise JobLine.NotValidError(
-                f"Error Linea invalida - Fecha vacia en linea {line_number + 1}: {job_line.FechaStr}"
-            )
+            raise JobLine.error_fecha(job_line.FechaStr, line_number)
 
         try:
-            job_line.Fecha = datetime.datetime.strptime(
-                job_line.FechaStr, "%d/%m/%Y"
-            ).date()
+            job_line.Fecha = decode_fecha(job_line.FechaStr)
         except ValueError:
-            raise JobLine.NotValidError(
-                f"Error Linea invalida - Fecha con formato incorrecto en linea {line_number + 1}: {job_line.FechaStr}"
-            )
+            raise JobLine.error_fecha(job_line.FechaStr, line_number)
 
         if job_line.CantidadStr == "":
             raise JobLine.NotValidError(
@@ -126,9 +160,7 @@ class JobLine:
             )
 
         try:
-            job_line.Cantidad = float(
-                job_line.CantidadStr.replace(".", "").replace(",", ".")
-            )
+            job_line.Cantidad = decode_numero(job_line.CantidadStr)
         except ValueError:
             raise JobLine.NotValidError(
                 f"Error Linea invalida - Cantidad con formato incorrecto en linea {line_number + 1}: {job_line.CantidadStr}"
@@ -140,11 +172,7 @@ class JobLine:
                     f"Error Linea invalida - PrecioUnitarioCoste vacio en linea {line_number + 1}: {job_line.PrecioUnitarioCosteStr}"
                 )
             try:
-                job_line.PrecioUnitarioCoste = float(
-                    job_line.PrecioUnitarioCosteStr.replace(".", "").replace(
-                        ",", "."
-                    )
-                )
+                job_line.PrecioUnitarioCoste = decode_numero(job_line.PrecioUnitarioCosteStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - PrecioUnitarioCoste con formato incorrecto en linea {line_number + 1}: {job_line.PrecioUnitarioCosteStr}"
@@ -155,11 +183,7 @@ class JobLine:
                     f"Error Linea invalida - ImporteTotalCoste vacio en linea {line_number + 1}: {job_line.ImporteTotalCosteStr}"
                 )
             try:
-                job_line.ImporteTotalCoste = float(
-                    job_line.ImporteTotalCosteStr.replace(".", "").replace(
-                        ",", "."
-                    )
-                )
+                job_line.ImporteTotalCoste = decode_numero(job_line.ImporteTotalCosteStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - ImporteTotalCoste con formato incorrecto en linea {line_number + 1}: {job_line.ImporteTotalCosteStr}"
@@ -170,9 +194,7 @@ class JobLine:
                     f"Error Linea invalida - DietasCoste vacio en linea {line_number + 1}: {job_line.DietasCosteStr}"
                 )
             try:
-                job_line.DietasCoste = float(
-                    job_line.DietasCosteStr.replace(".", "").replace(",", ".")
-                )
+                job_line.DietasCoste = decode_numero(job_line.DietasCosteStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - DietasCoste con formato incorrecto en linea {line_number + 1}: {job_line.DietasCosteStr}"
@@ -183,11 +205,7 @@ class JobLine:
                     f"Error Linea invalida - DesplazamientoCoste vacio en linea {line_number + 1}: {job_line.DesplazamientoCosteStr}"
                 )
             try:
-                job_line.DesplazamientoCoste = float(
-                    job_line.DesplazamientoCosteStr.replace(".", "").replace(
-                        ",", "."
-                    )
-                )
+                job_line.DesplazamientoCoste = decode_numero(job_line.DesplazamientoCosteStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - DesplazamientoCoste con formato incorrecto en linea {line_number + 1}: {job_line.DesplazamientoCosteStr}"
@@ -199,11 +217,7 @@ class JobLine:
                     f"Error Linea invalida - PrecioUnitarioVenta vacio en linea {line_number + 1}: {job_line.PrecioUnitarioVentaStr}"
                 )
             try:
-                job_line.PrecioUnitarioVenta = float(
-                    job_line.PrecioUnitarioVentaStr.replace(".", "").replace(
-                        ",", "."
-                    )
-                )
+                job_line.PrecioUnitarioVenta = decode_numero(job_line.PrecioUnitarioVentaStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - PrecioUnitarioVenta con formato incorrecto en linea {line_number + 1}: {job_line.PrecioUnitarioVentaStr}"
@@ -214,11 +228,7 @@ class JobLine:
                     f"Error Linea invalida - ImporteTotalVenta vacio en linea {line_number + 1}: {job_line.ImporteTotalVentaStr}"
                 )
             try:
-                job_line.ImporteTotalVenta = float(
-                    job_line.ImporteTotalVentaStr.replace(".", "").replace(
-                        ",", "."
-                    )
-                )
+                job_line.ImporteTotalVenta = decode_numero(job_line.ImporteTotalVentaStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - ImporteTotalVenta con formato incorrecto en linea {line_number + 1}: {job_line.ImporteTotalVentaStr}"
@@ -229,9 +239,7 @@ class JobLine:
                     f"Error Linea invalida - DietasVenta vacio en linea {line_number + 1}: {job_line.DietasVentaStr}"
                 )
             try:
-                job_line.DietasVenta = float(
-                    job_line.DietasVentaStr.replace(".", "").replace(",", ".")
-                )
+                job_line.DietasVenta = decode_numero(job_line.DietasVentaStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - DietasVenta con formato incorrecto en linea {line_number + 1}: {job_line.DietasVentaStr}"
@@ -242,11 +250,7 @@ class JobLine:
                     f"Error Linea invalida - DesplazamientoVenta vacio en linea {line_number + 1}: {job_line.DesplazamientoVentaStr}"
                 )
             try:
-                job_line.DesplazamientoVenta = float(
-                    job_line.DesplazamientoVentaStr.replace(".", "").replace(
-                        ",", "."
-                    )
-                )
+                job_line.DesplazamientoVenta = decode_numero(job_line.DesplazamientoVentaStr)
             except ValueError:
                 raise JobLine.NotValidError(
                     f"Error Linea invalida - DesplazamientoVenta con formato incorrecto en linea {line_number + 1}: {job_line.DesplazamientoVentaStr}"
@@ -256,42 +260,94 @@ class JobLine:
 
         if use_venta and use_coste:
 
-            for field_name, cost_value, sell_value in [
-                (
-                    "OperacionId",
-                    line_cost[0:OPERACION_ID_END].strip(),
-                    line_sell[0:OPERACION_ID_END].strip(),
-                ),
-                (
-                    "Operacion",
-                    line_cost[OPERACION_ID_END:OPERACION_END].strip(),
-                    line_sell[OPERACION_ID_END:OPERACION_END].strip(),
-                ),
-                (
-                    "Fecha",
-                    line_cost[OPERACION_END:FECHA_END].strip(),
-                    line_sell[OPERACION_END:FECHA_END].strip(),
-                ),
-                (
-                    "Operario_Id",
-                    line_cost[FECHA_END:OPERARIO_ID_END].strip(),
-                    line_sell[FECHA_END:OPERARIO_ID_END].strip(),
-                ),
-                (
-                    "Operario_Nombre",
-                    line_cost[OPERARIO_ID_END:OPERARIO_NOMBRE_END].strip(),
-                    line_sell[OPERARIO_ID_END:OPERARIO_NOMBRE_END].strip(),
-                ),
-                (
-                    "Cantidad",
-                    line_cost[OPERARIO_NOMBRE_END:CANTIDAD_END].strip(),
-                    line_sell[OPERARIO_NOMBRE_END:CANTIDAD_END].strip(),
-                ),
-            ]:
-                if cost_value != sell_value:
-                    raise JobLine.IncongruentError(
-                        f"Error Incongruencia - {field_name} no congruente entre coste y venta en linea {line_number + 1}: {cost_value} != {sell_value}"
-                    )
+            error = FORMATO_MANO_OBRA.incongruencia(line_cost, line_sell, line_number)
+            if error is not None:
+                raise error
 
         # Return a JobLine object
         return job_line
+
+    @staticmethod
+    def parse_batch(
+        lines_cost: list[str],
+        lines_sell: list[str],
+        line_numbers: list[int],
+        use_coste: bool,
+        use_venta: bool,
+    ) -> tuple[dict[str, list[Any]], list[Exception]]:
+
+        # Parsea de una vez todas las lineas candidatas de la seccion de mano de obra.
+        # Devuelve las columnas de las lineas validas, con los mismos nombres que los atributos de JobLine,
+        # y los errores NotValidError / IncongruentError en orden de linea.
+
+        return parse_lote(
+            FORMATO_MANO_OBRA,
+            lines_cost,
+            lines_sell,
+            line_numbers,
+            use_coste,
+            use_venta,
+        )
+
+
+FORMATO_MANO_OBRA = FormatoSeccion(
+    fecha=(OPERACION_END, FECHA_END),
+    textos=[
+        ("OperacionId", 0, OPERACION_ID_END),
+        ("Operacion", OPERACION_ID_END, OPERACION_END),
+        ("OperarioId", FECHA_END, OPERARIO_ID_END),
+        ("OperarioNombre", OPERARIO_ID_END, OPERARIO_NOMBRE_END),
+    ],
+    numeros_coste=CamposNumericos(
+        OPERARIO_NOMBRE_END,
+        [
+            ("Cantidad", CANTIDAD_END - OPERARIO_NOMBRE_END),
+            ("PrecioUnitarioCoste", PRECIO_END - CANTIDAD_END),
+            ("DietasCoste", DIETRAS_END - PRECIO_END),
+            ("DesplazamientoCoste", DESPLAZAMIENTO_END - DIETRAS_END),
+            ("ImporteTotalCoste", IMPORTE_END - DESPLAZAMIENTO_END),
+        ],
+    ),
+    numeros_solo_venta=CamposNumericos(
+        OPERARIO_NOMBRE_END,
+        [
+            ("Cantidad", CANTIDAD_END - OPERARIO_NOMBRE_END),
+            ("PrecioUnitarioVenta", PRECIO_END - CANTIDAD_END),
+            ("DietasVenta", DIETRAS_END - PRECIO_END),
+            ("DesplazamientoVenta", DESPLAZAMIENTO_END - DIETRAS_END),
+            ("ImporteTotalVenta", IMPORTE_END - DESPLAZAMIENTO_END),
+        ],
+    ),
+    numeros_venta=CamposNumericos(
+        CANTIDAD_END,
+        [
+            ("PrecioUnitarioVenta", PRECIO_END - CANTIDAD_END),
+            ("DietasVenta", DIETRAS_END - PRECIO_END),
+            ("DesplazamientoVenta", DESPLAZAMIENTO_END - DIETRAS_END),
+            ("ImporteTotalVenta", IMPORTE_END - DESPLAZAMIENTO_END),
+        ],
+    ),
+    congruencia=[
+        ("OperacionId", 0, OPERACION_ID_END),
+        ("Operacion", OPERACION_ID_END, OPERACION_END),
+        ("Fecha", OPERACION_END, FECHA_END),
+        ("Operario_Id", FECHA_END, OPERARIO_ID_END),
+        ("Operario_Nombre", OPERARIO_ID_END, OPERARIO_NOMBRE_END),
+        ("Cantidad", OPERARIO_NOMBRE_END, CANTIDAD_END),
+    ],
+    numericas=[
+        "Cantidad",
+        "PrecioUnitarioCoste",
+        "ImporteTotalCoste",
+        "DietasCoste",
+        "DesplazamientoCoste",
+        "PrecioUnitarioVenta",
+        "ImporteTotalVenta",
+        "DietasVenta",
+        "DesplazamientoVenta",
+    ],
+    parse=JobLine.parse,
+    errores_linea=(JobLine.NotValidError, JobLine.IncongruentError),
+    error_fecha=JobLine.error_fecha,
+    error_incongruencia=JobLine.error_incongruencia,
+)
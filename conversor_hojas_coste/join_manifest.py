@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import zipfile
+
+from conversion_cache import hash_fichero
+from join_ot import juntar_ficheros
+from stage_timing import etapa
+from summaries import ResumenCostes
+from xlsx_writer import HOJAS_RESUMEN, XlsxWriter
+
+
+# Juntar incremental.
+#
+# Junto al fichero juntado (OT_juntadas.xlsx) se guarda un manifiesto JSON con los ficheros OT que lo forman,
+# en orden, cada uno con su tamaño, fecha de modificacion y hash, y el rango de filas que ocupa en cada hoja.
+#
+# Al volver a juntar, solo se leen los ficheros OT nuevos o modificados, y se escriben con XlsxWriter en un
+# xlsx temporal. El nuevo fichero juntado se monta copiando directamente el xml de las filas de cada OT,
+# del fichero juntado anterior si no ha cambiado o del temporal si es nuevo o ha cambiado, renumerando las filas
+# que se han desplazado. Asi no se vuelven a leer ni a generar con openpyxl las filas de las OT que no cambian.
+#
+# Las hojas de resumen no se pueden montar por partes: el manifiesto guarda los totales de cada fichero OT
+# y las hojas se vuelven a generar sumando, en orden, los de todos los ficheros.
+#
+# El resultado es el mismo que juntando todo de nuevo. Si el fichero juntado se ha modificado desde que se
+# genero, o no coincide con el manifiesto, se junta todo de nuevo.
+
+VERSION_MANIFIESTO = 2
+
+# Hojas del fichero juntado y sus tablas, en el orden en que las crea XlsxWriter
+
+HOJAS = [
+    ("materiales", "xl/worksheets/sheet1.xml", "xl/tables/table1.xml"),
+    ("mano_obra", "xl/worksheets/sheet2.xml", "xl/tables/table2.xml"),
+]
+
+# Las hojas de resumen van despues
+
+HOJAS_TOTALES = [
+    f"xl/worksheets/sheet{numero}.xml"
+    for numero in range(len(HOJAS) + 1, len(HOJAS) + len(HOJAS_RESUMEN) + 1)
+]
+
+ESTILOS = "xl/styles.xml"
+PROPIEDADES = "docProps/core.xml"
+
+FILA_RE = re.compile(rb"<row[ >]")
+REFERENCIA_RE = re.compile(rb'(<row r="|<c r="[A-Z]*)(\d+)"')
+RANGO_TABLA_RE = re.compile(rb'ref="A1:([A-Z]+)\d+"')
+
+
+def ruta_manifiesto(salida: str) -> str:
+    carpeta, nombre = os.path.split(salida)
+    return os.path.join(carpeta, f".{nombre}.json")
+
+
+def _estado_fichero(fichero: str) -> tuple[int, int]:
+    estado = os.stat(fichero)
+    return estado.st_size, estado.st_mtime_ns
+
+
+class ManifiestoJuntadas:
+    """Ficheros OT que forman el fichero juntado y las filas que ocupa cada uno en cada hoja."""
+
+    class NoValido(Exception):
+        pass
+
+    def __init__(self, salida: str):
+        self.salida = salida
+        self.filename = ruta_manifiesto(salida)
+
+        # Entradas por nombre de fichero OT, en el orden en que estan en el fichero juntado
+
+        self.ficheros: dict[str, dict] = {}
+
+    @classmethod
+    def lee(cls, salida: str) -> ManifiestoJuntadas | None:
+
+        # Devuelve None si no hay manifiesto o si el fichero juntado no es el que se genero con el
+
+        manifiesto = cls(salida)
+
+        try:
+            with open(manifiesto.filename, "r", encoding="utf-8") as file:
+                datos = json.load(file)
+            tamano, mtime = _estado_fichero(salida)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            not isinstance(datos, dict)
+            or datos.get("version") != VERSION_MANIFIESTO
+            or datos.get("tamano_salida") != tamano
+            or datos.get("mtime_salida") != mtime
+        ):
+            return None
+
+        for entrada in datos.get("ficheros", []):
+            manifiesto.ficheros[entrada["nombre"]] = entrada
+
+        return manifiesto
+
+    @classmethod
+    def de_filas(
+        cls, salida: str, filas_por_fichero: list[tuple[str, int, int, ResumenCostes]]
+    ) -> ManifiestoJuntadas:
+
+        # Manifiesto de un fichero juntado entero, a partir de las filas que devuelve juntar_ficheros
+
+        manifiesto = cls(salida)
+        desde = {clave: 0 for clave, _, _ in HOJAS}
+
+        for fichero, filas_materiales, filas_mano_obra, resumen in filas_por_fichero:
+            tamano, mtime = _estado_fichero(fichero)
+            with etapa("comprobacion", 1):
+                hash_contenido = hash_fichero(fichero)
+            entrada = {
+                "nombre": fichero,
+                "tamano": tamano,
+                "mtime": mtime,
+                "hash": hash_contenido,
+            }
+            for clave, filas in (
+                ("materiales", filas_materiales),
+                ("mano_obra", filas_mano_obra),
+            ):
+                entrada[clave] = [desde[clave], filas]
+                desde[clave] += filas
+            entrada["resumen"] = resumen.como_dict()
+            manifiesto.ficheros[fichero] = entrada
+
+        return manifiesto
+
+    def sin_cambios(self, fichero: str) -> bool:
+
+        # Un fichero no ha cambiado si tiene el mismo tamaño y fecha, o si tiene el mismo contenido.
+        # En ese caso se actualiza su fecha para no tener que volver a calcular el hash.
+
+        entrada = self.ficheros.get(fichero)
+        if entrada is None:
+            return False
+
+        tamano, mtime = _estado_fichero(fichero)
+        if entrada["tamano"] == tamano and entrada["mtime"] == mtime:
+            return True
+
+        if entrada["hash"] != hash_fichero(fichero):
+            return False
+
+        entrada["tamano"] = tamano
+        entrada["mtime"] = mtime
+        return True
+
+    def guarda(self) -> None:
+        tamano, mtime = _estado_fichero(self.salida)
+
+        temporal = f"{self.filename}.tmp"
+        with open(temporal, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "version": VERSION_MANIFIESTO,
+                    "tamano_salida": tamano,
+                    "mtime_salida": mtime,
+                    "ficheros": list(self.ficheros.values()),
+                },
+                file,
+                indent=2,
+            )
+        os.replace(temporal, self.filename)
+
+
+class _XmlHoja:
+    """Xml de una hoja escrita por XlsxWriter, separado en la cabecera, cada fila de datos y el final."""
+
+    def __init__(self, datos: bytes):
+        self.datos = datos
+        self.fin = datos.index(b"</sheetData>")
+
+        inicios = [m.start() for m in FILA_RE.finditer(datos, 0, self.fin)]
+        if len(inicios) == 0:
+            raise ManifiestoJuntadas.NoValido("la hoja no tiene cabecera")
+
+        # La primera fila es la cabecera
+
+        self.inicios = inicios[1:]
+        self.cabecera = datos[: self.inicios[0] if self.inicios else self.fin]
+        self.final = datos[self.fin :]
+
+    def __len__(self) -> int:
+        return len(self.inicios)
+
+    def filas(self, desde: int, filas: int) -> bytes:
+        if filas == 0:
+            return b""
+        hasta = desde + filas
+        if hasta > len(self.inicios):
+            raise ManifiestoJuntadas.NoValido("faltan filas en la hoja")
+        fin = self.inicios[hasta] if hasta < len(self.inicios) else self.fin
+        return self.datos[self.inicios[desde] : fin]
+
+
+def _renumera(xml: bytes, desplazamiento: int) -> bytes:
+
+    # Desplaza los numeros de fila de las filas y celdas
+
+    if desplazamiento == 0:
+        return xml
+
+    return REFERENCIA_RE.sub(
+        lambda m: m[1] + str(int(m[2]) + desplazamiento).encode() + b'"', xml
+    )
+
+
+def _hojas_resumen(resultado: ManifiestoJuntadas, estilos: bytes) -> dict[str, bytes]:
+
+    # Xml de las hojas de resumen con los totales de los ficheros del manifiesto, en su orden.
+    # Se escriben con XlsxWriter en un xlsx temporal sin filas, que tiene que tener los mismos estilos.
+
+    total = ResumenCostes()
+    for entrada in resultado.ficheros.values():
+        total.junta(ResumenCostes.de_dict(entrada["resumen"]))
+
+    carpeta, nombre = os.path.split(resultado.salida)
+    temporal = os.path.join(carpeta, f".{nombre}.resumen.xlsx")
+
+    try:
+        writer = XlsxWriter(temporal)
+        writer.add_resumen(total)
+        writer.close()
+
+        with zipfile.ZipFile(temporal) as zip_resumen:
+            if zip_resumen.read(ESTILOS) != estilos:
+                raise ManifiestoJuntadas.NoValido("los estilos no coinciden")
+            return {ruta: zip_resumen.read(ruta) for ruta in HOJAS_TOTALES}
+
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _monta_juntadas(
+    anterior: ManifiestoJuntadas,
+    ficheros_de_ot: list[str],
+    temporal: str | None,
+    filas_nuevas: list[tuple[str, int, int, ResumenCostes]],
+) -> ManifiestoJuntadas:
+
+    # Escribe el nuevo fichero juntado con las filas de los ficheros de ficheros_de_ot, en ese orden, sacadas
+    # del fichero juntado anterior o del temporal con los ficheros nuevos o modificados. Devuelve su manifiesto.
+
+    salida = anterior.salida
+
+    # Filas de los ficheros nuevos o modificados en el xlsx temporal
+
+    nuevas = ManifiestoJuntadas.de_filas(salida, filas_nuevas)
+    resultado = ManifiestoJuntadas(salida)
+
+    carpeta, nombre = os.path.split(salida)
+    montado = os.path.join(carpeta, f".{nombre}.tmp")
+
+    zip_anterior = zipfile.ZipFile(salida)
+    zip_nuevas = zipfile.ZipFile(temporal) if temporal is not None else None
+
+    try:
+        # Las filas copiadas llevan los indices de estilo del fichero del que salen
+
+        if zip_nuevas is not None and zip_anterior.read(ESTILOS) != zip_nuevas.read(ESTILOS):
+            raise ManifiestoJuntadas.NoValido("los estilos no coinciden")
+
+        contenidos: dict[str, bytes] = {}
+
+        for fichero in ficheros_de_ot:
+            resultado.ficheros[fichero] = dict(
+                nuevas.ficheros.get(fichero) or anterior.ficheros[fichero]
+            )
+
+        for clave, ruta_hoja, ruta_tabla in HOJAS:
+            hoja_anterior = _XmlHoja(zip_anterior.read(ruta_hoja))
+            if len(hoja_anterior) != sum(
+                entrada[clave][1] for entrada in anterior.ficheros.values()
+            ):
+                raise ManifiestoJuntadas.NoValido(
+                    "el número de filas no coincide con el manifiesto"
+                )
+
+            hoja_nuevas = (
+                _XmlHoja(zip_nuevas.read(ruta_hoja)) if zip_nuevas is not None else None
+            )
+
+            partes = [hoja_anterior.cabecera]
+            fila = 0
+
+            for fichero in ficheros_de_ot:
+                if fichero in nuevas.ficheros:
+                    origen = hoja_nuevas
+                    desde, filas = nuevas.ficheros[fichero][clave]
+                else:
+                    origen = hoja_anterior
+                    desde, filas = anterior.ficheros[fichero][clave]
+
+                partes.append(_renumera(origen.filas(desde, filas), fila - desde))
+                resultado.ficheros[fichero][clave] = [fila, filas]
+                fila += filas
+
+            partes.append(hoja_anterior.final)
+            contenidos[ruta_hoja] = b"".join(partes)
+
+            contenidos[ruta_tabla] = RANGO_TABLA_RE.sub(
+                lambda m: b'ref="A1:' + m[1] + str(fila + 1).encode() + b'"',
+                zip_anterior.read(ruta_tabla),
+            )
+
+        contenidos.update(_hojas_resumen(resultado, zip_anterior.read(ESTILOS)))
+
+        if zip_nuevas is not None:
+            contenidos[PROPIEDADES] = zip_nuevas.read(PROPIEDADES)
+
+        with zipfile.ZipFile(montado, "w", zipfile.ZIP_DEFLATED) as zip_montado:
+            for info in zip_anterior.infolist():
+                datos = contenidos.get(info.filename)
+                if datos is None:
+                    datos = zip_anterior.read(info.filename)
+                info_montado = zipfile.ZipInfo(info.filename, info.date_time)
+                info_montado.external_attr = info.external_attr
+                zip_montado.writestr(
+                    info_montado, datos, compress_type=info.compress_type
+                )
+
+    except BaseException:
+        if os.path.exists(montado):
+            os.remove(montado)
+        raise
+
+    finally:
+        zip_anterior.close()
+        if zip_nuevas is not None:
+            zip_nuevas.close()
+
+    os.replace(montado, salida)
+
+    return resultado
+
+
+def juntar_incremental(
+    ficheros_de_ot: list[str],
+    nombre_fichero_salida: str,
+    errores: bool,
+    verboso: bool,
+    jobs: int = 1,
+    forzar: bool = False,
+) -> None:
+
+    # Como juntar_ficheros, pero si ya existe el fichero juntado con su manifiesto solo lee los ficheros OT
+    # nuevos o modificados. Con forzar, o si no se puede hacer de forma incremental, junta todo de nuevo.
+
+    ficheros_de_ot = sorted(ficheros_de_ot)
+
+    anterior = None if forzar else ManifiestoJuntadas.lee(nombre_fichero_salida)
+
+    if anterior is not None:
+        with etapa("comprobacion", len(ficheros_de_ot)):
+            cambiados = [
+                fichero for fichero in ficheros_de_ot if not anterior.sin_cambios(fichero)
+            ]
+        borrados = set(anterior.ficheros).difference(ficheros_de_ot)
+
+        if len(cambiados) == 0 and len(borrados) == 0:
+            print(f"{nombre_fichero_salida} ya está al día.")
+            anterior.guarda()
+            return
+
+        print(
+            f"Ficheros OT nuevos o modificados: {len(cambiados)}, quitados: {len(borrados)}, "
+            f"sin cambios: {len(ficheros_de_ot) - len(cambiados)}"
+        )
+
+        carpeta, nombre = os.path.split(nombre_fichero_salida)
+        temporal = os.path.join(carpeta, f".{nombre}.nuevas.xlsx") if cambiados else None
+
+        try:
+            filas_nuevas = (
+                juntar_ficheros(cambiados, temporal, errores, verboso, jobs)
+                if temporal is not None
+                else []
+            )
+            with etapa("montaje", len(ficheros_de_ot)):
+                montado = _monta_juntadas(anterior, ficheros_de_ot, temporal, filas_nuevas)
+            montado.guarda()
+            return
+        except ManifiestoJuntadas.NoValido as e:
+            print(f"No se puede juntar de forma incremental ({e}), se junta todo de nuevo.")
+        finally:
+            if temporal is not None and os.path.exists(temporal):
+                os.remove(temporal)
+
+    filas_por_fichero = juntar_ficheros(
+        ficheros_de_ot, nombre_fichero_salida, errores, verboso, jobs
+    )
+    ManifiestoJuntadas.de_filas(nombre_fichero_salida, filas_por_fichero).guarda()
@@ -1,67 +1,223 @@
-import datetime
-from openpyxl import Workbook, load_workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Iterator
+import os
+
+from openpyxl import load_workbook
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+from output_formats import Escritor, escritor
+from stage_timing import cuenta, etapa
+from summaries import ResumenCostes
+from xlsx_writer import HOJA_MATERIALES, HOJA_MANO_OBRA
+
+# Filas que se leen de una vez de un fichero OT antes de escribirlas en el fichero de salida
+
+TAMANO_BLOQUE_FILAS = 1000
+
+
+def lee_filas_ot(
+    fichero: str,
+) -> tuple[list[tuple[Any, ...]], list[tuple[Any, ...]], ResumenCostes]:
+
+    # Lee las filas de datos de las hojas de materiales y mano de obra de un fichero OT y sus totales.
+    # Se usa desde los procesos de lectura en paralelo, por eso devuelve las filas en lugar de escribirlas.
+
+    wb_origen = load_workbook(fichero, read_only=True)
+
+    try:
+        materiales = list(
+            wb_origen[HOJA_MATERIALES].iter_rows(
+                min_row=2, min_col=1, values_only=True
+            )
+        )
+        mano_obra = list(
+            wb_origen[HOJA_MANO_OBRA].iter_rows(
+                min_row=2, min_col=1, values_only=True
+            )
+        )
+    finally:
+        wb_origen.close()
+
+    resumen = ResumenCostes()
+    for row in materiales:
+        resumen.anade_fila_material(row)
+    for row in mano_obra:
+        resumen.anade_fila_mano_obra(row)
+
+    return materiales, mano_obra, resumen
+
+
+def _bloques_de_filas(hoja: ReadOnlyWorksheet) -> Iterator[list[tuple[Any, ...]]]:
+
+    # Filas de datos de la hoja en bloques, para medir por separado la lectura y la escritura
+
+    filas = hoja.iter_rows(min_row=2, min_col=1, values_only=True)
+
+    while True:
+        with etapa("lectura_ot"):
+            bloque = list(islice(filas, TAMANO_BLOQUE_FILAS))
+        if not bloque:
+            return
+        cuenta("lectura_ot", len(bloque))
+        yield bloque
 
 
 def juntar_ot_en_workbook(
-    ws_materiales: Worksheet,
-    ws_mano_obra: Worksheet,
+    writer: Escritor,
     fichero: str,
     errores: bool,
     verboso: bool,
-) -> None:
-
-    # Abre el fichero OT y añade sus datos al workbook dado
-
-    wb_origen = load_workbook(fichero)
-
-    # Procesa la hoja de materiales
-
-    ws_materiales_origen = wb_origen["Materiales"]
-    ws_mano_obra_origen = wb_origen["Mano de Obra"]
-
-    for row in ws_materiales_origen.iter_rows(
-        min_row=2, min_col=1, values_only=True
-    ):
-        # Las primeras 4 columnas se pueden copiar tal cual, la quinta columna (E) (Fecha), debe convertirse a datetime y posteriormente a date para eliminar la hora. Las columnas F a J son numéricas y se pueden copiar tal cual.
-
-        # Añade una nueva fila vacia a la hoja de materiales
-        ws_materiales.append(row)
-
-    for cell in ws_materiales["E"]:
-        cell.number_format = "dd/mm/yyyy"
-
-    number_format = "#,##0.00#"
-
-    # Iterate over all cells in columns F to J and set the number format
-
-    for cell in (
-        ws_materiales["F"]
-        + ws_materiales["G"]
-        + ws_materiales["H"]
-        + ws_materiales["I"]
-        + ws_materiales["J"]
-    ):
-        cell.number_format = number_format
-
-    for row in ws_mano_obra_origen.iter_rows(
-        min_row=2, min_col=1, values_only=True
-    ):
-        # Procesa cada fila de mano de obra
-        ws_mano_obra.append(row)
-
-    for cell in ws_materiales["E"]:
-        cell.number_format = "dd/mm/yyyy"
-
-    for cell in (
-        ws_mano_obra["H"]
-        + ws_mano_obra["I"]
-        + ws_mano_obra["J"]
-        + ws_mano_obra["K"]
-        + ws_mano_obra["L"]
-        + ws_mano_obra["M"]
-        + ws_mano_obra["N"]
-        + ws_mano_obra["O"]
-        + ws_mano_obra["P"]
-    ):
-        cell.number_format = number_format
+    resumen: ResumenCostes | None = None,
+) -> tuple[int, int]:
+
+    # Abre el fichero OT en modo solo lectura y añade sus datos al fichero de salida.
+    # En este modo openpyxl lee las filas directamente del xml sin construir las celdas en memoria.
+    # Si se da resumen, se le suman los totales de las filas añadidas.
+    # Devuelve el numero de filas de materiales y de mano de obra añadidas.
+
+    filas_materiales = writer.materiales.filas
+    filas_mano_obra = writer.mano_obra.filas
+
+    with etapa("lectura_ot"):
+        wb_origen = load_workbook(fichero, read_only=True)
+
+    try:
+        ws_materiales_origen = wb_origen[HOJA_MATERIALES]
+        ws_mano_obra_origen = wb_origen[HOJA_MANO_OBRA]
+
+        # El escritor da a cada fila el formato de fecha y numero de su columna segun se añade
+
+        for bloque in _bloques_de_filas(ws_materiales_origen):
+            with etapa("escritura", len(bloque)):
+                for row in bloque:
+                    writer.add_material_row(row)
+            if resumen is not None:
+                with etapa("resumen", len(bloque)):
+                    for row in bloque:
+                        resumen.anade_fila_material(row)
+
+        for bloque in _bloques_de_filas(ws_mano_obra_origen):
+            with etapa("escritura", len(bloque)):
+                for row in bloque:
+                    writer.add_job_row(row)
+            if resumen is not None:
+                with etapa("resumen", len(bloque)):
+                    for row in bloque:
+                        resumen.anade_fila_mano_obra(row)
+
+    finally:
+        wb_origen.close()
+
+    return (
+        writer.materiales.filas - filas_materiales,
+        writer.mano_obra.filas - filas_mano_obra,
+    )
+
+
+def juntar_ficheros(
+    ficheros_de_ot: list[str],
+    nombre_fichero_salida: str,
+    errores: bool,
+    verboso: bool,
+    jobs: int = 1,
+    formato: str = "xlsx",
+) -> list[tuple[str, int, int, ResumenCostes]]:
+
+    # Los ficheros se juntan siempre ordenados por nombre, es decir, por numero de OT,
+    # para que el resultado no dependa del orden del directorio ni del reparto entre procesos.
+    # Devuelve, en ese orden, cada fichero con su numero de filas de materiales y de mano de obra
+    # y sus totales. Las hojas de resumen suman los totales de los ficheros en ese mismo orden.
+    # Con otro formato que xlsx, el nombre de la salida sin extension es la base de los ficheros de ese formato.
+
+    ficheros_de_ot = sorted(ficheros_de_ot)
+    filas_por_fichero: list[tuple[str, int, int, ResumenCostes]] = []
+    total = ResumenCostes()
+
+    # El fichero de salida es un workbook nuevo en modo streaming, no se modifica ninguno de los ficheros de OT
+
+    with etapa("escritura"):
+        writer = escritor(formato, os.path.splitext(nombre_fichero_salida)[0])
+
+    # Si falla la lectura o la escritura de algun fichero OT no queda el fichero de salida a medias
+    # ni los temporales del escritor
+
+    try:
+        if jobs <= 1 or len(ficheros_de_ot) <= 1:
+            for fichero_ot in ficheros_de_ot:
+                print(f"Procesando fichero OT: {fichero_ot}")
+                resumen = ResumenCostes()
+                filas_materiales, filas_mano_obra = juntar_ot_en_workbook(
+                    writer,
+                    fichero_ot,
+                    errores,
+                    verboso,
+                    resumen,
+                )
+                with etapa("resumen"):
+                    total.junta(resumen)
+                filas_por_fichero.append(
+                    (fichero_ot, filas_materiales, filas_mano_obra, resumen)
+                )
+
+        else:
+            # Varios procesos leen los ficheros OT y este proceso escribe sus filas en orden.
+            # Solo se mantienen 2 ficheros pendientes por proceso para no acumular en memoria
+            # las filas de los ficheros leidos que aun no se han escrito.
+
+            with ProcessPoolExecutor(
+                max_workers=min(jobs, len(ficheros_de_ot))
+            ) as executor:
+                pendientes: deque[tuple[str, Future]] = deque()
+                siguientes = iter(ficheros_de_ot)
+
+                for fichero_ot in siguientes:
+                    pendientes.append(
+                        (fichero_ot, executor.submit(lee_filas_ot, fichero_ot))
+                    )
+                    if len(pendientes) >= jobs * 2:
+                        break
+
+                while pendientes:
+                    fichero_ot, futuro = pendientes.popleft()
+
+                    # Con varios procesos, la lectura es el tiempo que se espera a que llegue cada fichero
+
+                    with etapa("lectura_ot"):
+                        materiales, mano_obra, resumen = futuro.result()
+                    cuenta("lectura_ot", len(materiales) + len(mano_obra))
+
+                    fichero_siguiente = next(siguientes, None)
+                    if fichero_siguiente is not None:
+                        pendientes.append(
+                            (
+                                fichero_siguiente,
+                                executor.submit(lee_filas_ot, fichero_siguiente),
+                            )
+                        )
+
+                    print(f"Procesando fichero OT: {fichero_ot}")
+
+                    with etapa("escritura", len(materiales) + len(mano_obra)):
+                        for row in materiales:
+                            writer.add_material_row(row)
+
+                        for row in mano_obra:
+                            writer.add_job_row(row)
+
+                    with etapa("resumen"):
+                        total.junta(resumen)
+                    filas_por_fichero.append(
+                        (fichero_ot, len(materiales), len(mano_obra), resumen)
+                    )
+
+    except BaseException:
+        writer.descarta()
+        raise
+
+    with etapa("guardado", 1):
+        writer.add_resumen(total)
+        writer.close()
+
+    return filas_por_fichero
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import Iterator
+import re
+
+import job_line
+import material_line
+
+
+# Maquina de estados que clasifica cada linea del informe de coste / venta una sola vez, en orden:
+#
+#   PREAMBULO          cabecera del informe hasta el encabezado de materiales
+#   TITULOS_MATERIALES titulos de las columnas de materiales, hasta la linea de guiones bajos
+#   MATERIALES         lineas de material, lineas en blanco y saltos de pagina
+#   PAGINA_MATERIALES  cabecera de pagina repetida dentro de la seccion de materiales
+#   ENTRE_SECCIONES    totales de materiales y lineas hasta el encabezado de mano de obra
+#   TITULOS_MANO_OBRA  titulos de las columnas de mano de obra, hasta la linea de guiones bajos
+#   MANO_OBRA          lineas de mano de obra, lineas en blanco y saltos de pagina
+#   PAGINA_MANO_OBRA   cabecera de pagina repetida dentro de la seccion de mano de obra
+#   FIN                totales de mano de obra y resto del fichero
+#
+# Un salto de pagina es una linea "Pág.  N" seguida de la cabecera del informe (numero de hoja, empresa,
+# cliente, fechas y una descripcion de longitud variable). La cabecera termina en la primera linea que tiene
+# una fecha en la posicion de la fecha de la seccion, que ya es una linea de datos.
+#
+# Como solo mira la linea actual y el estado, se puede usar igual leyendo el fichero entero o por partes.
+# segmentos() agrupa las lineas seguidas del mismo tipo, para tratar las filas de datos por bloques.
+
+MATERIALES_RE = re.compile(r"^_+M A T E R I A L_+$")
+MANO_OBRA_RE = re.compile(r"^_+M A N O   D E   O B R A_+$")
+PAGINA_RE = re.compile(r"^\s+P.g\.\s+\d+\s*$")
+
+# Posicion de la fecha en las lineas de cada seccion, para reconocer la primera linea de datos tras un salto de pagina
+
+FECHA_MATERIALES = (material_line.DESCRIPCION_END, material_line.FECHA_END)
+FECHA_MANO_OBRA = (job_line.OPERACION_END, job_line.FECHA_END)
+
+
+class TipoLinea(Enum):
+    PREAMBULO = "preambulo"
+    ENCABEZADO_MATERIALES = "encabezado materiales"
+    FILA_MATERIAL = "material"
+    TOTALES_MATERIALES = "totales materiales"
+    ENCABEZADO_MANO_OBRA = "encabezado mano de obra"
+    FILA_MANO_OBRA = "mano de obra"
+    TOTALES_MANO_OBRA = "totales mano de obra"
+    CABECERA_PAGINA = "cabecera de pagina"
+    EN_BLANCO = "en blanco"
+    FIN = "fin"
+
+
+class Estado(Enum):
+    PREAMBULO = "preambulo"
+    TITULOS_MATERIALES = "titulos materiales"
+    MATERIALES = "materiales"
+    PAGINA_MATERIALES = "pagina materiales"
+    ENTRE_SECCIONES = "entre secciones"
+    TITULOS_MANO_OBRA = "titulos mano de obra"
+    MANO_OBRA = "mano de obra"
+    PAGINA_MANO_OBRA = "pagina mano de obra"
+    FIN = "fin"
+
+
+def _es_guiones(linea: str) -> bool:
+
+    # Linea formada solo por guiones bajos y espacios, como la de debajo de los titulos o la de encima de los totales
+
+    contenido = linea.strip()
+    return contenido != "" and contenido.replace("_", "").replace(" ", "") == ""
+
+
+def _tiene_fecha(linea: str, posicion: tuple[int, int]) -> bool:
+    return linea[posicion[0] : posicion[1]].count("/") == 2
+
+
+class ClasificadorLineas:
+    """Clasifica las lineas de un informe de coste / venta segun la seccion en la que estan."""
+
+    def __init__(self):
+        self.estado = Estado.PREAMBULO
+
+    def clasifica(self, linea: str, numero_linea: int) -> TipoLinea:
+        estado = self.estado
+
+        if estado is Estado.MATERIALES or estado is Estado.MANO_OBRA:
+            return self._clasifica_seccion(linea)
+
+        if estado is Estado.PAGINA_MATERIALES:
+            if _tiene_fecha(linea, FECHA_MATERIALES):
+                self.estado = Estado.MATERIALES
+                return TipoLinea.FILA_MATERIAL
+            return self._clasifica_cabecera_pagina(linea)
+
+        if estado is Estado.PAGINA_MANO_OBRA:
+            if _tiene_fecha(linea, FECHA_MANO_OBRA):
+                self.estado = Estado.MANO_OBRA
+                return TipoLinea.FILA_MANO_OBRA
+            return self._clasifica_cabecera_pagina(linea)
+
+        if estado is Estado.PREAMBULO:
+
+            # La primera linea que empieza por un guion bajo tiene que ser el encabezado de materiales
+
+            if linea[:1] != "_":
+                return TipoLinea.PREAMBULO
+            if MATERIALES_RE.match(linea.strip()) is None:
+                raise ValueError(
+                    f"La línea {numero_linea} no es el encabezado de la sección de materiales: {linea}"
+                )
+            self.estado = Estado.TITULOS_MATERIALES
+            return TipoLinea.ENCABEZADO_MATERIALES
+
+        if estado is Estado.TITULOS_MATERIALES:
+            if _es_guiones(linea):
+                self.estado = Estado.MATERIALES
+            return TipoLinea.ENCABEZADO_MATERIALES
+
+        if estado is Estado.ENTRE_SECCIONES:
+            if linea[:1] == "_" and MANO_OBRA_RE.match(linea.strip()):
+                self.estado = Estado.TITULOS_MANO_OBRA
+                return TipoLinea.ENCABEZADO_MANO_OBRA
+            return TipoLinea.TOTALES_MATERIALES
+
+        if estado is Estado.TITULOS_MANO_OBRA:
+            if _es_guiones(linea):
+                self.estado = Estado.MANO_OBRA
+            return TipoLinea.ENCABEZADO_MANO_OBRA
+
+        return TipoLinea.FIN
+
+    def segmentos(
+        self, lineas: list[str], primera: int = 0
+    ) -> Iterator[tuple[TipoLinea, int, int]]:
+
+        # Recorre las lineas y devuelve (tipo, desde, hasta) para cada grupo de lineas seguidas del mismo tipo.
+        # desde y hasta son indices de la lista; primera es el numero de linea de lineas[0] en el fichero.
+
+        n = len(lineas)
+        i = 0
+        tipo_actual: TipoLinea | None = None
+        inicio = 0
+
+        while i < n:
+            tipo = self.clasifica(lineas[i], primera + i)
+
+            if tipo is not tipo_actual:
+                if tipo_actual is not None:
+                    yield tipo_actual, inicio, i
+                tipo_actual = tipo
+                inicio = i
+
+            i += 1
+
+            if tipo is TipoLinea.FILA_MATERIAL or tipo is TipoLinea.FILA_MANO_OBRA:
+                i = self._fin_filas(lineas, i)
+
+        if tipo_actual is not None:
+            yield tipo_actual, inicio, n
+
+    @staticmethod
+    def _fin_filas(lineas: list[str], i: int) -> int:
+
+        # Avanza mientras las lineas sean filas de datos sin duda. Las que pueden ser otra cosa (empiezan por
+        # un espacio seguido de "_" o "P", un guion bajo o un espacio en blanco) se dejan para clasifica().
+
+        n = len(lineas)
+
+        while i < n:
+            linea = lineas[i]
+            primero = linea[:1]
+            if primero == " ":
+                if linea.lstrip()[:1] in ("", "_", "P"):
+                    return i
+            elif primero == "_" or primero == "" or primero.isspace():
+                return i
+            i += 1
+
+        return i
+
+    def _clasifica_seccion(self, linea: str) -> TipoLinea:
+        materiales = self.estado is Estado.MATERIALES
+        primero = linea[:1]
+
+        if primero == " ":
+            contenido = linea.lstrip()
+
+            if contenido == "":
+                return TipoLinea.EN_BLANCO
+
+            # Linea de guiones encima de los totales: fin de la seccion
+
+            if contenido[0] == "_" and _es_guiones(contenido):
+                if materiales:
+                    self.estado = Estado.ENTRE_SECCIONES
+                    return TipoLinea.TOTALES_MATERIALES
+                self.estado = Estado.FIN
+                return TipoLinea.TOTALES_MANO_OBRA
+
+            if contenido[0] == "P" and PAGINA_RE.match(linea):
+                self.estado = (
+                    Estado.PAGINA_MATERIALES if materiales else Estado.PAGINA_MANO_OBRA
+                )
+                return TipoLinea.CABECERA_PAGINA
+
+        elif primero == "\n" or primero == "" or linea.isspace():
+            return TipoLinea.EN_BLANCO
+
+        elif primero == "_" and materiales and MANO_OBRA_RE.match(linea.strip()):
+
+            # Encabezado de mano de obra sin la linea de totales de materiales
+
+            self.estado = Estado.TITULOS_MANO_OBRA
+            return TipoLinea.ENCABEZADO_MANO_OBRA
+
+        return TipoLinea.FILA_MATERIAL if materiales else TipoLinea.FILA_MANO_OBRA
+
+    def _clasifica_cabecera_pagina(self, linea: str) -> TipoLinea:
+
+        # Dentro de una cabecera de pagina tambien puede acabar la seccion
+
+        if linea[:1] == " " and _es_guiones(linea):
+            if self.estado is Estado.PAGINA_MATERIALES:
+                self.estado = Estado.ENTRE_SECCIONES
+                return TipoLinea.TOTALES_MATERIALES
+            self.estado = Estado.FIN
+            return TipoLinea.TOTALES_MANO_OBRA
+
+        if (
+            self.estado is Estado.PAGINA_MATERIALES
+            and linea[:1] == "_"
+            and MANO_OBRA_RE.match(linea.strip())
+        ):
+            self.estado = Estado.TITULOS_MANO_OBRA
+            return TipoLinea.ENCABEZADO_MANO_OBRA
+
+        return TipoLinea.CABECERA_PAGINA
+
+    def comprueba_fin(self) -> None:
+
+        # Al acabar el fichero, avisa de las secciones que no se han encontrado o no se han cerrado
+
+        if self.estado is Estado.PREAMBULO:
+            raise ValueError(
+                "No se ha encontrado el encabezado de la sección de materiales."
+            )
+        if self.estado in (
+            Estado.TITULOS_MATERIALES,
+            Estado.MATERIALES,
+            Estado.PAGINA_MATERIALES,
+        ):
+            print("No se ha encontrado el final de la sección de materiales.")
+        if self.estado in (
+            Estado.TITULOS_MATERIALES,
+            Estado.MATERIALES,
+            Estado.PAGINA_MATERIALES,
+            Estado.ENTRE_SECCIONES,
+        ):
+            print("No se ha encontrado la sección de mano de obra.")
+        if self.estado in (
+            Estado.TITULOS_MANO_OBRA,
+            Estado.MANO_OBRA,
+            Estado.PAGINA_MANO_OBRA,
+        ):
+            print("No se ha encontrado el final de la sección de mano de obra.")
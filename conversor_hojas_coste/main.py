@@ -1,21 +1,23 @@
 from __future__ import annotations
 
-from os import listdir
+from multiprocessing import freeze_support
+from os import cpu_count, listdir, makedirs
 import re
+import sys
+import time
 
-from openpyxl import Workbook, load_workbook
-from pkg_resources import working_set
-
-from parse_file import ParseFile
-from join_ot import juntar_ot_en_workbook
+from version import VERSION_CONVERSOR
 
 from cyclopts import App, Parameter
-from typing import Annotated
+from typing import Annotated, Literal
+
+# Los modulos de la conversion (y con ellos openpyxl) se importan dentro de cada comando,
+# para que el programa arranque rapido y "--help" o "--version" no tengan que cargarlos.
 
 
 app = App(
     name="Convesor OT",
-    version="1.0.0",
+    version=VERSION_CONVERSOR,
     help='Convierte hojas de coste de proyectos en formato específico a otro formato. El uso normal es ejecutar el comando "todos" en la carpeta donde se encuentran los archivos a convertir. \n\nUsar "todos -h" para ver la ayuda de dicho comando.',
 )
 
@@ -30,8 +32,53 @@ def convierte_ficheros_directorio_actual(
         bool,
         Parameter(name=["--verboso", "-v"]),
     ] = False,
+    jobs: Annotated[
+        int | None,
+        Parameter(name=["--jobs", "-j"]),
+    ] = None,
+    forzar: Annotated[
+        bool,
+        Parameter(name=["--forzar", "-f"]),
+    ] = False,
+    tiempos: Annotated[
+        bool,
+        Parameter(name=["--tiempos", "-t"]),
+    ] = False,
+    tiempos_json: Annotated[
+        str | None,
+        Parameter(name=["--tiempos-json"]),
+    ] = None,
+    perfil: Annotated[
+        str | None,
+        Parameter(name=["--perfil"]),
+    ] = None,
+    formato: Annotated[
+        Literal["xlsx", "csv", "parquet"],
+        Parameter(name=["--formato"]),
+    ] = "xlsx",
+    si: Annotated[
+        bool,
+        Parameter(name=["--si", "--batch", "-s"]),
+    ] = False,
+    entrada: Annotated[
+        str,
+        Parameter(name=["--entrada", "-i"]),
+    ] = ".",
+    salida: Annotated[
+        str | None,
+        Parameter(name=["--salida", "-o"]),
+    ] = None,
+    informe: Annotated[
+        str | None,
+        Parameter(name=["--informe"]),
+    ] = None,
 ) -> None:
-    """Lee todos los archivos de la carpeta actual que sigan el formato "xxxxxxventa.txt" y "xxxxxxcoste.txt" y los convierte en csv para poder verlos en Excel.
+    """Lee todos los archivos de la carpeta actual que sigan el formato "xxxxxxventa.txt" y "xxxxxxcoste.txt" y los convierte en xlsx para poder verlos en Excel.
+
+    Los proyectos cuyos archivos no han cambiado desde la última conversión, y cuyo xlsx sigue en la carpeta, no se vuelven a convertir.
+
+    Para ejecutarlo sin nadie delante (por ejemplo, desde el programador de tareas) se usa "--si", que no pide confirmación,
+    junto con "--informe" para guardar el resultado de cada proyecto. Si algún proyecto no se puede convertir, el programa termina con código 1.
 
     Parameters
     ----------
@@ -39,86 +86,385 @@ def convierte_ficheros_directorio_actual(
         Muestra todos los errores, no solo los importantes.
     verboso: bool
         Muestra información detallada del proceso.
+    jobs: int | None
+        Número de proyectos a convertir en paralelo. Por defecto, el número de CPUs.
+    forzar: bool
+        Convierte todos los proyectos, aunque no hayan cambiado desde la última conversión.
+    tiempos: bool
+        Muestra al final una tabla con el tiempo de cada etapa: lectura, clasificación, parseo, congruencia, totales, resumen, escritura y guardado.
+    tiempos_json: str | None
+        Guarda en este fichero JSON el tiempo de cada etapa, en total y por proyecto.
+    perfil: str | None
+        Ejecuta la conversión con cProfile, en un solo proceso, y guarda el perfil en este fichero (se puede ver con "python -m pstats").
+    formato: str
+        Formato de los archivos generados: xlsx, csv (un archivo por hoja) o parquet (un archivo por hoja, necesita pyarrow).
+    si: bool
+        Procesa los archivos sin pedir confirmación.
+    entrada: str
+        Carpeta donde están los archivos de coste y venta. Por defecto, la carpeta actual.
+    salida: str | None
+        Carpeta donde se guardan los xlsx generados. Por defecto, la misma que la de entrada.
+    informe: str | None
+        Guarda en este fichero JSON el resultado de cada proyecto: estado, líneas parseadas y rechazadas, incongruencias, totales del informe que no coinciden, tiempo y xlsx generado.
     """
 
-    # Recupera todos los archivos de la carpeta actual
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    from batch_report import InformeConversiones
+    from conversion_cache import FICHERO_CACHE, CacheConversiones, hash_fichero
+    from parse_file import convierte_proyecto, convierte_y_muestra
+    from project_files import FicherosProyecto, busca_proyectos, ruta_en_carpeta
+    from stage_timing import TiemposEtapas, guarda_json
+    import stage_timing
 
-    ficheros: list[str] = listdir(".")
+    if salida is None:
+        salida = entrada
 
-    # Guardamos que ficheros ya han sido ya meditos en la lista de procesar con una array de booleans
+    makedirs(salida, exist_ok=True)
 
-    ficheros_procesados = [False] * len(ficheros)
+    # Recupera todos los archivos de la carpeta de entrada
+
+    ficheros: list[str] = listdir(entrada)
 
     print(ficheros)
 
-    class FicherosProyecto:
-        def __init__(self, archivo_venta: str, archivo_coste: str) -> None:
-            if len(archivo_venta) > 6:
-                self.proyecto = archivo_venta[:6]
-            elif len(archivo_coste) > 6:
-                self.proyecto = archivo_coste[:6]
-            else:
-                self.proyecto = ""
-
-            self.archivo_venta = archivo_venta
-            self.archivo_coste = archivo_coste
-
-    archivos_a_procesar: dict[str, FicherosProyecto] = {}
-
-    # Busca archivos con el formato "xxxxxxventa.txt", donde x son dígitos
-
-    for i, fichero in enumerate(ficheros):
-        if (
-            len(fichero) == 15
-            and fichero.endswith(".txt")
-            and fichero[:6].isdigit()
-            and fichero[6:11] == "venta"
-        ):
-            proyecto = FicherosProyecto(fichero, "")
-            archivos_a_procesar[proyecto.proyecto] = proyecto
-            ficheros_procesados[i] = True
-
-    # Busca archivos con el formato "xxxxxxcoste.txt",
-    for fichero in ficheros:
-        if (
-            len(fichero) == 15
-            and fichero.endswith(".txt")
-            and fichero[:6].isdigit()
-            and fichero[6:11] == "coste"
-        ):
-            proyecto_id = fichero[:6]
-            if proyecto_id in archivos_a_procesar:
-                archivos_a_procesar[proyecto_id].archivo_coste = fichero
-            else:
-                proyecto = FicherosProyecto("", fichero)
-                archivos_a_procesar[proyecto.proyecto] = proyecto
+    archivos_a_procesar = busca_proyectos(entrada, ficheros)
+
+    # Los proyectos cuyos archivos no han cambiado desde la ultima conversion se omiten, salvo con --forzar.
+    # La cache se guarda junto a los xlsx generados.
+
+    cache = CacheConversiones(
+        VERSION_CONVERSOR, ruta_en_carpeta(salida, FICHERO_CACHE), formato
+    )
+    resultados = InformeConversiones(entrada, salida)
+
+    hashes: dict[str, tuple[str, str]] = {}
+    proyectos: list[tuple[str, FicherosProyecto]] = []
+
+    total = TiemposEtapas()
+    tiempos_por_proyecto: dict[str, dict] = {}
+    inicio = time.perf_counter()
+
+    for proyecto_id, archivos in sorted(archivos_a_procesar.items()):
+        with total.etapa("comprobacion", 1):
+            hashes[proyecto_id] = (
+                hash_fichero(archivos.archivo_coste),
+                hash_fichero(archivos.archivo_venta),
+            )
+
+        salida_al_dia = None
+        if not forzar:
+            salida_al_dia = cache.salida_al_dia(
+                proyecto_id,
+                archivos.archivo_coste,
+                archivos.archivo_venta,
+                *hashes[proyecto_id],
+            )
+
+        if salida_al_dia is not None:
+            print(f"Proyecto {proyecto_id} sin cambios, ya convertido en: {salida_al_dia}")
+            resultados.sin_cambios(
+                proyecto_id, archivos.archivo_coste, archivos.archivo_venta, salida_al_dia
+            )
+        else:
+            proyectos.append((proyecto_id, archivos))
+
+    if len(proyectos) == 0:
+        print("Todos los proyectos están al día.")
+        if informe is not None:
+            resultados.guarda(informe, time.perf_counter() - inicio)
+        return
 
     # Muestra los archivos encontrados para cada proyecto y pide confirmación para procesarlos
 
-    for proyecto_id, archivos in archivos_a_procesar.items():
+    for proyecto_id, archivos in proyectos:
         print(f"Proyecto: {proyecto_id}")
         print(f"  Archivo de venta: {archivos.archivo_venta}")
         print(f"  Archivo de coste: {archivos.archivo_coste}")
 
-    confirmar = input("¿Desea procesar estos archivos? (s/n): ")
-    if confirmar.lower() != "s":
-        print("Proceso cancelado por el usuario.")
-        exit()
+    segundos_previos = time.perf_counter() - inicio
+
+    if not si:
+        confirmar = input("¿Desea procesar estos archivos? (s/n): ")
+        if confirmar.lower() != "s":
+            print("Proceso cancelado por el usuario.")
+            exit()
+
+    # El tiempo que se espera la confirmacion no cuenta en el total
+
+    inicio = time.perf_counter() - segundos_previos
 
-    # Procesa los archivos confirmados
+    def actualiza_cache(proyecto_id: str, archivos: FicherosProyecto, resultado: dict) -> None:
 
-    for proyecto_id, archivos in archivos_a_procesar.items():
-        print(f"Procesando proyecto {proyecto_id}...")
-        ParseFile(
+        # El fichero generado es el que devuelve la conversion. No se vuelve a leer el informe, que se puede
+        # haber exportado de nuevo mientras se convertia, con otro rango de fechas y por tanto otro nombre.
+
+        salida_proyecto = resultado["salida"] if resultado["error"] is None else None
+        if salida_proyecto is None:
+            cache.olvida_proyecto(proyecto_id)
+            return
+        cache.guarda_proyecto(
+            proyecto_id,
             archivos.archivo_coste,
             archivos.archivo_venta,
-            proyecto_id,
+            *hashes[proyecto_id],
+            salida_proyecto,
+        )
+
+    # Procesa los archivos confirmados. Cada proyecto es independiente, asi que se reparten entre varios procesos.
+    # La salida de cada proyecto se muestra completa y ordenada por numero de proyecto.
+
+    if jobs is None:
+        jobs = cpu_count() or 1
+
+    # Con --perfil todo se ejecuta en este proceso, para que el perfil incluya la conversion
+
+    if perfil is not None:
+        jobs = 1
+
+    try:
+        with stage_timing.perfil(perfil):
+            if jobs <= 1 or len(proyectos) <= 1:
+                for proyecto_id, archivos in proyectos:
+                    cache.olvida_proyecto(proyecto_id)
+                    _, tiempos_proyecto, resultado, _ = convierte_y_muestra(
+                        archivos.archivo_coste,
+                        archivos.archivo_venta,
+                        proyecto_id,
+                        errores,
+                        verboso,
+                        carpeta_salida=salida,
+                        formato=formato,
+                    )
+                    tiempos_por_proyecto[proyecto_id] = tiempos_proyecto
+                    total.anade(tiempos_proyecto)
+                    resultados.convertido(
+                        proyecto_id, archivos.archivo_coste, archivos.archivo_venta, resultado
+                    )
+                    actualiza_cache(proyecto_id, archivos, resultado)
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=min(jobs, len(proyectos))
+                ) as executor:
+                    for (proyecto_id, archivos), (
+                        salida_proyecto,
+                        _,
+                        tiempos_proyecto,
+                        resultado,
+                        _,
+                    ) in zip(
+                        proyectos,
+                        executor.map(
+                            partial(convierte_proyecto, carpeta_salida=salida, formato=formato),
+                            [archivos.archivo_coste for _, archivos in proyectos],
+                            [archivos.archivo_venta for _, archivos in proyectos],
+                            [proyecto_id for proyecto_id, _ in proyectos],
+                            [errores] * len(proyectos),
+                            [verboso] * len(proyectos),
+                        ),
+                    ):
+                        print(salida_proyecto, end="")
+                        tiempos_por_proyecto[proyecto_id] = tiempos_proyecto
+                        total.anade(tiempos_proyecto)
+                        resultados.convertido(
+                            proyecto_id, archivos.archivo_coste, archivos.archivo_venta, resultado
+                        )
+                        actualiza_cache(proyecto_id, archivos, resultado)
+    finally:
+        cache.guarda()
+
+    # Con varios procesos la suma de los tiempos de las etapas es mayor que el tiempo total
+
+    if tiempos:
+        total.muestra("Tiempo por etapa, suma de todos los proyectos:")
+        print(f"Tiempo total: {time.perf_counter() - inicio:.3f} s")
+    if tiempos_json is not None:
+        guarda_json(
+            tiempos_json,
+            "todos",
+            time.perf_counter() - inicio,
+            total,
+            tiempos_por_proyecto,
+        )
+    if informe is not None:
+        resultados.guarda(informe, time.perf_counter() - inicio)
+
+    # Con algun proyecto sin convertir se termina con error, para que lo vea quien lance el programa
+
+    if resultados.errores() > 0:
+        print(f"Procesamiento completado con {resultados.errores()} proyectos con errores.")
+        sys.exit(1)
+
+    print("Procesamiento completado.")
+
+
+@app.command(name="todo-en-uno")
+def convierte_y_junta_directorio_actual(
+    errores: Annotated[
+        bool,
+        Parameter(name=["--errores", "-e"]),
+    ] = False,
+    verboso: Annotated[
+        bool,
+        Parameter(name=["--verboso", "-v"]),
+    ] = False,
+    jobs: Annotated[
+        int | None,
+        Parameter(name=["--jobs", "-j"]),
+    ] = None,
+    por_proyecto: Annotated[
+        bool,
+        Parameter(name=["--por-proyecto", "-p"]),
+    ] = False,
+    formato: Annotated[
+        Literal["xlsx", "csv", "parquet"],
+        Parameter(name=["--formato"]),
+    ] = "xlsx",
+    si: Annotated[
+        bool,
+        Parameter(name=["--si", "--batch", "-s"]),
+    ] = False,
+    entrada: Annotated[
+        str,
+        Parameter(name=["--entrada", "-i"]),
+    ] = ".",
+    salida: Annotated[
+        str | None,
+        Parameter(name=["--salida", "-o"]),
+    ] = None,
+    informe: Annotated[
+        str | None,
+        Parameter(name=["--informe"]),
+    ] = None,
+    tiempos: Annotated[
+        bool,
+        Parameter(name=["--tiempos", "-t"]),
+    ] = False,
+    tiempos_json: Annotated[
+        str | None,
+        Parameter(name=["--tiempos-json"]),
+    ] = None,
+    perfil: Annotated[
+        str | None,
+        Parameter(name=["--perfil"]),
+    ] = None,
+) -> None:
+    """Convierte todos los proyectos de la carpeta actual y los junta en un solo archivo, sin pasar por el xlsx de cada proyecto.
+
+    Hace lo mismo que "todos" seguido de "juntar", pero las filas de cada proyecto se escriben directamente en OT_juntadas.xlsx.
+    Siempre convierte todos los proyectos.
+
+    Parameters
+    ----------
+    errores: bool
+        Muestra todos los errores, no solo los importantes.
+    verboso: bool
+        Muestra información detallada del proceso.
+    jobs: int | None
+        Número de proyectos a convertir en paralelo. Por defecto, el número de CPUs.
+    por_proyecto: bool
+        Genera también el archivo de cada proyecto, como "todos".
+    formato: str
+        Formato de los archivos generados: xlsx, csv (un archivo por hoja) o parquet (un archivo por hoja, necesita pyarrow).
+    si: bool
+        Procesa los archivos sin pedir confirmación.
+    entrada: str
+        Carpeta donde están los archivos de coste y venta. Por defecto, la carpeta actual.
+    salida: str | None
+        Carpeta donde se guarda el archivo juntado y los xlsx de cada proyecto. Por defecto, la misma que la de entrada.
+    informe: str | None
+        Guarda en este fichero JSON el resultado de cada proyecto: estado, líneas parseadas y rechazadas, incongruencias, totales del informe que no coinciden, tiempo y xlsx generado.
+    tiempos: bool
+        Muestra al final una tabla con el tiempo de cada etapa: lectura, clasificación, parseo, congruencia, totales, resumen, escritura y guardado.
+    tiempos_json: str | None
+        Guarda en este fichero JSON el tiempo de cada etapa, en total y por proyecto.
+    perfil: str | None
+        Ejecuta la conversión con cProfile, en un solo proceso, y guarda el perfil en este fichero (se puede ver con "python -m pstats").
+    """
+
+    from batch_report import InformeConversiones
+    from convert_join import convierte_y_junta
+    from output_formats import ficheros_salida
+    from project_files import busca_proyectos, ruta_en_carpeta
+    from stage_timing import guarda_json, recoge
+    import stage_timing
+
+    if salida is None:
+        salida = entrada
+
+    makedirs(salida, exist_ok=True)
+
+    proyectos = sorted(busca_proyectos(entrada, listdir(entrada)).items())
+
+    if len(proyectos) == 0:
+        print("No se han encontrado archivos de proyectos.")
+        return
+
+    for proyecto_id, archivos in proyectos:
+        print(f"Proyecto: {proyecto_id}")
+        print(f"  Archivo de venta: {archivos.archivo_venta}")
+        print(f"  Archivo de coste: {archivos.archivo_coste}")
+
+    if not si:
+        confirmar = input("¿Desea procesar estos archivos? (s/n): ")
+        if confirmar.lower() != "s":
+            print("Proceso cancelado por el usuario.")
+            exit()
+
+    nombre_fichero_salida = ruta_en_carpeta(salida, "OT_juntadas.xlsx")
+    resultados = InformeConversiones(entrada, salida)
+
+    if jobs is None:
+        jobs = cpu_count() or 1
+
+    # Con --perfil todo se ejecuta en este proceso, para que el perfil incluya la conversion
+
+    if perfil is not None:
+        jobs = 1
+
+    inicio = time.perf_counter()
+
+    with stage_timing.perfil(perfil), recoge() as total:
+        tiempos_por_proyecto = convierte_y_junta(
+            proyectos,
+            nombre_fichero_salida,
+            salida,
             errores,
             verboso,
+            resultados,
+            jobs,
+            por_proyecto,
+            formato,
         )
-        print(f"Proyecto {proyecto_id} procesado.")
 
-    print("Procesamiento completado.")
+    # Los tiempos de la conversion de cada proyecto se miden aparte, incluso en este proceso
+
+    for tiempos_proyecto in tiempos_por_proyecto.values():
+        total.anade(tiempos_proyecto)
+
+    if tiempos:
+        total.muestra("Tiempo por etapa, suma de todos los proyectos:")
+        print(f"Tiempo total: {time.perf_counter() - inicio:.3f} s")
+    if tiempos_json is not None:
+        guarda_json(
+            tiempos_json,
+            "todo-en-uno",
+            time.perf_counter() - inicio,
+            total,
+            tiempos_por_proyecto,
+        )
+    if informe is not None:
+        resultados.guarda(informe, time.perf_counter() - inicio)
+
+    print(
+        "Fichero OT juntado guardado como: "
+        + ", ".join(ficheros_salida(formato, ruta_en_carpeta(salida, "OT_juntadas")))
+    )
+
+    if resultados.errores() > 0:
+        print(f"Procesamiento completado con {resultados.errores()} proyectos con errores.")
+        sys.exit(1)
 
 
 @app.command(name="juntar")
@@ -131,18 +477,62 @@ def juntar_ficheros_ot(
         bool,
         Parameter(name=["--verboso", "-v"]),
     ] = False,
+    jobs: Annotated[
+        int | None,
+        Parameter(name=["--jobs", "-j"]),
+    ] = None,
+    forzar: Annotated[
+        bool,
+        Parameter(name=["--forzar", "-f"]),
+    ] = False,
+    formato: Annotated[
+        Literal["xlsx", "csv", "parquet"],
+        Parameter(name=["--formato"]),
+    ] = "xlsx",
+    tiempos: Annotated[
+        bool,
+        Parameter(name=["--tiempos", "-t"]),
+    ] = False,
+    tiempos_json: Annotated[
+        str | None,
+        Parameter(name=["--tiempos-json"]),
+    ] = None,
+    perfil: Annotated[
+        str | None,
+        Parameter(name=["--perfil"]),
+    ] = None,
 ) -> None:
     """Lee todos los archivos de la carpeta actual que sean una ot y los junta en un solo archivo.
 
+    Si el archivo juntado ya existe, solo se leen los archivos de OT nuevos o modificados desde la última vez.
+
     Parameters
     ----------
     errores: bool
         Muestra todos los errores, no solo los importantes.
     verboso: bool
         Muestra información detallada del proceso.
+    jobs: int | None
+        Número de ficheros OT a leer en paralelo. Por defecto, el número de CPUs.
+    forzar: bool
+        Vuelve a juntar todos los archivos de OT, aunque no hayan cambiado.
+    formato: str
+        Formato del archivo juntado: xlsx, csv (un archivo por hoja) o parquet (un archivo por hoja, necesita pyarrow). Los archivos de OT que se leen son siempre xlsx.
+    tiempos: bool
+        Muestra al final una tabla con el tiempo de cada etapa: comprobación, lectura, escritura, resumen, montaje y guardado.
+    tiempos_json: str | None
+        Guarda en este fichero JSON el tiempo de cada etapa.
+    perfil: str | None
+        Ejecuta el proceso con cProfile, en un solo proceso, y guarda el perfil en este fichero (se puede ver con "python -m pstats").
     """
 
-    todos_los_ficheros: list[str] = listdir(".")
+    from join_manifest import juntar_incremental
+    from join_ot import juntar_ficheros
+    from output_formats import ficheros_salida
+    from stage_timing import guarda_json, recoge
+    import stage_timing
+
+    todos_los_ficheros: list[str] = sorted(listdir("."))
 
     # Los ficheros de OT tienen el nombre xxxxxx_de ddmmaaaa_a_ddmmaaaa.xlsx
 
@@ -154,37 +544,436 @@ def juntar_ficheros_ot(
             ficheros_de_ot.append(fichero)
             print(f"Fichero OT encontrado: {fichero}")
 
-    # Use the first file  as the base for the output
+    nombre_fichero_salida = "OT_juntadas.xlsx"
+
+    if jobs is None:
+        jobs = cpu_count() or 1
 
-    wb = load_workbook(ficheros_de_ot.pop(0))
+    # Con --perfil todo se ejecuta en este proceso, para que el perfil incluya la lectura de los ficheros
 
-    # Crea un nuevo fichero
+    if perfil is not None:
+        jobs = 1
 
-    ws_materiales = wb["Materiales"]
+    inicio = time.perf_counter()
 
-    if ws_materiales is None:
-        raise ValueError("No se pudo crear la hoja de cálculo.")
+    with stage_timing.perfil(perfil), recoge() as total:
+        # Solo el xlsx juntado tiene manifiesto para juntar de forma incremental
 
-    ws_mano_obra = wb["Mano de Obra"]
+        if formato == "xlsx":
+            juntar_incremental(
+                ficheros_de_ot, nombre_fichero_salida, errores, verboso, jobs, forzar
+            )
+        else:
+            juntar_ficheros(
+                ficheros_de_ot, nombre_fichero_salida, errores, verboso, jobs, formato
+            )
 
-    if ws_mano_obra is None:
-        raise ValueError("No se pudo crear la hoja de cálculo.")
+    if tiempos:
+        total.muestra("Tiempo por etapa:")
+        print(f"Tiempo total: {time.perf_counter() - inicio:.3f} s")
+    if tiempos_json is not None:
+        guarda_json(tiempos_json, "juntar", time.perf_counter() - inicio, total)
 
-    for fichero_ot in ficheros_de_ot:
-        print(f"Procesando fichero OT: {fichero_ot}")
-        juntar_ot_en_workbook(
-            ws_materiales,
-            ws_mano_obra,
-            fichero_ot,
-            errores,
-            verboso,
+    print(
+        "Fichero OT juntado guardado como: "
+        + ", ".join(ficheros_salida(formato, "OT_juntadas"))
+    )
+
+
+@app.command(name="cargar")
+def carga_base_datos(
+    errores: Annotated[
+        bool,
+        Parameter(name=["--errores", "-e"]),
+    ] = False,
+    verboso: Annotated[
+        bool,
+        Parameter(name=["--verboso", "-v"]),
+    ] = False,
+    jobs: Annotated[
+        int | None,
+        Parameter(name=["--jobs", "-j"]),
+    ] = None,
+    forzar: Annotated[
+        bool,
+        Parameter(name=["--forzar", "-f"]),
+    ] = False,
+    si: Annotated[
+        bool,
+        Parameter(name=["--si", "--batch", "-s"]),
+    ] = False,
+    entrada: Annotated[
+        str,
+        Parameter(name=["--entrada", "-i"]),
+    ] = ".",
+    base_datos: Annotated[
+        str | None,
+        Parameter(name=["--base-datos", "-b"]),
+    ] = None,
+    informe: Annotated[
+        str | None,
+        Parameter(name=["--informe"]),
+    ] = None,
+    tiempos: Annotated[
+        bool,
+        Parameter(name=["--tiempos", "-t"]),
+    ] = False,
+) -> None:
+    """Convierte los proyectos de la carpeta actual y guarda sus líneas en una base de datos SQLite, para consultarlas con "consultar".
+
+    Los proyectos cuyos archivos no han cambiado desde la última carga no se vuelven a cargar.
+    No genera los xlsx de los proyectos.
+
+    Parameters
+    ----------
+    errores: bool
+        Muestra todos los errores, no solo los importantes.
+    verboso: bool
+        Muestra información detallada del proceso.
+    jobs: int | None
+        Número de proyectos a convertir en paralelo. Por defecto, el número de CPUs.
+    forzar: bool
+        Carga todos los proyectos, aunque no hayan cambiado desde la última carga.
+    si: bool
+        Procesa los archivos sin pedir confirmación.
+    entrada: str
+        Carpeta donde están los archivos de coste y venta. Por defecto, la carpeta actual.
+    base_datos: str | None
+        Fichero de la base de datos. Por defecto, costes.sqlite en la carpeta actual.
+    informe: str | None
+        Guarda en este fichero JSON el resultado de cada proyecto: estado, líneas parseadas y rechazadas, incongruencias y tiempo.
+    tiempos: bool
+        Muestra al final una tabla con el tiempo de cada etapa: comprobación, lectura, clasificación, parseo, congruencia y carga.
+    """
+
+    from batch_report import InformeConversiones
+    from project_files import busca_proyectos
+    from stage_timing import recoge
+    from warehouse import FICHERO_BASE_DATOS, BaseDatosCostes, carga_proyectos
+
+    if base_datos is None:
+        base_datos = FICHERO_BASE_DATOS
+
+    proyectos = sorted(busca_proyectos(entrada, listdir(entrada)).items())
+
+    if len(proyectos) == 0:
+        print("No se han encontrado archivos de proyectos.")
+        return
+
+    for proyecto_id, archivos in proyectos:
+        print(f"Proyecto: {proyecto_id}")
+        print(f"  Archivo de venta: {archivos.archivo_venta}")
+        print(f"  Archivo de coste: {archivos.archivo_coste}")
+
+    if not si:
+        confirmar = input("¿Desea cargar estos archivos? (s/n): ")
+        if confirmar.lower() != "s":
+            print("Proceso cancelado por el usuario.")
+            exit()
+
+    resultados = InformeConversiones(entrada, ".")
+
+    if jobs is None:
+        jobs = cpu_count() or 1
+
+    inicio = time.perf_counter()
+
+    with BaseDatosCostes(base_datos) as base, recoge() as total:
+        tiempos_por_proyecto = carga_proyectos(
+            proyectos, base, errores, verboso, resultados, jobs, forzar
         )
 
-    nombre_fichero_salida = "OT_juntadas.xlsx"
-    wb.save(nombre_fichero_salida)
+    for tiempos_proyecto in tiempos_por_proyecto.values():
+        total.anade(tiempos_proyecto)
+
+    if tiempos:
+        total.muestra("Tiempo por etapa, suma de todos los proyectos:")
+        print(f"Tiempo total: {time.perf_counter() - inicio:.3f} s")
+    if informe is not None:
+        resultados.guarda(informe, time.perf_counter() - inicio)
+
+    print(f"Base de datos guardada en: {base_datos}")
+
+    if resultados.errores() > 0:
+        print(f"Carga completada con {resultados.errores()} proyectos con errores.")
+        sys.exit(1)
+
+
+@app.command(name="consultar")
+def consulta_base_datos(
+    consulta: Literal["operario-mes", "proyecto", "proyecto-mes", "referencia"] | None = None,
+    *,
+    sql: Annotated[
+        str | None,
+        Parameter(name=["--sql"]),
+    ] = None,
+    ot: Annotated[
+        str | None,
+        Parameter(name=["--ot"]),
+    ] = None,
+    desde: Annotated[
+        str | None,
+        Parameter(name=["--desde"]),
+    ] = None,
+    hasta: Annotated[
+        str | None,
+        Parameter(name=["--hasta"]),
+    ] = None,
+    base_datos: Annotated[
+        str | None,
+        Parameter(name=["--base-datos", "-b"]),
+    ] = None,
+    csv: Annotated[
+        str | None,
+        Parameter(name=["--csv"]),
+    ] = None,
+) -> None:
+    """Consulta la base de datos creada con "cargar", sin volver a abrir los archivos de los proyectos.
+
+    Sin consulta ni "--sql", muestra las consultas disponibles.
+
+    Parameters
+    ----------
+    consulta: str | None
+        Consulta predefinida: operario-mes, proyecto, proyecto-mes o referencia.
+    sql: str | None
+        Consulta SQL libre sobre las tablas "materiales", "mano_obra" y "proyectos". Puede usar :ot, :desde y :hasta.
+    ot: str | None
+        Solo las líneas de este número de OT.
+    desde: str | None
+        Solo las líneas desde esta fecha (dd/mm/aaaa).
+    hasta: str | None
+        Solo las líneas hasta esta fecha (dd/mm/aaaa), incluida.
+    base_datos: str | None
+        Fichero de la base de datos. Por defecto, costes.sqlite en la carpeta actual.
+    csv: str | None
+        Guarda el resultado en este fichero csv, además de mostrarlo.
+    """
+
+    from os import path
+
+    from decoder import fecha_dd_mm_aaaa
+    from warehouse import (
+        CONSULTAS,
+        FICHERO_BASE_DATOS,
+        BaseDatosCostes,
+        muestra_tabla,
+        sql_consulta,
+    )
+
+    if consulta is None and sql is None:
+        print("Consultas disponibles:")
+        for nombre, (descripcion, _) in CONSULTAS.items():
+            print(f"  {nombre}: {descripcion}")
+        return
+
+    if base_datos is None:
+        base_datos = FICHERO_BASE_DATOS
+
+    if not path.exists(base_datos):
+        print(f'No existe la base de datos {base_datos}, se crea con el comando "cargar".')
+        sys.exit(1)
+
+    # Las fechas se guardan como aaaa-mm-dd
+
+    parametros: dict[str, str | None] = {"ot": ot, "desde": None, "hasta": None}
+    for nombre, texto in (("desde", desde), ("hasta", hasta)):
+        if texto is not None:
+            fecha = fecha_dd_mm_aaaa(texto)
+            if fecha is None:
+                print(f"Fecha incorrecta en --{nombre}: {texto} (debe ser dd/mm/aaaa)")
+                sys.exit(1)
+            parametros[nombre] = fecha.isoformat()
+
+    if sql is None:
+        sql, parametros = sql_consulta(
+            consulta, parametros["ot"], parametros["desde"], parametros["hasta"]
+        )
+
+    inicio = time.perf_counter()
+
+    with BaseDatosCostes(base_datos) as base:
+        columnas, filas = base.consulta(sql, parametros)
+
+    milisegundos = (time.perf_counter() - inicio) * 1000
+
+    muestra_tabla(columnas, filas)
+    print(f"{len(filas)} filas en {milisegundos:.1f} ms")
+
+    if csv is not None:
+        import csv as modulo_csv
+
+        with open(csv, "w", encoding="utf-8", newline="") as file:
+            writer = modulo_csv.writer(file)
+            writer.writerow(columnas)
+            writer.writerows(filas)
+        print(f"Resultado guardado en: {csv}")
+
+
+@app.command(name="servir")
+def sirve_conversiones(
+    puerto: Annotated[
+        int,
+        Parameter(name=["--puerto", "-p"]),
+    ] = 8765,
+    host: Annotated[
+        str,
+        Parameter(name=["--host"]),
+    ] = "127.0.0.1",
+    jobs: Annotated[
+        int | None,
+        Parameter(name=["--jobs", "-j"]),
+    ] = None,
+    cola: Annotated[
+        int | None,
+        Parameter(name=["--cola"]),
+    ] = None,
+    verboso: Annotated[
+        bool,
+        Parameter(name=["--verboso", "-v"]),
+    ] = False,
+) -> None:
+    """Arranca un servicio HTTP local que convierte y junta archivos sin volver a arrancar el programa en cada uso.
+
+    POST /convertir recibe los archivos de coste y venta (subidos o su ruta) y devuelve el xlsx del proyecto.
+    POST /juntar recibe archivos de OT (subidos o su ruta) y devuelve el xlsx juntado.
+    GET /metrics devuelve las peticiones atendidas, el rendimiento y las latencias.
+
+    Parameters
+    ----------
+    puerto: int
+        Puerto en el que escucha el servicio.
+    host: str
+        Dirección en la que escucha el servicio. Por defecto, solo en este equipo. En otra dirección puede usarlo cualquiera que llegue a este equipo por la red, así que solo acepta ficheros subidos, no rutas de este equipo.
+    jobs: int | None
+        Número de procesos que convierten a la vez. Por defecto, el número de CPUs.
+    cola: int | None
+        Número máximo de trabajos pendientes (en curso o esperando); con más, las peticiones se rechazan. Por defecto, 4 por proceso.
+    verboso: bool
+        Muestra cada petición recibida.
+    """
+
+    from conversion_service import crea_servidor
+
+    if jobs is None:
+        jobs = cpu_count() or 1
+    if cola is None:
+        cola = jobs * 4
+
+    servidor = crea_servidor(host, puerto, jobs, cola, verboso)
+    direccion, puerto_servidor = servidor.server_address[:2]
+    print(f"Servicio de conversión en http://{direccion}:{puerto_servidor} con {jobs} procesos (Ctrl+C para parar).")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("Servicio parado.")
+    finally:
+        servidor.server_close()
+
+
+@app.command(name="vigilar")
+def vigila_carpeta(
+    entrada: Annotated[
+        str,
+        Parameter(name=["--entrada", "-i"]),
+    ] = ".",
+    salida: Annotated[
+        str | None,
+        Parameter(name=["--salida", "-o"]),
+    ] = None,
+    jobs: Annotated[
+        int | None,
+        Parameter(name=["--jobs", "-j"]),
+    ] = None,
+    juntar: Annotated[
+        bool,
+        Parameter(name=["--juntar"]),
+    ] = False,
+    intervalo: Annotated[
+        float,
+        Parameter(name=["--intervalo"]),
+    ] = 1.0,
+    espera: Annotated[
+        float,
+        Parameter(name=["--espera"]),
+    ] = 2.0,
+    espera_pareja: Annotated[
+        float,
+        Parameter(name=["--espera-pareja"]),
+    ] = 60.0,
+    errores: Annotated[
+        bool,
+        Parameter(name=["--errores", "-e"]),
+    ] = False,
+    verboso: Annotated[
+        bool,
+        Parameter(name=["--verboso", "-v"]),
+    ] = False,
+) -> None:
+    """Vigila la carpeta y convierte cada proyecto en cuanto llegan sus archivos "xxxxxxcoste.txt" y "xxxxxxventa.txt".
+
+    Un archivo se da por completo cuando lleva unos segundos sin cambiar. Los proyectos se convierten en segundo plano,
+    sin dejar de vigilar, y los que ya estaban convertidos y no han cambiado no se vuelven a convertir. Se para con Ctrl+C.
+
+    Parameters
+    ----------
+    entrada: str
+        Carpeta a vigilar. Por defecto, la carpeta actual.
+    salida: str | None
+        Carpeta donde se guardan los xlsx generados. Por defecto, la misma que la de entrada.
+    jobs: int | None
+        Número de proyectos a convertir a la vez. Por defecto, el número de CPUs.
+    juntar: bool
+        Después de convertir, actualiza el archivo OT_juntadas.xlsx de la carpeta de salida con los archivos de OT nuevos o modificados.
+    intervalo: float
+        Segundos entre cada revisión de la carpeta.
+    espera: float
+        Segundos que un archivo tiene que estar sin cambiar para darlo por completo.
+    espera_pareja: float
+        Segundos que se espera al otro archivo de un proyecto del que solo ha llegado uno; después se convierte solo con ese.
+    errores: bool
+        Muestra todos los errores, no solo los importantes.
+    verboso: bool
+        Muestra información detallada del proceso.
+    """
+
+    from folder_watch import VigilanteCarpeta
+
+    if salida is None:
+        salida = entrada
+
+    makedirs(salida, exist_ok=True)
+
+    if jobs is None:
+        jobs = cpu_count() or 1
+
+    vigilante = VigilanteCarpeta(
+        entrada,
+        salida,
+        jobs,
+        errores,
+        verboso,
+        juntar,
+        intervalo,
+        espera,
+        espera_pareja,
+    )
+    print(f"Vigilando la carpeta {entrada} con {jobs} procesos (Ctrl+C para parar).")
+
+    try:
+        vigilante.vigila()
+    except KeyboardInterrupt:
+        print("Parando, se terminan las conversiones en curso...")
+    finally:
+        vigilante.close()
 
-    print(f"Fichero OT juntado guardado como: {nombre_fichero_salida}")
+    print(
+        f"Vigilancia parada: {vigilante.convertidos} proyectos convertidos, "
+        f"{vigilante.con_errores} con errores."
+    )
 
 
 if __name__ == "__main__":
+    freeze_support()
     app()
@@ -1,7 +1,19 @@
 from __future__ import annotations
-from typing import Optional
+from typing import Any, Optional
 import datetime
 
+from decoder import decode_fecha, decode_numero
+from batch_parse import CamposNumericos, FormatoSeccion, parse_lote
+
+
+# The are constant character positions, so we can use slicing to extract the fields:
+REFERENCIA_END = 16
+DESCRIPCION_END = 57
+FECHA_END = 68
+CANTIDAD_END = 80
+PRECIO_END = 96
+IMPORTE_END = 112
+
 
 class MaterialLine:
     def __init__(self, numero_linea: int):
@@ -27,12 +39,47 @@ class MaterialLine:
     # Crear excepcion personalizada para errores de parseo, error de parseo o incongruencia entre coste y venta
 
     class NotValidError(Exception):
-        def __init__(self, message: str):
-            super().__init__(message)
+        pass
 
     class IncongruentError(Exception):
-        def __init__(self, message: str):
-            super().__init__(message)
+
+        # Guarda ademas el campo y los valores de coste y venta, para el informe de conciliacion
+
+        def __init__(
+            self,
+            mensaje: str,
+            campo: str = "",
+            coste: str = "",
+            venta: str = "",
+            numero_linea: int = -1,
+        ):
+            super().__init__(mensaje)
+            self.campo = campo
+            self.coste = coste
+            self.venta = venta
+            self.numero_linea = numero_linea
+
+    @staticmethod
+    def error_fecha(fecha_str: str, numero_linea: int) -> MaterialLine.NotValidError:
+        if fecha_str == "":
+            return MaterialLine.NotValidError(
+                f"Error Linea invalida - Fecha vacia en linea {numero_linea + 1}: {fecha_str}"
+            )
+        return MaterialLine.NotValidError(
+            f"Error Linea invalida - Fecha con formato incorrecto en linea {numero_linea + 1}: {fecha_str}"
+        )
+
+    @staticmethod
+    def error_incongruencia(
+        field_name: str, cost_value: str, sell_value: str, numero_linea: int
+    ) -> MaterialLine.IncongruentError:
+        return MaterialLine.IncongruentError(
+            f"Error Incongruencia - {field_name} incongruente en linea {numero_linea + 1}: coste '{cost_value}' vs venta '{sell_value}'",
+            field_name,
+            cost_value,
+            sell_value,
+            numero_linea,
+        )
 
     @staticmethod
     def parse(
@@ -49,14 +96,6 @@ class MaterialLine:
 
         material_line = MaterialLine(numero_linea)
 
-        # The are constant character positions, so we can use slicing to extract the fields:
-        REFERENCIA_END = 16
-        DESCRIPCION_END = 57
-        FECHA_END = 68
-        CANTIDAD_END = 80
-        PRECIO_END = 96
-        IMPORTE_END = 112
-
         material_line.Referencia = linea_guia[0:REFERENCIA_END].strip()
         material_line.Descripcion = linea_guia[
             REFERENCIA_END:DESCRIPCION_END
@@ -81,18 +120,12 @@ class MaterialLine:
         # Checkear que los campos tienen un formato correcto, ya sean numeros o fechas
 
         if material_line.FechaStr == "":
-            raise MaterialLine.NotValidError(
-                f"Error Linea invalida - Fecha vacia en linea {numero_linea + 1}: {material_line.FechaStr}"
-            )
+            raise MaterialLine.error_fecha(material_line.FechaStr, numero_linea)
 
         try:
-            material_line.Fecha = datetime.datetime.strptime(
-                material_line.FechaStr, "%d/%m/%Y"
-            ).date()
+            material_line.Fecha = decode_fecha(material_line.FechaStr)
         except ValueError:
-            raise MaterialLine.NotValidError(
-                f"Error Linea invalida - Fecha con formato incorrecto en linea {numero_linea + 1}: {material_line.FechaStr}"
-            )
+            raise MaterialLine.error_fecha(material_line.FechaStr, numero_linea)
 
         if material_line.CantidadStr == "":
             raise MaterialLine.NotValidError(
@@ -100,9 +133,7 @@ class MaterialLine:
             )
 
         try:
-            material_line.Cantidad = float(
-                material_line.CantidadStr.replace(".", "").replace(",", ".")
-            )
+            material_line.Cantidad = decode_numero(material_line.CantidadStr)
         except ValueError:
             raise MaterialLine.NotValidError(
                 f"Error Linea invalida - Cantidad con formato incorrecto en linea {numero_linea + 1}: {material_line.CantidadStr}"
@@ -114,11 +145,7 @@ class MaterialLine:
                     f"Error Linea invalida - PrecioUnitarioCoste vacio en linea {numero_linea + 1}: {material_line.PrecioUnitarioCosteStr}"
                 )
             try:
-                material_line.PrecioUnitarioCoste = float(
-                    material_line.PrecioUnitarioCosteStr.replace(
-                        ".", ""
-                    ).replace(",", ".")
-                )
+                material_line.PrecioUnitarioCoste = decode_numero(material_line.PrecioUnitarioCosteStr)
             except ValueError:
                 raise MaterialLine.NotValidError(
                     f"Error Linea invalida - PrecioUnitarioCoste con formato incorrecto en linea {numero_linea + 1}: {material_line.PrecioUnitarioCosteStr}"
@@ -129,11 +156,7 @@ class MaterialLine:
                     f"Error Linea invalida - ImporteTotalCoste vacio en linea {numero_linea + 1}: {material_line.ImporteTotalCosteStr}"
                 )
             try:
-                material_line.ImporteTotalCoste = float(
-                    material_line.ImporteTotalCosteStr.replace(
-                        ".", ""
-                    ).replace(",", ".")
-                )
+                material_line.ImporteTotalCoste = decode_numero(material_line.ImporteTotalCosteStr)
             except ValueError:
                 raise MaterialLine.NotValidError(
                     f"Error Linea invalida - ImporteTotalCoste con formato incorrecto en linea {numero_linea + 1}: {material_line.ImporteTotalCosteStr}"
@@ -145,11 +168,7 @@ class MaterialLine:
                     f"Error Linea invalida - PrecioUnitarioVenta vacio en linea {numero_linea + 1}: {material_line.PrecioUnitarioVentaStr}"
                 )
             try:
-                material_line.PrecioUnitarioVenta = float(
-                    material_line.PrecioUnitarioVentaStr.replace(
-                        ".", ""
-                    ).replace(",", ".")
-                )
+                material_line.PrecioUnitarioVenta = decode_numero(material_line.PrecioUnitarioVentaStr)
             except ValueError:
                 raise MaterialLine.NotValidError(
                     f"Error Linea invalida - PrecioUnitarioVenta con formato incorrecto en linea {numero_linea + 1}: {material_line.PrecioUnitarioVentaStr}"
@@ -160,11 +179,7 @@ class MaterialLine:
                     f"Error Linea invalida - ImporteTotalVenta vacio en linea {numero_linea + 1}: {material_line.ImporteTotalVentaStr}"
                 )
             try:
-                material_line.ImporteTotalVenta = float(
-                    material_line.ImporteTotalVentaStr.replace(
-                        ".", ""
-                    ).replace(",", ".")
-                )
+                material_line.ImporteTotalVenta = decode_numero(material_line.ImporteTotalVentaStr)
             except ValueError:
                 raise MaterialLine.NotValidError(
                     f"Error Linea invalida - ImporteTotalVenta con formato incorrecto en linea {numero_linea + 1}: {material_line.ImporteTotalVentaStr}"
@@ -173,31 +188,79 @@ class MaterialLine:
         # Check si la linea de venta es consistente con la linea de coste (mismo referencia, descripcion, fecha, cantidad)
         if use_venta and use_coste:
 
-            for field_name, cost_value, sell_value in [
-                (
-                    "Referencia",
-                    linea_coste[0:REFERENCIA_END].strip(),
-                    linea_venta[0:REFERENCIA_END].strip(),
-                ),
-                (
-                    "Descripcion",
-                    linea_coste[REFERENCIA_END:DESCRIPCION_END].strip(),
-                    linea_venta[REFERENCIA_END:DESCRIPCION_END].strip(),
-                ),
-                (
-                    "Fecha",
-                    linea_coste[DESCRIPCION_END:FECHA_END].strip(),
-                    linea_venta[DESCRIPCION_END:FECHA_END].strip(),
-                ),
-                (
-                    "Cantidad",
-                    linea_coste[FECHA_END:CANTIDAD_END].strip(),
-                    linea_venta[FECHA_END:CANTIDAD_END].strip(),
-                ),
-            ]:
-                if cost_value != sell_value:
-                    raise MaterialLine.IncongruentError(
-                        f"Error Incongruencia - {field_name} incongruente en linea {numero_linea + 1}: coste '{cost_value}' vs venta '{sell_value}'"
-                    )
+            error = FORMATO_MATERIALES.incongruencia(linea_coste, linea_venta, numero_linea)
+            if error is not None:
+                raise error
 
         return material_line
+
+    @staticmethod
+    def parse_batch(
+        lineas_coste: list[str],
+        lineas_venta: list[str],
+        numeros_linea: list[int],
+        use_coste: bool,
+        use_venta: bool,
+    ) -> tuple[dict[str, list[Any]], list[Exception]]:
+
+        # Parsea de una vez todas las lineas candidatas de la seccion de materiales.
+        # Devuelve las columnas de las lineas validas, con los mismos nombres que los atributos de MaterialLine,
+        # y los errores NotValidError / IncongruentError en orden de linea.
+
+        return parse_lote(
+            FORMATO_MATERIALES,
+            lineas_coste,
+            lineas_venta,
+            numeros_linea,
+            use_coste,
+            use_venta,
+        )
+
+
+FORMATO_MATERIALES = FormatoSeccion(
+    fecha=(DESCRIPCION_END, FECHA_END),
+    textos=[
+        ("Referencia", 0, REFERENCIA_END),
+        ("Descripcion", REFERENCIA_END, DESCRIPCION_END),
+    ],
+    numeros_coste=CamposNumericos(
+        FECHA_END,
+        [
+            ("Cantidad", CANTIDAD_END - FECHA_END),
+            ("PrecioUnitarioCoste", PRECIO_END - CANTIDAD_END),
+            ("ImporteTotalCoste", IMPORTE_END - PRECIO_END),
+        ],
+    ),
+    numeros_solo_venta=CamposNumericos(
+        FECHA_END,
+        [
+            ("Cantidad", CANTIDAD_END - FECHA_END),
+            ("PrecioUnitarioVenta", PRECIO_END - CANTIDAD_END),
+            ("ImporteTotalVenta", IMPORTE_END - PRECIO_END),
+        ],
+    ),
+    numeros_venta=CamposNumericos(
+        CANTIDAD_END,
+        [
+            ("PrecioUnitarioVenta", PRECIO_END - CANTIDAD_END),
+            ("ImporteTotalVenta", IMPORTE_END - PRECIO_END),
+        ],
+    ),
+    congruencia=[
+        ("Referencia", 0, REFERENCIA_END),
+        ("Descripcion", REFERENCIA_END, DESCRIPCION_END),
+        ("Fecha", DESCRIPCION_END, FECHA_END),
+        ("Cantidad", FECHA_END, CANTIDAD_END),
+    ],
+    numericas=[
+        "Cantidad",
+        "PrecioUnitarioCoste",
+        "ImporteTotalCoste",
+        "PrecioUnitarioVenta",
+        "ImporteTotalVenta",
+    ],
+    parse=MaterialLine.parse,
+    errores_linea=(MaterialLine.NotValidError, MaterialLine.IncongruentError),
+    error_fecha=MaterialLine.error_fecha,
+    error_incongruencia=MaterialLine.error_incongruencia,
+)
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+from typing import Any, Iterator, Sequence, Union
+import csv
+import datetime
+import os
+
+from record_store import AlmacenColumnas
+from summaries import ResumenCostes
+from xlsx_writer import (
+    COLUMNAS_MANO_OBRA,
+    COLUMNAS_MATERIALES,
+    FORMATO_FECHA,
+    FORMATO_NUMERO,
+    XlsxWriter,
+    filas_mano_obra,
+    filas_materiales,
+)
+
+
+# Formatos de salida de la conversion y del juntado.
+#
+# - xlsx: un fichero con las hojas "Materiales" y "Mano de Obra" (XlsxWriter), el formato de siempre.
+# - csv: un fichero por hoja, "<nombre>_materiales.csv" y "<nombre>_mano_obra.csv", en UTF-8, separado por comas,
+#   con las fechas en formato ISO (aaaa-mm-dd) y los numeros con punto decimal (siempre como float, "4.0"),
+#   para leerlos desde otras herramientas.
+# - parquet: un fichero por hoja, como csv, con las fechas como fechas y los numeros como double. Necesita pyarrow.
+#
+# Todos tienen las mismas columnas que las hojas del xlsx y la misma interfaz que XlsxWriter: las filas se añaden
+# desde las columnas del almacen o de una en una, y los ficheros no aparecen hasta llamar a close().
+# Las hojas de resumen solo se escriben en xlsx: csv y parquet son para leerlos con otras herramientas,
+# que ya agregan las filas por su cuenta.
+
+FORMATOS = ["xlsx", "csv", "parquet"]
+
+# Filas de parquet que se guardan en memoria antes de escribirlas en el fichero
+
+TAMANO_GRUPO_PARQUET = 65536
+
+
+def ficheros_salida(formato: str, base: str) -> list[str]:
+
+    # Ficheros que genera el formato para la ruta base (sin extension). El primero es el que se usa
+    # para saber si la salida existe y para mostrarla.
+
+    if formato == "xlsx":
+        return [f"{base}.xlsx"]
+    if formato in ("csv", "parquet"):
+        return [f"{base}_materiales.{formato}", f"{base}_mano_obra.{formato}"]
+    raise ValueError(f"Formato de salida desconocido: {formato}")
+
+
+def escritor(formato: str, base: str) -> Escritor:
+    if formato == "xlsx":
+        return XlsxWriter(ficheros_salida(formato, base)[0])
+    if formato == "csv":
+        return CsvWriter(base)
+    if formato == "parquet":
+        return ParquetWriter(base)
+    raise ValueError(f"Formato de salida desconocido: {formato}")
+
+
+def _como_fecha(valor: Any) -> Any:
+
+    # Las filas leidas de un xlsx traen las fechas como datetime
+
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    return valor
+
+
+class _FicheroCsv:
+    """Fichero csv de una hoja, escrito en un temporal hasta que se cierra."""
+
+    def __init__(self, filename: str, columnas: list[tuple[str, int, str | None]]):
+        self.filename = filename
+        self.temporal = f"{filename}.tmp"
+        self.fechas = [
+            i for i, (_, _, formato) in enumerate(columnas) if formato == FORMATO_FECHA
+        ]
+        self.numeros = [
+            i for i, (_, _, formato) in enumerate(columnas) if formato == FORMATO_NUMERO
+        ]
+        self.filas = 0
+
+        self.file = open(self.temporal, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([cabecera for cabecera, _, _ in columnas])
+
+    def append(self, valores: Sequence[Any]) -> None:
+
+        # Las filas leidas de un xlsx traen como int los numeros sin decimales; se escriben como float,
+        # igual que los del almacen, para que el mismo numero se escriba siempre igual
+
+        fila = list(valores)
+        for i in self.fechas:
+            fila[i] = _como_fecha(fila[i])
+        for i in self.numeros:
+            if fila[i] is not None:
+                fila[i] = float(fila[i])
+        self.writer.writerow(fila)
+        self.filas += 1
+
+    def extend(self, filas: Iterator[list[Any]]) -> None:
+
+        # Filas generadas desde el almacen, con las fechas ya como datetime.date
+
+        filas = list(filas)
+        self.writer.writerows(filas)
+        self.filas += len(filas)
+
+    def close(self) -> None:
+        self.file.close()
+        os.replace(self.temporal, self.filename)
+
+    def descarta(self) -> None:
+        self.file.close()
+        os.remove(self.temporal)
+
+
+class CsvWriter:
+    """Escribe las filas de materiales y de mano de obra en un fichero csv cada una."""
+
+    def __init__(self, base: str):
+        self.filename, filename_mano_obra = ficheros_salida("csv", base)
+        self.materiales = _FicheroCsv(self.filename, COLUMNAS_MATERIALES)
+        try:
+            self.mano_obra = _FicheroCsv(filename_mano_obra, COLUMNAS_MANO_OBRA)
+        except BaseException:
+            self.materiales.descarta()
+            raise
+
+    def add_material_row(self, row: Sequence[Any]) -> None:
+        self.materiales.append(row)
+
+    def add_job_row(self, row: Sequence[Any]) -> None:
+        self.mano_obra.append(row)
+
+    def add_material_rows(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+        self.materiales.extend(filas_materiales(almacen, numero_ot, desde))
+
+    def add_job_rows(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+        self.mano_obra.extend(filas_mano_obra(almacen, numero_ot, desde))
+
+    def add_resumen(self, resumen: ResumenCostes) -> None:
+        pass
+
+    def close(self) -> None:
+        self.materiales.close()
+        self.mano_obra.close()
+
+    def descarta(self) -> None:
+        self.materiales.descarta()
+        self.mano_obra.descarta()
+
+
+# Nombre de cada campo del almacen en el orden de las columnas de cada hoja, sin la linea y el numero de OT
+
+CAMPOS_MATERIALES = [
+    "Referencia",
+    "Descripcion",
+    "Fecha",
+    "Cantidad",
+    "PrecioUnitarioCoste",
+    "ImporteTotalCoste",
+    "PrecioUnitarioVenta",
+    "ImporteTotalVenta",
+]
+
+CAMPOS_MANO_OBRA = [
+    "OperacionId",
+    "Operacion",
+    "Fecha",
+    "OperarioId",
+    "OperarioNombre",
+    "Cantidad",
+    "PrecioUnitarioCoste",
+    "ImporteTotalCoste",
+    "DietasCoste",
+    "DesplazamientoCoste",
+    "PrecioUnitarioVenta",
+    "ImporteTotalVenta",
+    "DietasVenta",
+    "DesplazamientoVenta",
+]
+
+
+class _FicheroParquet:
+    """Fichero parquet de una hoja, escrito por grupos de filas en un temporal hasta que se cierra."""
+
+    def __init__(
+        self,
+        filename: str,
+        columnas: list[tuple[str, int, str | None]],
+        campos: list[str],
+    ):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.filename = filename
+        self.temporal = f"{filename}.tmp"
+        self.campos = campos
+        self.filas = 0
+
+        # Los textos vacios se leen de un xlsx como None, en parquet se guardan como ""
+
+        self.textos: set[int] = set()
+
+        tipos = []
+        for i, (cabecera, _, formato) in enumerate(columnas):
+            if i == 0:
+                tipo = pa.int64()
+            elif formato == FORMATO_FECHA:
+                tipo = pa.date32()
+            elif formato == FORMATO_NUMERO:
+                tipo = pa.float64()
+            else:
+                tipo = pa.string()
+                self.textos.add(i)
+            tipos.append(pa.field(cabecera, tipo))
+        self.schema = pa.schema(tipos)
+
+        # Filas pendientes de escribir, por columnas
+
+        self.pendientes: list[list[Any]] = [[] for _ in columnas]
+
+        self.writer = pq.ParquetWriter(self.temporal, self.schema)
+
+    def append(self, valores: Sequence[Any]) -> None:
+        for i, (columna, valor) in enumerate(zip(self.pendientes, valores)):
+            if valor is None and i in self.textos:
+                valor = ""
+            columna.append(_como_fecha(valor))
+        self.filas += 1
+        if len(self.pendientes[0]) >= TAMANO_GRUPO_PARQUET:
+            self._escribe()
+
+    def extend(self, almacen: AlmacenColumnas, numero_ot: str, desde: int) -> None:
+
+        # Las columnas del almacen pasan directamente a las columnas pendientes, sin formar filas
+
+        lineas = almacen.columna("line_number", desde)
+        self.pendientes[0].extend(linea + 1 for linea in lineas)
+        self.pendientes[1].extend([numero_ot] * len(lineas))
+        for columna, campo in zip(self.pendientes[2:], self.campos):
+            columna.extend(almacen.columna(campo, desde))
+        self.filas += len(lineas)
+        if len(self.pendientes[0]) >= TAMANO_GRUPO_PARQUET:
+            self._escribe()
+
+    def _escribe(self) -> None:
+        if len(self.pendientes[0]) == 0:
+            return
+        tabla = self.pa.Table.from_arrays(
+            [
+                self.pa.array(valores, type=campo.type)
+                for valores, campo in zip(self.pendientes, self.schema)
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(tabla)
+        for columna in self.pendientes:
+            columna.clear()
+
+    def close(self) -> None:
+        self._escribe()
+        self.writer.close()
+        os.replace(self.temporal, self.filename)
+
+    def descarta(self) -> None:
+        self.writer.close()
+        os.remove(self.temporal)
+
+
+class ParquetWriter:
+    """Escribe las filas de materiales y de mano de obra en un fichero parquet cada una. Necesita pyarrow."""
+
+    def __init__(self, base: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                'El formato "parquet" necesita el paquete pyarrow (pip install pyarrow).'
+            ) from None
+
+        self.filename, filename_mano_obra = ficheros_salida("parquet", base)
+        self.materiales = _FicheroParquet(
+            self.filename, COLUMNAS_MATERIALES, CAMPOS_MATERIALES
+        )
+        try:
+            self.mano_obra = _FicheroParquet(
+                filename_mano_obra, COLUMNAS_MANO_OBRA, CAMPOS_MANO_OBRA
+            )
+        except BaseException:
+            self.materiales.descarta()
+            raise
+
+    def add_material_row(self, row: Sequence[Any]) -> None:
+        self.materiales.append(row)
+
+    def add_job_row(self, row: Sequence[Any]) -> None:
+        self.mano_obra.append(row)
+
+    def add_material_rows(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+        self.materiales.extend(almacen, numero_ot, desde)
+
+    def add_job_rows(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+        self.mano_obra.extend(almacen, numero_ot, desde)
+
+    def add_resumen(self, resumen: ResumenCostes) -> None:
+        pass
+
+    def close(self) -> None:
+        self.materiales.close()
+        self.mano_obra.close()
+
+    def descarta(self) -> None:
+        self.materiales.descarta()
+        self.mano_obra.descarta()
+
+
+Escritor = Union[XlsxWriter, CsvWriter, ParquetWriter]
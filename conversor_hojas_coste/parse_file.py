@@ -1,18 +1,24 @@
+from contextlib import redirect_stdout
+import io
 import re
-
-from openpyxl import Workbook
-from openpyxl.styles import Alignment
-from openpyxl.worksheet.worksheet import Worksheet
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.utils import get_column_letter
-
-from material_line import MaterialLine
-from job_line import JobLine
-
-
-# A partir de dos archivos, uno con un nombre como "nnnnnn.txt" y otro con un nombre como "nnnnnncoste.txt", donde n es un número natural
-# Este script analizará los archivos y creará nuevos archivos llamados "nnnnnn_materiales.csv" y "nnnnnn_trabajo.csv"
-# La codificación del archivo es windows-1252
+import time
+
+from material_line import MaterialLine, FORMATO_MATERIALES
+from job_line import JobLine, FORMATO_MANO_OBRA
+from footer_totals import MATERIALES, ComprobacionTotales
+from line_classifier import ClasificadorLineas, TipoLinea
+from project_files import ruta_en_carpeta
+from reconciliation import Conciliacion
+from record_store import AlmacenColumnas
+from report_reader import LectorInforme
+from stage_timing import etapa, recoge
+from summaries import ResumenCostes
+from output_formats import Escritor, escritor, ficheros_salida
+
+# A partir de dos archivos, uno con un nombre como "nnnnnnventa.txt" y otro con un nombre como "nnnnnncoste.txt", donde n es un número natural
+# Este script analizará los archivos y creará un archivo "nnnnnn_de_ddmmaaaa_a_ddmmaaaa.xlsx" con las hojas de materiales,
+# mano de obra y resumen (o un csv/parquet por hoja con otro formato de salida)
+# La codificación de los archivos es UTF-16LE
 
 # El archivo tiene este formato:
 
@@ -48,7 +54,8 @@ from job_line import JobLine
 #    1 COLABORACION CON ALVARO  20/11/2024   96 RIVERA ARISTIZABAL, JORG    1,00  25,000     0,00   0,00      25,00
 #    1 General                  19/12/2024    9 L�PEZ NIETO, ALVARO         8,00  25,000     0,00   0,00     200,00
 
-# Vamos a cargar el archivo completo en memoria y luego lo vamos a parsear para extraer la información que necesitamos
+# Los dos archivos se leen a la vez y por bloques de líneas con LectorInforme (report_reader), sin cargarlos enteros
+# en memoria, y cada bloque se parsea para extraer la información que necesitamos
 
 
 # Primero, podemos eliminar las primeras líneas hasta encontrar una línea como esta:
@@ -57,472 +64,561 @@ from job_line import JobLine
 # Descartar también las siguientes dos líneas
 # Después podemos dividir el archivo en líneas y extraer la información que necesitamos
 
-# Vamos a crear una clase para almacenar la información del archivo, MaterialLine, y crear una lista
-# Parsear una línea del archivo y almacenar la información en un objeto MaterialLine y añadirlo a la lista
-# Tras procesar la línea de material, hay que comprobar el primer carácter de la línea; si es un espacio, el campo Referencia está vacío
-# Si es otro salto de línea (CRLF), es el final de la página, por lo que hay que omitir líneas hasta que, comprobando el primer carácter, encontremos una línea con un carácter distinto de espacio
-# Si el carácter es un guion bajo, significa que hemos llegado al final de la sección de materiales, así que hay que omitir la siguiente línea y empezar a leer la sección de mano de obra
+# Las líneas de cada sección se parsean por lotes con MaterialLine.parse_batch / JobLine.parse_batch
+# y sus valores se guardan por columnas en un AlmacenColumnas (record_store)
+# Para saber que es cada línea (fila de material o de mano de obra, salto de página, línea en blanco o totales)
+# se usa la máquina de estados de line_classifier, que clasifica cada línea una sola vez y en orden
 
 # Aquí vamos a intentar parsear la primera parte del archivo, la sección de materiales
 
 
-def ParseFile(
-    filename_cost: str,
-    filename_sell: str,
-    numero_ot: str,
-    errors: bool,
-    verbose: bool,
+# Numero maximo de lineas candidatas que se parsean de una vez
+
+TAMANO_LOTE = 10000
+
+
+class _Lote:
+    """Lineas candidatas de una seccion pendientes de parsear, con su linea de coste y de venta."""
+
+    def __init__(self):
+        self.coste: list[str] = []
+        self.venta: list[str] = []
+        self.numeros: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.numeros)
+
+    def extend(
+        self, costes: list[str], ventas: list[str], numeros: range
+    ) -> None:
+        self.coste.extend(costes)
+        self.venta.extend(ventas)
+        self.numeros.extend(numeros)
+
+    def clear(self) -> None:
+        self.coste.clear()
+        self.venta.clear()
+        self.numeros.clear()
+
+
+def _muestra_lineas(
+    seccion: str,
+    primera: int,
+    guias: list[str],
+    costes: list[str],
+    ventas: list[str],
+    desde: int,
+    hasta: int,
+    use_cost: bool,
+    use_sell: bool,
 ) -> None:
+    for i in range(desde, hasta):
+        line_number = primera + i
+        if use_cost:
+            print(f"Linea {seccion} coste {line_number}: {costes[i]}", end="")
+        if use_sell:
+            print(f"Linea {seccion} venta {line_number}: {ventas[i]}", end="")
+        print(f"Linea {seccion} guia {line_number}: {guias[i]}", end="")
 
-    line_number = 0
 
-    lines_cost: list[str] = []
-    lines_sell: list[str] = []
+class EstadisticasConversion:
+    """Lineas parseadas, rechazadas e incongruentes de una conversion, fichero generado, comprobacion de los totales
+    del informe y totales para el resumen."""
 
-    if filename_cost != "":
-        with open(filename_cost, "r", encoding="UTF-16LE") as file:
-            lines_cost = file.readlines()
+    def __init__(self):
+        self.lineas_materiales = 0
+        self.lineas_mano_obra = 0
+        self.rechazadas = 0
+        self.incongruencias = 0
+        self.salida: str | None = None
+        self.conciliacion = Conciliacion()
+        self.totales = ComprobacionTotales()
+        self.resumen = ResumenCostes()
 
-    if filename_sell != "":
-        with open(filename_sell, "r", encoding="UTF-16LE") as file:
-            lines_sell = file.readlines()
+    def como_dict(self) -> dict:
+        return {
+            "lineas_materiales": self.lineas_materiales,
+            "lineas_mano_obra": self.lineas_mano_obra,
+            "rechazadas": self.rechazadas,
+            "incongruencias": self.incongruencias,
+            "salida": self.salida,
+            "conciliacion": self.conciliacion.como_dict(),
+            "totales": self.totales.como_dict(),
+        }
 
-    lines_guide: list[str] = []
 
-    if len(lines_cost) > 0:
-        lines_guide = lines_cost
+class _SinFichero:
+    """Ocupa el lugar del escritor cuando no se quiere el fichero del proyecto, solo sus filas."""
 
-    elif len(lines_sell) > 0:
-        lines_guide = lines_sell
+    def add_material_rows(self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0) -> None:
+        pass
 
-    else:
-        raise ValueError("No se han proporcionado archivos para parsear.")
+    def add_job_rows(self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0) -> None:
+        pass
 
-    use_cost = len(lines_cost) > 0
-    use_sell = len(lines_sell) > 0
+    def add_resumen(self, resumen: ResumenCostes) -> None:
+        pass
 
-    if verbose:
-        print(f"Usando coste: {use_cost}, usando venta: {use_sell}")
-        print(f"Número de líneas en coste: {len(lines_cost)}")
-        print(f"Número de líneas en venta: {len(lines_sell)}")
-        print(f"Número de líneas en guía: {len(lines_guide)}")
+    def close(self) -> None:
+        pass
 
-    # En la fila 6 se puede ver el rango de fechas de la hoja de coste
-    # Desde Fecha  20/03/2024      Hasta Fecha  20/03/2025
+    def descarta(self) -> None:
+        pass
 
-    fecha_desde = None
-    fecha_hasta = None
 
-    match_fecha = re.search(
-        r"Desde Fecha\s+(\d{2}/\d{2}/\d{4})\s+Hasta Fecha\s+(\d{2}/\d{2}/\d{4})",
-        lines_guide[5],
-    )
+def _muestra_errores(
+    seccion: str,
+    errores: list[Exception],
+    errors: bool,
+    estadisticas: EstadisticasConversion,
+) -> None:
+
+    # Las lineas no validas solo se muestran si se piden todos los errores. Las incongruencias se muestran siempre,
+    # todas juntas al acabar la conversion (ver reconciliation)
+
+    for e in errores:
+        if isinstance(e, (MaterialLine.IncongruentError, JobLine.IncongruentError)):
+            estadisticas.incongruencias += 1
+            estadisticas.conciliacion.anade(seccion, e)
+        else:
+            estadisticas.rechazadas += 1
+            if errors:
+                print(e)
+
 
-    if match_fecha:
-        fecha_desde = match_fecha.group(1)
-        fecha_hasta = match_fecha.group(2)
-        print(f"Fecha desde: {fecha_desde}, Fecha hasta: {fecha_hasta}")
-    else:
-        print("No se encontró el rango de fechas.")
-        print(lines_guide[5])
-        raise ValueError(
-            "No se pudo encontrar el rango de fechas en la línea 5."
+def _escribe_lote_materiales(
+    writer: Escritor,
+    almacen: AlmacenColumnas,
+    lote: _Lote,
+    numero_ot: str,
+    use_cost: bool,
+    use_sell: bool,
+    errors: bool,
+    verbose: bool,
+    conserva_filas: bool,
+    estadisticas: EstadisticasConversion,
+) -> int:
+
+    with etapa("parseo", len(lote)):
+        columnas, errores = MaterialLine.parse_batch(
+            lote.coste, lote.venta, lote.numeros, use_cost, use_sell
         )
+        lote.clear()
 
-    fecha_desde = fecha_desde.replace("/", "")
-    fecha_hasta = fecha_hasta.replace("/", "")
+        _muestra_errores("materiales", errores, errors, estadisticas)
+
+        # Las filas nuevas se guardan en el almacen y se escriben directamente desde sus columnas
+
+        inicio = almacen.extend(columnas)
+
+    if verbose:
+        for indice in range(inicio, len(almacen)):
+            print(f"New material line: {almacen[indice]}")
+
+    filas = len(almacen) - inicio
+
+    with etapa("totales", filas):
+        estadisticas.totales.anade_materiales(almacen, inicio)
+
+    with etapa("resumen", filas):
+        estadisticas.resumen.anade_materiales(almacen, numero_ot, inicio)
+
+    with etapa("escritura", filas):
+        writer.add_material_rows(almacen, numero_ot, inicio)
+
+    # Si no hay que devolver todas las filas, el almacen solo guarda las del lote en curso
 
-    # Remove the first lines until the first character of the line is not other than a "_". It must be the first character.
+    if not conserva_filas:
+        almacen.clear()
 
-    while lines_guide[line_number][0] != "_":
-        line_number += 1
+    return filas
 
-    # Comprueba que la linea actual es el header de la seccion de materiales
-    # _________________________________________________M A T E R I A L_________________________________________________
 
-    if (
-        re.match(r"^_+M A T E R I A L_+$", lines_guide[line_number].strip())
-        == None
-    ):
-        raise ValueError(
-            f"La línea {line_number} no es el encabezado de la sección de materiales: {lines_guide[line_number]}"
+def _escribe_lote_mano_obra(
+    writer: Escritor,
+    almacen: AlmacenColumnas,
+    lote: _Lote,
+    numero_ot: str,
+    use_cost: bool,
+    use_sell: bool,
+    errors: bool,
+    verbose: bool,
+    conserva_filas: bool,
+    estadisticas: EstadisticasConversion,
+) -> int:
+
+    with etapa("parseo", len(lote)):
+        columnas, errores = JobLine.parse_batch(
+            lote.coste, lote.venta, lote.numeros, use_cost, use_sell
         )
+        lote.clear()
 
-    # Nos saltamos esta y las dos siguientes líneas
+        _muestra_errores("mano de obra", errores, errors, estadisticas)
 
-    line_number += 2
+        # Las filas nuevas se guardan en el almacen y se escriben directamente desde sus columnas
 
-    # La linea actual es la primera línea de material
+        inicio = almacen.extend(columnas)
 
-    # Parsear las líneas de material hasta encontrar el final de la primera pagina o el final de la sección de materiales
+    if verbose:
+        for indice in range(inicio, len(almacen)):
+            print(f"New job line: {almacen[indice]}")
 
-    # Este es un ejemplo del final de una pagina:
+    filas = len(almacen) - inicio
 
-    # RIT3110000       TERMOSTATO SK PARA INTERRUPTOR ARMARIO   25/11/2024        1,00          29,893           29,89
-    #
-    #                                                                                    P�g.     2
-    #   Hoja de Coste N� 230582
-    #
-    # IN
-    #
-    # STALACIONES ELEC. EGARA, SL                                                                                      jueves, 20 de marzo de 2025
-    #
-    #      Cliente     230 AD-TECH IBERICA, SL                                  Responsable
-    #      Desde Fecha  19/09/2024      Hasta Fecha  20/03/2025                 Valoraci�n Coste
-    #      Descripci�n LIFTED NOVORDISK
-    #                  Pto. n� 4000290
-    #                  Cuadros el�ctricos -->          36.573,00�
-    #                  Esquemas el�ctricos -->         3.200,00�
-    #                  Programaci�n PLC + HMI --> 6.400,00�
-    # RIT3240200       FILTRO SALIDA PARA 3240 3241 RAL7035     02/12/2024        1,00          32,215           32,22
+    with etapa("totales", filas):
+        estadisticas.totales.anade_mano_obra(almacen, inicio)
 
-    # La linea esta vacia completamente. Al detectar una linea con solo un salto de linea vamos a empezar a saltar lineas hasta encontrar una linea que el primer caracter no sea tambien un espacio o un salto de linea
+    with etapa("resumen", filas):
+        estadisticas.resumen.anade_mano_obra(almacen, numero_ot, inicio)
 
-    # El final de la seccion de materiales es una linea como esta:
+    with etapa("escritura", filas):
+        writer.add_job_rows(almacen, numero_ot, inicio)
 
-    # WEI1240840000    SWITCH DE RED NO GESTIONADO IE-SW        31/01/2025        3,00          63,420          190,26
-    #                                                                     ___________                 _______________
-    #                                                                        1.677,10                       14.845,22
+    # Si no hay que devolver todas las filas, el almacen solo guarda las del lote en curso
 
-    # Este caso lo veremos porque es una linea que tiene un espacio en la primera posicion.
+    if not conserva_filas:
+        almacen.clear()
 
-    # Create a list to store the material lines
+    return filas
 
-    material_lines: list[MaterialLine] = []
 
-    # En resumen. Iterar sobre las líneas
+def _parsea_secciones(
+    writer: Escritor,
+    lector: LectorInforme,
+    numero_ot: str,
+    errors: bool,
+    verbose: bool,
+    conserva_filas: bool,
+    estadisticas: EstadisticasConversion,
+) -> tuple[AlmacenColumnas, AlmacenColumnas, int, int]:
 
-    # Si el primer carácter no es un espacio ni un salto de línea (CRLF), es una línea de material: parsearla y almacenar la información en un objeto MaterialLine
-    # Si es un salto de línea (CRLF), es el final de la página; hay que saltar líneas hasta encontrar una cuyo primer carácter no sea espacio o salto de línea
-    # Si es un espacio, puede ser que el campo Referencia esté vacío o que sea el final de la lista
-    # Si es un guion bajo, es el final de la sección de materiales; terminar el bucle
-    # Si es una letra, continuar parseando el archivo
+    # Cada linea se clasifica una sola vez con la maquina de estados de line_classifier: preambulo, encabezados,
+    # filas de material y de mano de obra, cabeceras de pagina repetidas, lineas en blanco y totales.
+    # Las lineas llegan del lector por bloques y las filas de cada seccion se acumulan y se parsean por lotes,
+    # columna a columna. El clasificador conserva su estado de un bloque al siguiente.
+    # Los totales del informe se leen al pasar por ellos, para compararlos con las sumas de las filas parseadas;
+    # se deja de leer despues del total de la hoja.
 
-    while line_number < len(lines_guide):
+    use_cost = lector.use_cost
+    use_sell = lector.use_sell
 
-        line_number += 1
+    material_lines = 0
+    job_lines = 0
 
-        if use_cost:
-            line_cost = lines_cost[line_number]
-        else:
-            line_cost = ""
+    lote_materiales = _Lote()
+    materiales = AlmacenColumnas(FORMATO_MATERIALES)
 
-        if use_sell:
-            line_sell = lines_sell[line_number]
-        else:
-            line_sell = ""
+    lote_mano_obra = _Lote()
+    mano_obra = AlmacenColumnas(FORMATO_MANO_OBRA)
 
-        line_guide = lines_guide[line_number]
+    clasificador = ClasificadorLineas()
+    fin = False
 
-        if verbose:
-            if use_cost:
-                print(
-                    f"Linea material coste {line_number}: {line_cost}", end=""
-                )
-            if use_sell:
-                print(
-                    f"Linea material venta {line_number}: {line_sell}", end=""
+    for primera, guias, costes, ventas in lector.bloques(TAMANO_LOTE):
+
+        with etapa("clasificacion", len(guias)):
+            segmentos = list(clasificador.segmentos(guias, primera))
+
+        for tipo, desde, hasta in segmentos:
+
+            if tipo is TipoLinea.FILA_MATERIAL:
+                if verbose:
+                    _muestra_lineas("material", primera, guias, costes, ventas, desde, hasta, use_cost, use_sell)
+
+                lote_materiales.extend(
+                    costes[desde:hasta], ventas[desde:hasta], range(primera + desde, primera + hasta)
                 )
-            print(f"Linea material guia {line_number}: {line_guide}", end="")
 
-        # Si la linea empieza por un salto de linea, ignorarla
-        if line_guide[0] == "\n":
-            continue
+                if len(lote_materiales) >= TAMANO_LOTE:
+                    material_lines += _escribe_lote_materiales(
+                        writer, materiales, lote_materiales, numero_ot, use_cost, use_sell, errors, verbose, conserva_filas, estadisticas
+                    )
+
+            elif tipo is TipoLinea.FILA_MANO_OBRA:
+                if verbose:
+                    _muestra_lineas("job", primera, guias, costes, ventas, desde, hasta, use_cost, use_sell)
 
-        # Si la linea es exactamente:
-        #                                                                     ___________                 _______________
-        # Hemos llegado al final de la seccion de materiales
+                lote_mano_obra.extend(
+                    costes[desde:hasta], ventas[desde:hasta], range(primera + desde, primera + hasta)
+                )
 
-        if (
-            line_guide
-            == "                                                                     ___________                 _______________\n"
-        ):
+                if len(lote_mano_obra) >= TAMANO_LOTE:
+                    job_lines += _escribe_lote_mano_obra(
+                        writer, mano_obra, lote_mano_obra, numero_ot, use_cost, use_sell, errors, verbose, conserva_filas, estadisticas
+                    )
+
+            else:
+                if verbose:
+                    for i in range(desde, hasta):
+                        print(f"Linea {tipo.value} {primera + i}: {guias[i]}", end="")
+
+                if tipo is TipoLinea.CABECERA_PAGINA and use_cost and use_sell:
+                    estadisticas.conciliacion.comprueba_paginas(
+                        guias, ventas, primera, desde, hasta
+                    )
+
+                elif tipo is TipoLinea.TOTALES_MATERIALES:
+                    estadisticas.totales.lee_pie(
+                        MATERIALES, guias, costes, ventas, primera, desde, hasta, use_cost, use_sell
+                    )
+
+                elif tipo is TipoLinea.FIN:
+                    if estadisticas.totales.lee_fin(
+                        guias, costes, ventas, primera, desde, hasta, use_cost, use_sell
+                    ):
+                        fin = True
+                        break
+
+        if fin:
             break
 
-        new_material_line: MaterialLine | None = None
+    clasificador.comprueba_fin()
 
-        try:
-            new_material_line = MaterialLine.parse(
-                line_guide,
-                line_cost,
-                line_sell,
-                line_number,
-                use_cost,
-                use_sell,
-            )
-        except MaterialLine.NotValidError as e:
-            if errors:
-                print(e)
-            pass
-        except MaterialLine.IncongruentError as e:
-            print(e)
-        if new_material_line is not None:
-            if verbose:
-                print(f"New material line: {new_material_line}")
-            material_lines.append(new_material_line)
+    material_lines += _escribe_lote_materiales(
+        writer, materiales, lote_materiales, numero_ot, use_cost, use_sell, errors, verbose, conserva_filas, estadisticas
+    )
+    job_lines += _escribe_lote_mano_obra(
+        writer, mano_obra, lote_mano_obra, numero_ot, use_cost, use_sell, errors, verbose, conserva_filas, estadisticas
+    )
 
-    # Ahora, saltar las líneas hasta encontrar el inicio de la sección de mano de obra
-    while line_number < len(lines_guide):
+    return materiales, mano_obra, material_lines, job_lines
 
-        line_number += 1
 
-        line = lines_guide[line_number]
+RANGO_FECHAS_RE = re.compile(
+    r"Desde Fecha\s+(\d{2}/\d{2}/\d{4})\s+Hasta Fecha\s+(\d{2}/\d{2}/\d{4})"
+)
 
-        if line[0] == "_":
-            # Comprobar si la siguiente linea es el encabezado de la seccion de mano de obra
-            if re.match(
-                r"^_+M A N O   D E   O B R A_+$",
-                lines_guide[line_number].strip(),
-            ):
-                # Hemos llegado al inicio de la seccion de mano de obra
-                break
 
-    line_number += 2
+def _nombre_salida(numero_ot: str, fecha_desde: str, fecha_hasta: str) -> str:
 
-    #   1 ARMADO DE CUADRO DE DINA 20/08/2024  109 GARCIA RODRIGUEZ, KEVIN     3,00   30,00     0,00   0,00      90,00
+    # Nombre de la salida sin extension, que depende del formato
 
-    # Now, until the end, parse the lines that have a "1" in the fourth position
+    fecha_desde = fecha_desde.replace("/", "")
+    fecha_hasta = fecha_hasta.replace("/", "")
+    return f"{numero_ot}_de_{fecha_desde}_a_{fecha_hasta}"
 
-    # Create a list to store the job lines
 
-    job_lines: list[JobLine] = []
+def fichero_salida(
+    filename_cost: str,
+    filename_sell: str,
+    numero_ot: str,
+    carpeta_salida: str = ".",
+    formato: str = "xlsx",
+) -> str | None:
 
-    # Iterate over the lines
+    # Ruta del fichero que genera ParseFile para estos ficheros (el de materiales si el formato genera dos),
+    # leyendo solo hasta la linea del rango de fechas. Devuelve None si no hay ficheros o no tienen el rango de fechas.
 
-    while line_number < len(lines_guide):
+    with LectorInforme(filename_cost, filename_sell) as lector:
+        match_fecha = RANGO_FECHAS_RE.search(lector.linea_guia(5))
 
-        line_number += 1
+    if match_fecha is None:
+        return None
 
-        if use_cost:
-            line_cost = lines_cost[line_number]
-        else:
-            line_cost = ""
+    base = ruta_en_carpeta(
+        carpeta_salida,
+        _nombre_salida(numero_ot, match_fecha.group(1), match_fecha.group(2)),
+    )
+    return ficheros_salida(formato, base)[0]
 
-        if use_sell:
-            line_sell = lines_sell[line_number]
-        else:
-            line_sell = ""
 
-        line_guide = lines_guide[line_number]
+def ParseFile(
+    filename_cost: str,
+    filename_sell: str,
+    numero_ot: str,
+    errors: bool,
+    verbose: bool,
+    conserva_filas: bool = False,
+    carpeta_salida: str = ".",
+    estadisticas: EstadisticasConversion | None = None,
+    escribe_fichero: bool = True,
+    formato: str = "xlsx",
+) -> tuple[AlmacenColumnas, AlmacenColumnas]:
+
+    # Los ficheros se leen por bloques segun se parsean y las filas se escriben en el xlsx segun se van parseando,
+    # asi que la memoria no depende de la longitud del informe.
+    # Si conserva_filas, devuelve ademas todas las lineas de materiales y de mano de obra, guardadas por columnas.
+    # Si no, los almacenes solo guardan el lote en curso y se devuelven vacios.
+    # Si se da estadisticas, se rellena con las lineas parseadas y rechazadas, el fichero generado
+    # y los totales de las hojas de resumen.
+    # Sin escribe_fichero no se genera el fichero del proyecto, para quien solo quiere las filas (con conserva_filas).
+    # formato es uno de los de output_formats: xlsx, csv o parquet.
+
+    if estadisticas is None:
+        estadisticas = EstadisticasConversion()
+
+    with LectorInforme(filename_cost, filename_sell) as lector:
+
+        if not lector.use_cost and not lector.use_sell:
+            raise ValueError("No se han proporcionado archivos para parsear.")
 
         if verbose:
-            if use_cost:
-                print(f"Linea job coste {line_number}: {line_cost}", end="")
-            if use_sell:
-                print(f"Linea job venta {line_number}: {line_sell}", end="")
-            print(f"Linea job guia {line_number}: {line_guide}", end="")
+            print(f"Usando coste: {lector.use_cost}, usando venta: {lector.use_sell}")
 
-        # Si la linea es la siguiente:                                                                     __________         ________ ______ __________
+        # En la fila 6 se puede ver el rango de fechas de la hoja de coste
+        # Desde Fecha  20/03/2024      Hasta Fecha  20/03/2025
+        # Solo se leen las lineas del fichero hasta ella
 
-        # Si la linea es exactamente esta, hemos llegado al final de la seccion de mano de obra
+        fecha_desde = None
+        fecha_hasta = None
 
-        if (
-            line_guide
-            == "                                                                    __________         ________ ______ __________\n"
-        ):
-            break
-
-        new_job_line: JobLine | None = None
+        match_fecha = RANGO_FECHAS_RE.search(lector.linea_guia(5))
 
-        try:
-            new_job_line = JobLine.parse(
-                line_guide,
-                line_cost,
-                line_sell,
-                line_number,
-                use_cost,
-                use_sell,
+        if match_fecha:
+            fecha_desde = match_fecha.group(1)
+            fecha_hasta = match_fecha.group(2)
+            print(f"Fecha desde: {fecha_desde}, Fecha hasta: {fecha_hasta}")
+        else:
+            print("No se encontró el rango de fechas.")
+            print(lector.linea_guia(5))
+            raise ValueError(
+                "No se pudo encontrar el rango de fechas en la línea 5."
             )
-        except JobLine.NotValidError as e:
-            if errors:
-                print(e)
-        except JobLine.IncongruentError as e:
-            print(e)
-
-        if new_job_line is not None:
-            if verbose:
-                print(f"New job line: {new_job_line}")
-            job_lines.append(new_job_line)
-
-    print(f"Se han parseado {len(material_lines)} líneas de material.")
-    print(f"Se han parseado {len(job_lines)} líneas de mano de obra.")
-
-    # Now we are going to write the information to a csv file
-
-    filename_material = numero_ot + "_materiales.xlsx"
-    filename_job = numero_ot + "_manodeobra.xlsx"
-    filename = f"{numero_ot}_de_{fecha_desde}_a_{fecha_hasta}.xlsx"
-
-    # Write the material lines
-
-    wb = Workbook()
-    ws: Worksheet = wb.active
-    if ws is None:
-        raise ValueError("No se pudo crear la hoja de cálculo.")
-
-    ws.title = "Materiales"
-
-    ws.append(
-        [
-            "Linea fichero original",
-            "Numero OT",
-            "Referencia",
-            "Descripcion",
-            "Fecha",
-            "Cantidad",
-            "Precio Coste",
-            "Importe Coste",
-            "Precio Venta",
-            "Importe Venta",
-        ]
-    )
 
-    for material_line in material_lines:
+        base = ruta_en_carpeta(
+            carpeta_salida, _nombre_salida(numero_ot, fecha_desde, fecha_hasta)
+        )
+        filename = ficheros_salida(formato, base)[0]
+
+        with etapa("escritura"):
+            writer = escritor(formato, base) if escribe_fichero else _SinFichero()
 
-        ws.append(
-            [
-                material_line.line_number + 1,
+        try:
+            materiales, mano_obra, material_lines, job_lines = _parsea_secciones(
+                writer,
+                lector,
                 numero_ot,
-                material_line.Referencia,
-                material_line.Descripcion,
-                material_line.Fecha,
-                material_line.Cantidad,
-                material_line.PrecioUnitarioCoste,
-                material_line.ImporteTotalCoste,
-                material_line.PrecioUnitarioVenta,
-                material_line.ImporteTotalVenta,
-            ]
-        )
+                errors,
+                verbose,
+                conserva_filas,
+                estadisticas,
+            )
 
-    ws.column_dimensions["A"].width = 19
-    ws.column_dimensions["B"].width = 12
-    ws.column_dimensions["C"].width = 20
-    ws.column_dimensions["D"].width = 50
-    ws.column_dimensions["E"].width = 12
-    ws.column_dimensions["F"].width = 10
-    ws.column_dimensions["G"].width = 14
-    ws.column_dimensions["H"].width = 14
-    ws.column_dimensions["I"].width = 14
-    ws.column_dimensions["J"].width = 14
+            # Los dos ficheros tienen que tener las mismas lineas, tambien despues de los totales
 
-    ws.row_dimensions[1].height = 36
-    ws.row_dimensions[1].alignment = Alignment(wrap_text=True)
+            if lector.use_cost and lector.use_sell:
+                with etapa("conciliacion", 1):
+                    lector.lee_resto()
+                    estadisticas.conciliacion.comprueba_lineas(
+                        lector.lineas_coste, lector.lineas_venta
+                    )
+        except BaseException:
+            writer.descarta()
+            raise
+        finally:
+            estadisticas.conciliacion.muestra()
 
-    number_format = "#,##0.00#"
+        if verbose:
+            print(f"Número de líneas leídas: {lector.lineas_leidas}")
 
-    # Iterate over all cells in columns F to J and set the number format
+    estadisticas.totales.muestra()
 
-    for cell in ws["F"] + ws["G"] + ws["H"] + ws["I"] + ws["J"]:
-        cell.number_format = number_format
+    print(f"Se han parseado {material_lines} líneas de material.")
+    print(f"Se han parseado {job_lines} líneas de mano de obra.")
 
-    for cell in ws["E"]:
-        cell.number_format = "dd/mm/yyyy"
+    with etapa("guardado", 1):
+        writer.add_resumen(estadisticas.resumen)
+        writer.close()
 
-    table = Table(
-        displayName="materiales", ref="A1:J" + str(len(material_lines) + 1)
-    )
+    estadisticas.lineas_materiales = material_lines
+    estadisticas.lineas_mano_obra = job_lines
+    estadisticas.salida = filename if escribe_fichero else None
 
-    style = TableStyleInfo(
-        name="TableStyleMedium9",
-        showFirstColumn=False,
-        showLastColumn=False,
-        showRowStripes=True,
-        showColumnStripes=False,
-    )
+    return materiales, mano_obra
 
-    table.tableStyleInfo = style
-    ws.add_table(table)
-
-    # Write the job lines
-
-    ws = wb.create_sheet(title="Mano de Obra")
-
-    ws.append(
-        [
-            "Linea fichero original",
-            "Numero OT",
-            "Operacion Id",
-            "Operacion",
-            "Fecha",
-            "Operario Id",
-            "Operario Nombre",
-            "Cantidad",
-            "Precio Coste",
-            "Importe Coste",
-            "Dietas Coste",
-            "Desplazamiento Coste",
-            "Precio Venta",
-            "Importe Venta",
-            "Dietas Venta",
-            "Desplazamiento Venta",
-        ]
-    )
 
-    for job_line in job_lines:
-        ws.append(
-            [
-                job_line.line_number + 1,
+def convierte_y_muestra(
+    filename_cost: str,
+    filename_sell: str,
+    numero_ot: str,
+    errors: bool,
+    verbose: bool,
+    carpeta_salida: str = ".",
+    conserva_filas: bool = False,
+    escribe_fichero: bool = True,
+    formato: str = "xlsx",
+) -> tuple[
+    bool,
+    dict[str, dict],
+    dict,
+    tuple[AlmacenColumnas, AlmacenColumnas, ResumenCostes] | None,
+]:
+
+    # Ejecuta ParseFile mostrando lo que imprime segun se convierte el proyecto.
+    # Devuelve si el proyecto se ha convertido sin errores, los tiempos de cada etapa,
+    # el resultado de la conversion para el informe de "todos" y, con conserva_filas, las filas de
+    # materiales y de mano de obra y sus totales (None si no se ha podido convertir).
+
+    procesado = False
+    estadisticas = EstadisticasConversion()
+    error = None
+    filas = None
+
+    inicio = time.perf_counter()
+
+    with recoge() as tiempos:
+        print(f"Procesando proyecto {numero_ot}...")
+        try:
+            materiales, mano_obra = ParseFile(
+                filename_cost,
+                filename_sell,
                 numero_ot,
-                job_line.OperacionId,
-                job_line.Operacion,
-                job_line.Fecha,
-                job_line.OperarioId,
-                job_line.OperarioNombre,
-                job_line.Cantidad,
-                job_line.PrecioUnitarioCoste,
-                job_line.ImporteTotalCoste,
-                job_line.DietasCoste,
-                job_line.DesplazamientoCoste,
-                job_line.PrecioUnitarioVenta,
-                job_line.ImporteTotalVenta,
-                job_line.DietasVenta,
-                job_line.DesplazamientoVenta,
-            ]
-        )
+                errors,
+                verbose,
+                conserva_filas=conserva_filas,
+                carpeta_salida=carpeta_salida,
+                estadisticas=estadisticas,
+                escribe_fichero=escribe_fichero,
+                formato=formato,
+            )
+            print(f"Proyecto {numero_ot} procesado.")
+            procesado = True
+            if conserva_filas:
+                filas = (materiales, mano_obra, estadisticas.resumen)
+        except Exception as e:
+            print(f"Error procesando proyecto {numero_ot}: {e}")
+            error = str(e)
 
-    ws.column_dimensions["A"].width = 19
-    ws.column_dimensions["B"].width = 12
-    ws.column_dimensions["C"].width = 14
-    ws.column_dimensions["D"].width = 30
-    ws.column_dimensions["E"].width = 12
-    ws.column_dimensions["F"].width = 12
-    ws.column_dimensions["G"].width = 30
-    ws.column_dimensions["H"].width = 14
-    ws.column_dimensions["I"].width = 14
-    ws.column_dimensions["J"].width = 14
-    ws.column_dimensions["K"].width = 14
-    ws.column_dimensions["L"].width = 14
-    ws.column_dimensions["M"].width = 14
-    ws.column_dimensions["N"].width = 14
-    ws.column_dimensions["O"].width = 14
-    ws.column_dimensions["P"].width = 14
-
-    ws.row_dimensions[1].height = 36
-    ws.row_dimensions[1].alignment = Alignment(wrap_text=True)
-
-    # Iterate over all cells in columns H to N and set the number format
-
-    for cell in (
-        ws["H"]
-        + ws["I"]
-        + ws["J"]
-        + ws["K"]
-        + ws["L"]
-        + ws["M"]
-        + ws["N"]
-        + ws["O"]
-        + ws["P"]
-    ):
-        cell.number_format = number_format
-
-    for cell in ws["E"]:
-        cell.number_format = "dd/mm/yyyy"
-
-    table = Table(
-        displayName="mano_obra",
-        ref="A1:" + get_column_letter(ws.max_column) + str(ws.max_row),
-    )
+    resultado = estadisticas.como_dict()
+    resultado["segundos"] = round(time.perf_counter() - inicio, 6)
+    resultado["error"] = error
+
+    return procesado, tiempos.como_dict(), resultado, filas
 
-    ws.add_table(table)
 
-    wb.save(filename)
+def convierte_proyecto(
+    filename_cost: str,
+    filename_sell: str,
+    numero_ot: str,
+    errors: bool,
+    verbose: bool,
+    carpeta_salida: str = ".",
+    conserva_filas: bool = False,
+    escribe_fichero: bool = True,
+    formato: str = "xlsx",
+) -> tuple[
+    str,
+    bool,
+    dict[str, dict],
+    dict,
+    tuple[AlmacenColumnas, AlmacenColumnas, ResumenCostes] | None,
+]:
+
+    # Como convierte_y_muestra, pero guardando todo lo que imprime, para poder lanzarlo en otro proceso
+    # y mostrar despues la salida de cada proyecto junta y en orden. Devuelve tambien la salida, delante.
+
+    salida = io.StringIO()
+    with redirect_stdout(salida):
+        procesado, tiempos, resultado, filas = convierte_y_muestra(
+            filename_cost,
+            filename_sell,
+            numero_ot,
+            errors,
+            verbose,
+            carpeta_salida=carpeta_salida,
+            conserva_filas=conserva_filas,
+            escribe_fichero=escribe_fichero,
+            formato=formato,
+        )
+
+    return salida.getvalue(), procesado, tiempos, resultado, filas
@@ -0,0 +1,70 @@
+import os
+
+
+# Busqueda de los ficheros de coste y venta de cada proyecto en una carpeta.
+# No importa nada de la conversion, para que los comandos puedan listar los proyectos antes de cargarla.
+
+
+def ruta_en_carpeta(carpeta: str, filename: str) -> str:
+
+    # Ruta del fichero dentro de la carpeta. En la carpeta actual se deja solo el nombre,
+    # y un fichero que no se usa ("") sigue siendo "".
+
+    if carpeta == "." or filename == "":
+        return filename
+    return os.path.join(carpeta, filename)
+
+
+class FicherosProyecto:
+    def __init__(self, carpeta: str, archivo_venta: str, archivo_coste: str) -> None:
+        if len(archivo_venta) > 6:
+            self.proyecto = archivo_venta[:6]
+        elif len(archivo_coste) > 6:
+            self.proyecto = archivo_coste[:6]
+        else:
+            self.proyecto = ""
+
+        self.archivo_venta = ruta_en_carpeta(carpeta, archivo_venta)
+        self.archivo_coste = ruta_en_carpeta(carpeta, archivo_coste)
+
+
+def _es_informe(fichero: str, tipo: str) -> bool:
+
+    # Ficheros con el formato "xxxxxxventa.txt" o "xxxxxxcoste.txt", donde x son dígitos
+
+    return (
+        len(fichero) == 15
+        and fichero.endswith(".txt")
+        and fichero[:6].isdigit()
+        and fichero[6:11] == tipo
+    )
+
+
+def es_informe(fichero: str) -> bool:
+    return _es_informe(fichero, "coste") or _es_informe(fichero, "venta")
+
+
+def busca_proyectos(carpeta: str, ficheros: list[str]) -> dict[str, FicherosProyecto]:
+
+    # Proyectos con sus ficheros de coste y venta, a partir de la lista de ficheros de la carpeta.
+    # A un proyecto le puede faltar uno de los dos ficheros, que queda como "".
+
+    archivos_a_procesar: dict[str, FicherosProyecto] = {}
+
+    for fichero in ficheros:
+        if _es_informe(fichero, "venta"):
+            proyecto = FicherosProyecto(carpeta, fichero, "")
+            archivos_a_procesar[proyecto.proyecto] = proyecto
+
+    for fichero in ficheros:
+        if _es_informe(fichero, "coste"):
+            proyecto_id = fichero[:6]
+            if proyecto_id in archivos_a_procesar:
+                archivos_a_procesar[proyecto_id].archivo_coste = ruta_en_carpeta(
+                    carpeta, fichero
+                )
+            else:
+                proyecto = FicherosProyecto(carpeta, "", fichero)
+                archivos_a_procesar[proyecto.proyecto] = proyecto
+
+    return archivos_a_procesar
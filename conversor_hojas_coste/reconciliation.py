@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Any
+
+from line_classifier import PAGINA_RE
+
+
+# Conciliacion de los ficheros de coste y venta de un informe.
+#
+# Los dos ficheros son el mismo informe valorado a coste y a venta, asi que deben tener las mismas lineas,
+# los saltos de pagina en las mismas lineas y, en cada fila, los mismos campos comunes (referencia, descripcion,
+# fecha y cantidad en materiales; operacion, fecha, operario y cantidad en mano de obra).
+#
+# Las filas se comparan por lotes en batch_parse; aqui se reunen sus incongruencias y se comprueba la estructura
+# de los dos ficheros, para mostrarlo todo junto al final de la conversion en lugar de linea a linea.
+# La estructura va primero: si a un fichero le sobran o le faltan lineas, las incongruencias de las filas
+# que siguen son consecuencia de ello.
+
+# Incongruencias que se guardan con detalle en el informe JSON; del resto solo queda la cuenta
+
+LIMITE_DETALLE = 1000
+
+
+class Conciliacion:
+    """Diferencias de estructura y de campos comunes entre los ficheros de coste y venta de un informe."""
+
+    def __init__(self):
+        self.lineas_coste = 0
+        self.lineas_venta = 0
+        self.paginas = 0
+
+        # Lineas (desde 0) de los saltos de pagina del coste que no estan igual en la venta
+
+        self.paginas_distintas: list[int] = []
+        self.primera_pagina_distinta = ""
+
+        self.incongruencias: list[tuple[str, Any]] = []
+
+    def comprueba_paginas(
+        self, guias: list[str], ventas: list[str], primera: int, desde: int, hasta: int
+    ) -> None:
+
+        # Segmento de cabecera de pagina de la linea guia (coste): la linea "Pág. N" tiene que estar
+        # en la misma linea de la venta. El resto de la cabecera puede cambiar entre coste y venta.
+
+        for i in range(desde, hasta):
+            if PAGINA_RE.match(guias[i]):
+                self.paginas += 1
+                if ventas[i] != guias[i]:
+                    if not self.paginas_distintas:
+                        self.primera_pagina_distinta = (
+                            f"coste '{guias[i].strip()}' vs venta '{ventas[i].strip()}'"
+                        )
+                    self.paginas_distintas.append(primera + i)
+
+    def comprueba_lineas(self, lineas_coste: int, lineas_venta: int) -> None:
+        self.lineas_coste = lineas_coste
+        self.lineas_venta = lineas_venta
+
+    def anade(self, seccion: str, error: Any) -> None:
+
+        # error: IncongruentError de MaterialLine o JobLine, con el campo y los valores de coste y venta
+
+        self.incongruencias.append((seccion, error))
+
+    def estructura(self) -> list[str]:
+        mensajes = []
+        if self.lineas_coste != self.lineas_venta:
+            mensajes.append(
+                f"El fichero de coste tiene {self.lineas_coste} líneas y el de venta {self.lineas_venta}."
+            )
+        if self.paginas_distintas:
+            mensajes.append(
+                f"{len(self.paginas_distintas)} de {self.paginas} saltos de página del coste no están en la misma línea de la venta, "
+                f"el primero en la línea {self.paginas_distintas[0] + 1}: {self.primera_pagina_distinta}"
+            )
+        return mensajes
+
+    def muestra(self) -> None:
+        estructura = self.estructura()
+        if not estructura and not self.incongruencias:
+            return
+
+        print(
+            f"Conciliación de coste y venta: {len(estructura)} diferencias de estructura, "
+            f"{len(self.incongruencias)} incongruencias"
+        )
+        for mensaje in estructura:
+            print(mensaje)
+        for _, error in self.incongruencias:
+            print(error)
+
+    def como_dict(self) -> dict:
+        return {
+            "estructura": self.estructura(),
+            "incongruencias": [
+                {
+                    "seccion": seccion,
+                    "linea": error.numero_linea + 1,
+                    "campo": error.campo,
+                    "coste": error.coste,
+                    "venta": error.venta,
+                }
+                for seccion, error in self.incongruencias[:LIMITE_DETALLE]
+            ],
+        }
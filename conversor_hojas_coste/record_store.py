@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from array import array
+from typing import Any, Iterator
+import datetime
+
+from batch_parse import FormatoSeccion
+
+
+# Almacen por columnas de las lineas parseadas de una seccion.
+#
+# En lugar de un objeto MaterialLine / JobLine por linea, con todos sus atributos y los textos originales de cada
+# campo, se guarda una columna por campo:
+# - Los numeros en arrays de doubles (8 bytes por valor).
+# - Las fechas como su ordinal en un array de enteros (4 bytes por valor).
+# - Los textos internados por columna: cada texto distinto se guarda una sola vez y cada fila guarda su codigo
+#   en un array de enteros (4 bytes por valor). Las referencias, descripciones, operaciones y operarios
+#   se repiten mucho, asi que hay muchos menos textos distintos que filas.
+
+
+class ColumnaTexto:
+    """Columna de textos internados: los textos distintos en una lista y un codigo por fila."""
+
+    def __init__(self):
+        self.valores: list[str] = []
+        self.codigos_por_valor: dict[str, int] = {}
+        self.codigos = array("i")
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    def extend(self, textos: list[str]) -> None:
+        for texto in set(textos).difference(self.codigos_por_valor):
+            self.codigos_por_valor[texto] = len(self.valores)
+            self.valores.append(texto)
+        self.codigos.extend(map(self.codigos_por_valor.__getitem__, textos))
+
+    def __getitem__(self, indice: int) -> str:
+        return self.valores[self.codigos[indice]]
+
+    def clear(self) -> None:
+        self.valores.clear()
+        self.codigos_por_valor.clear()
+        del self.codigos[:]
+
+    def desde(self, inicio: int) -> list[str]:
+        return list(map(self.valores.__getitem__, self.codigos[inicio:]))
+
+
+class FilaVista:
+    """Vista de una fila del almacen con los mismos atributos que MaterialLine / JobLine, sin los textos *Str."""
+
+    __slots__ = ("_almacen", "_indice")
+
+    def __init__(self, almacen: AlmacenColumnas, indice: int):
+        self._almacen = almacen
+        self._indice = indice
+
+    def __getattr__(self, nombre: str) -> Any:
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return self._almacen.valor(nombre, self._indice)
+
+    def __str__(self) -> str:
+        return " | ".join(
+            str(self._almacen.valor(nombre, self._indice))
+            for nombre in self._almacen.columnas[1:]
+        )
+
+
+class AlmacenColumnas:
+    """Filas parseadas de una seccion, guardadas por columnas.
+
+    Se llena con las columnas devueltas por MaterialLine.parse_batch / JobLine.parse_batch.
+    """
+
+    def __init__(self, formato: FormatoSeccion):
+        self.columnas = formato.columnas
+        self.line_number = array("i")
+        self.fechas = array("i")
+        self.textos: dict[str, ColumnaTexto] = {
+            nombre: ColumnaTexto() for nombre, _, _ in formato.textos
+        }
+        self.numeros: dict[str, array] = {
+            nombre: array("d") for nombre in formato.numericas
+        }
+
+    def __len__(self) -> int:
+        return len(self.line_number)
+
+    def __getitem__(self, indice: int) -> FilaVista:
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        return FilaVista(self, indice)
+
+    def __iter__(self) -> Iterator[FilaVista]:
+        for indice in range(len(self)):
+            yield FilaVista(self, indice)
+
+    def extend(self, columnas: dict[str, list[Any]]) -> int:
+
+        # Añade las filas de un lote y devuelve el indice de la primera fila añadida
+
+        inicio = len(self)
+
+        self.line_number.extend(columnas["line_number"])
+        self.fechas.extend(map(datetime.date.toordinal, columnas["Fecha"]))
+        for nombre, valores in self.textos.items():
+            valores.extend(columnas[nombre])
+        for nombre, valores in self.numeros.items():
+            valores.extend(columnas[nombre])
+
+        return inicio
+
+    def clear(self) -> None:
+        del self.line_number[:]
+        del self.fechas[:]
+        for textos in self.textos.values():
+            textos.clear()
+        for numeros in self.numeros.values():
+            del numeros[:]
+
+    def columna(self, nombre: str, desde: int = 0) -> Any:
+
+        # Valores de una columna a partir de la fila "desde", con las fechas ya convertidas a datetime.date
+
+        if nombre == "line_number":
+            return self.line_number[desde:]
+        if nombre == "Fecha":
+            return list(map(datetime.date.fromordinal, self.fechas[desde:]))
+        if nombre in self.textos:
+            return self.textos[nombre].desde(desde)
+        if nombre in self.numeros:
+            return self.numeros[nombre][desde:]
+        raise KeyError(nombre)
+
+    def valor(self, nombre: str, indice: int) -> Any:
+        if nombre == "line_number":
+            return self.line_number[indice]
+        if nombre == "Fecha":
+            return datetime.date.fromordinal(self.fechas[indice])
+        if nombre in self.textos:
+            return self.textos[nombre][indice]
+        if nombre in self.numeros:
+            return self.numeros[nombre][indice]
+        raise AttributeError(nombre)
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from typing import BinaryIO, Iterator
+import codecs
+import io
+
+from stage_timing import cuenta, etapa
+
+
+# Lectura incremental de los ficheros de coste y venta (UTF-16LE).
+#
+# En lugar de cargar los dos ficheros enteros con readlines(), se leen a la vez, por partes, y se entregan
+# en bloques de lineas alineadas (guia, coste, venta). El fichero se decodifica por partes segun se avanza,
+# asi que la memoria no depende de la longitud del informe.
+#
+# La linea guia es la de coste si hay fichero de coste y si no la de venta, igual que en ParseFile.
+# Si el otro fichero es mas corto que la guia, sus lineas que faltan se entregan vacias.
+#
+# Cada fichero se abre en binario y se decodifica con un decodificador incremental en trozos de
+# TAMANO_DECODIFICACION bytes, en lugar de los 8 KiB de un fichero de texto. Las lineas de cada trozo se separan
+# de una vez con un StringIO, igual que las separa un fichero de texto (los saltos "\r\n" y "\r" pasan a ser "\n"),
+# y se entregan de muchas en muchas, cortando la lista, en lugar de una a una. Casi todo el tiempo de lectura
+# es crear el str de cada linea; con mmap y separando las lineas por nuestra cuenta se crean los mismos str
+# y resulta mas lento.
+
+TAMANO_DECODIFICACION = 256 * 1024
+
+
+class _LineasUtf16:
+    """Lineas de un fichero UTF-16LE, con su "\\n" final, decodificado por trozos segun se piden."""
+
+    def __init__(self, fichero: BinaryIO | None):
+        self._fichero = fichero
+        self._decoder = codecs.getincrementaldecoder("utf-16-le")()
+
+        # Lineas decodificadas aun no entregadas (desde _posicion) y el principio de la siguiente linea
+
+        self._lineas: list[str] = []
+        self._posicion = 0
+        self._resto = ""
+
+    def _trozo(self) -> bool:
+
+        # Decodifica el siguiente trozo y guarda sus lineas completas. Devuelve False si ya no quedan trozos.
+
+        if self._fichero is None:
+            return False
+
+        bloque = self._fichero.read(TAMANO_DECODIFICACION)
+        texto = self._resto + self._decoder.decode(bloque, final=not bloque)
+        self._resto = ""
+
+        if not bloque:
+            self._fichero = None
+        elif texto.endswith("\r"):
+            # Puede ser el principio de un "\r\n"
+            texto, self._resto = texto[:-1], "\r"
+
+        lineas = io.StringIO(texto, newline=None).readlines()
+        if self._fichero is not None and lineas and not lineas[-1].endswith("\n"):
+            self._resto = lineas.pop() + self._resto
+
+        del self._lineas[: self._posicion]
+        self._posicion = 0
+        self._lineas.extend(lineas)
+        return True
+
+    def tiene_lineas(self) -> bool:
+        while self._posicion == len(self._lineas):
+            if not self._trozo():
+                return False
+        return True
+
+    def lee(self, cuantas: int) -> list[str]:
+        while len(self._lineas) - self._posicion < cuantas and self._trozo():
+            pass
+
+        lineas = self._lineas[self._posicion : self._posicion + cuantas]
+        self._posicion += len(lineas)
+        return lineas
+
+    def cuenta_resto(self) -> int:
+
+        # Numero de lineas que quedan, sin guardarlas
+
+        quedan = len(self._lineas) - self._posicion
+        self._posicion = len(self._lineas)
+        while self._trozo():
+            quedan += len(self._lineas)
+            self._posicion = len(self._lineas)
+        return quedan
+
+
+class LectorInforme:
+    """Lee a la vez los ficheros de coste y de venta de un informe sin cargarlos en memoria."""
+
+    def __init__(self, filename_cost: str, filename_sell: str):
+        self._ficheros: list[BinaryIO] = []
+
+        self._coste = self._abre(filename_cost)
+        self._venta = self._abre(filename_sell)
+
+        # Se decodifica el principio de cada fichero para saber si tiene lineas
+
+        self.use_cost = self._coste.tiene_lineas()
+        self.use_sell = self._venta.tiene_lineas()
+
+        # Lineas leidas por adelantado (por ejemplo, las de la cabecera) y aun no entregadas en un bloque
+
+        self._guias: list[str] = []
+        self._costes: list[str] = []
+        self._ventas: list[str] = []
+        self._entregadas = 0
+
+        self.lineas_leidas = 0
+
+        # Lineas leidas de cada fichero, sin contar las vacias que se entregan por el que es mas corto
+
+        self.lineas_coste = 0
+        self.lineas_venta = 0
+
+    def __enter__(self) -> LectorInforme:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for fichero in self._ficheros:
+            fichero.close()
+        self._ficheros.clear()
+
+    def _abre(self, filename: str) -> _LineasUtf16:
+        if filename == "":
+            return _LineasUtf16(None)
+        fichero = open(filename, "rb")
+        self._ficheros.append(fichero)
+        return _LineasUtf16(fichero)
+
+    def _lee(self, cuantas: int) -> bool:
+
+        # Lee hasta "cuantas" lineas mas; devuelve False si ya no quedan
+
+        with etapa("lectura"):
+            if self.use_cost:
+                costes = self._coste.lee(cuantas)
+                ventas = self._venta.lee(len(costes))
+                self.lineas_coste += len(costes)
+                self.lineas_venta += len(ventas)
+                ventas.extend([""] * (len(costes) - len(ventas)))
+                guias = costes
+            else:
+                ventas = self._venta.lee(cuantas)
+                self.lineas_venta += len(ventas)
+                costes = [""] * len(ventas)
+                guias = ventas
+
+            self._guias.extend(guias)
+            self._costes.extend(costes)
+            self._ventas.extend(ventas)
+
+        leidas = len(guias)
+
+        cuenta("lectura", leidas)
+        self.lineas_leidas += leidas
+        return leidas > 0
+
+    def lee_resto(self) -> None:
+
+        # Cuenta las lineas que quedan de cada fichero sin guardarlas, para comparar la longitud de los dos
+
+        with etapa("lectura"):
+            self.lineas_coste += self._coste.cuenta_resto()
+            self.lineas_venta += self._venta.cuenta_resto()
+
+    def linea_guia(self, numero_linea: int) -> str:
+
+        # Linea guia numero_linea (desde 0), leyendo solo hasta ella. Devuelve "" si el fichero es mas corto.
+        # Solo se pueden pedir lineas que aun no se han entregado en un bloque.
+
+        indice = numero_linea - self._entregadas
+        if indice < 0:
+            raise IndexError(
+                f"La línea {numero_linea} ya se ha entregado en un bloque"
+            )
+        if indice >= len(self._guias):
+            self._lee(indice + 1 - len(self._guias))
+        return self._guias[indice] if indice < len(self._guias) else ""
+
+    def bloques(
+        self, tamano: int
+    ) -> Iterator[tuple[int, list[str], list[str], list[str]]]:
+
+        # Devuelve (primera, guias, costes, ventas) con hasta "tamano" lineas alineadas de cada fichero,
+        # donde primera es el numero de linea de la primera linea del bloque
+
+        while len(self._guias) > 0 or self._lee(tamano):
+            if len(self._guias) < tamano:
+                self._lee(tamano - len(self._guias))
+
+            primera = self._entregadas
+            guias, costes, ventas = self._guias, self._costes, self._ventas
+            self._guias, self._costes, self._ventas = [], [], []
+            self._entregadas += len(guias)
+
+            yield primera, guias, costes, ventas
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Iterator
+import cProfile
+import json
+import time
+
+
+# Tiempos de cada etapa de la conversion: lectura y decodificacion de los ficheros, clasificacion de las lineas,
+# parseo, comprobacion de congruencia entre coste y venta, escritura de las filas en el workbook y guardado.
+#
+# El codigo de la conversion marca sus etapas con etapa("nombre") y cuenta("nombre", n). Solo se mide algo
+# dentro de un bloque recoge(); fuera de el las dos funciones no hacen nada, asi que se pueden dejar siempre.
+# Las etapas se pueden anidar: el tiempo de una etapa no incluye el de las etapas que tiene dentro,
+# de modo que la suma de todas es el tiempo total medido.
+
+_actual: TiemposEtapas | None = None
+
+
+class TiemposEtapas:
+    """Segundos y numero de elementos (lineas, filas, ficheros) de cada etapa."""
+
+    def __init__(self):
+        self.segundos: dict[str, float] = {}
+        self.cantidades: dict[str, int] = {}
+
+        # Tiempo de las etapas hijas de cada etapa abierta, para descontarlo de la etapa padre
+
+        self._hijas: list[float] = []
+
+    @contextmanager
+    def etapa(self, nombre: str, cantidad: int = 0) -> Iterator[None]:
+        self._hijas.append(0.0)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            hijas = self._hijas.pop()
+            if self._hijas:
+                self._hijas[-1] += segundos
+            self.segundos[nombre] = self.segundos.get(nombre, 0.0) + segundos - hijas
+            self.cuenta(nombre, cantidad)
+
+    def cuenta(self, nombre: str, cantidad: int) -> None:
+        self.cantidades[nombre] = self.cantidades.get(nombre, 0) + cantidad
+
+    def anade(self, otros: TiemposEtapas | dict) -> None:
+
+        # Suma los tiempos de otra medida, o de su como_dict() si viene de otro proceso
+
+        if isinstance(otros, TiemposEtapas):
+            otros = otros.como_dict()
+        for nombre, medida in otros.items():
+            self.segundos[nombre] = self.segundos.get(nombre, 0.0) + medida["segundos"]
+            self.cuenta(nombre, medida["cantidad"])
+
+    def total(self) -> float:
+        return sum(self.segundos.values())
+
+    def como_dict(self) -> dict[str, dict]:
+        return {
+            nombre: {
+                "segundos": round(segundos, 6),
+                "cantidad": self.cantidades.get(nombre, 0),
+            }
+            for nombre, segundos in self.segundos.items()
+        }
+
+    def muestra(self, titulo: str) -> None:
+        total = self.total()
+        print(titulo)
+        print(f"  {'etapa':<14} {'segundos':>9} {'%':>6} {'cantidad':>10} {'por segundo':>12}")
+        for nombre, segundos in sorted(
+            self.segundos.items(), key=lambda medida: -medida[1]
+        ):
+            cantidad = self.cantidades.get(nombre, 0)
+            porcentaje = 100 * segundos / total if total > 0 else 0.0
+            por_segundo = f"{cantidad / segundos:,.0f}" if cantidad and segundos > 0 else ""
+            print(
+                f"  {nombre:<14} {segundos:>9.3f} {porcentaje:>5.1f}% {cantidad:>10} {por_segundo:>12}"
+            )
+        print(f"  {'total':<14} {total:>9.3f}")
+
+
+@contextmanager
+def recoge() -> Iterator[TiemposEtapas]:
+
+    # Mide las etapas del codigo que se ejecuta dentro del bloque
+
+    global _actual
+
+    anterior = _actual
+    _actual = TiemposEtapas()
+    try:
+        yield _actual
+    finally:
+        _actual = anterior
+
+
+def etapa(nombre: str, cantidad: int = 0) -> ContextManager[None]:
+    if _actual is None:
+        return nullcontext()
+    return _actual.etapa(nombre, cantidad)
+
+
+def cuenta(nombre: str, cantidad: int) -> None:
+    if _actual is not None:
+        _actual.cuenta(nombre, cantidad)
+
+
+def guarda_json(
+    filename: str,
+    comando: str,
+    segundos: float,
+    total: TiemposEtapas,
+    por_elemento: dict[str, TiemposEtapas | dict] | None = None,
+) -> None:
+
+    # por_elemento: tiempos de cada proyecto o fichero, por su nombre
+
+    datos = {
+        "comando": comando,
+        "segundos": round(segundos, 6),
+        "etapas": total.como_dict(),
+    }
+    if por_elemento is not None:
+        datos["por_elemento"] = {
+            nombre: tiempos.como_dict() if isinstance(tiempos, TiemposEtapas) else tiempos
+            for nombre, tiempos in por_elemento.items()
+        }
+
+    with open(filename, "w", encoding="utf-8") as file:
+        json.dump(datos, file, indent=2)
+
+    print(f"Tiempos guardados en: {filename}")
+
+
+@contextmanager
+def perfil(filename: str | None) -> Iterator[None]:
+
+    # Si se da un fichero, ejecuta el bloque con cProfile y guarda el resultado (se puede ver con python -m pstats)
+
+    if filename is None:
+        yield
+        return
+
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    try:
+        yield
+    finally:
+        perfilador.disable()
+        perfilador.dump_stats(filename)
+        print(f"Perfil guardado en: {filename}")
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+from typing import Any, Sequence
+import datetime
+
+from record_store import AlmacenColumnas
+
+
+# Totales de coste y venta para las hojas "Resumen" de los xlsx (por OT, por mes, por operario y por referencia).
+#
+# Se acumulan segun pasan las filas, al parsear (desde las columnas del almacen) o al juntar (fila a fila),
+# para que nadie tenga que montar tablas dinamicas sobre OT_juntadas.xlsx para ver los totales.
+#
+# Los totales de varios ficheros se obtienen sumando, en orden, los de cada fichero: asi el fichero juntado
+# tiene exactamente los mismos totales si se junta todo de nuevo, de forma incremental o con "todo-en-uno".
+# Para el juntar incremental, los totales de cada fichero se guardan en el manifiesto (como_dict / de_dict).
+
+# Posiciones de los acumulados por OT y por mes
+
+MATERIALES_COSTE = 0
+MATERIALES_VENTA = 1
+MANO_OBRA_COSTE = 2
+MANO_OBRA_VENTA = 3
+HORAS = 4
+
+# Posiciones de los acumulados por operario (horas, coste, venta) y por referencia (cantidad, coste, venta)
+
+CANTIDAD = 0
+COSTE = 1
+VENTA = 2
+
+
+def _mes(fecha: datetime.date) -> str:
+    return f"{fecha.year:04d}-{fecha.month:02d}"
+
+
+def _texto(valor: Any) -> str:
+
+    # Los textos vacios se leen de un xlsx como celdas vacias
+
+    return "" if valor is None else valor
+
+
+class ResumenCostes:
+    """Importes de coste y venta y horas acumulados por OT, mes, operario y referencia."""
+
+    def __init__(self):
+        self.por_ot: dict[str, list[float]] = {}
+        self.por_mes: dict[str, list[float]] = {}
+        self.por_operario: dict[tuple[str, str], list[float]] = {}
+
+        # Por referencia se guarda la primera descripcion que aparece
+
+        self.por_referencia: dict[str, list[float]] = {}
+        self.descripciones: dict[str, str] = {}
+
+        # Mes de cada fecha (como ordinal), que se repiten mucho
+
+        self._meses: dict[int, str] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.por_ot)
+
+    def _acumulado(self, tabla: dict, clave: Any, campos: int) -> list[float]:
+        acumulado = tabla.get(clave)
+        if acumulado is None:
+            acumulado = tabla[clave] = [0.0] * campos
+        return acumulado
+
+    def _meses_de(self, ordinales: Sequence[int]) -> list[str]:
+        meses = self._meses
+        for ordinal in set(ordinales).difference(meses):
+            meses[ordinal] = _mes(datetime.date.fromordinal(ordinal))
+        return list(map(meses.__getitem__, ordinales))
+
+    def anade_materiales(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+
+        # Filas de materiales del almacen a partir de la fila "desde", columna a columna
+
+        referencias = almacen.columna("Referencia", desde)
+        if len(referencias) == 0:
+            return
+        descripciones = almacen.columna("Descripcion", desde)
+        cantidades = almacen.columna("Cantidad", desde)
+        costes = almacen.columna("ImporteTotalCoste", desde)
+        ventas = almacen.columna("ImporteTotalVenta", desde)
+
+        acumulado = self._acumulado(self.por_ot, numero_ot, 5)
+        for coste, venta in zip(costes, ventas):
+            acumulado[MATERIALES_COSTE] += coste
+            acumulado[MATERIALES_VENTA] += venta
+
+        por_mes = self.por_mes
+        for mes, coste, venta in zip(self._meses_de(almacen.fechas[desde:]), costes, ventas):
+            acumulado = por_mes.get(mes) or self._acumulado(por_mes, mes, 5)
+            acumulado[MATERIALES_COSTE] += coste
+            acumulado[MATERIALES_VENTA] += venta
+
+        por_referencia = self.por_referencia
+        for referencia, descripcion, cantidad, coste, venta in zip(
+            referencias, descripciones, cantidades, costes, ventas
+        ):
+            acumulado = por_referencia.get(referencia)
+            if acumulado is None:
+                acumulado = por_referencia[referencia] = [0.0, 0.0, 0.0]
+                self.descripciones[referencia] = descripcion
+            acumulado[CANTIDAD] += cantidad
+            acumulado[COSTE] += coste
+            acumulado[VENTA] += venta
+
+    def anade_mano_obra(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+
+        # Filas de mano de obra del almacen a partir de la fila "desde", columna a columna
+
+        operarios = almacen.columna("OperarioId", desde)
+        if len(operarios) == 0:
+            return
+        nombres = almacen.columna("OperarioNombre", desde)
+        horas = almacen.columna("Cantidad", desde)
+        costes = almacen.columna("ImporteTotalCoste", desde)
+        ventas = almacen.columna("ImporteTotalVenta", desde)
+
+        acumulado = self._acumulado(self.por_ot, numero_ot, 5)
+        for cantidad, coste, venta in zip(horas, costes, ventas):
+            acumulado[MANO_OBRA_COSTE] += coste
+            acumulado[MANO_OBRA_VENTA] += venta
+            acumulado[HORAS] += cantidad
+
+        por_mes = self.por_mes
+        for mes, cantidad, coste, venta in zip(
+            self._meses_de(almacen.fechas[desde:]), horas, costes, ventas
+        ):
+            acumulado = por_mes.get(mes) or self._acumulado(por_mes, mes, 5)
+            acumulado[MANO_OBRA_COSTE] += coste
+            acumulado[MANO_OBRA_VENTA] += venta
+            acumulado[HORAS] += cantidad
+
+        por_operario = self.por_operario
+        for operario, cantidad, coste, venta in zip(
+            zip(operarios, nombres), horas, costes, ventas
+        ):
+            acumulado = por_operario.get(operario) or self._acumulado(
+                por_operario, operario, 3
+            )
+            acumulado[CANTIDAD] += cantidad
+            acumulado[COSTE] += coste
+            acumulado[VENTA] += venta
+
+    def anade_fila_material(self, fila: Sequence[Any]) -> None:
+
+        # Fila de la hoja de materiales (ver COLUMNAS_MATERIALES), por ejemplo leida de un fichero OT
+
+        _, numero_ot, referencia, descripcion, fecha, cantidad, _, coste, _, venta = fila[:10]
+        referencia = _texto(referencia)
+
+        acumulado = self._acumulado(self.por_ot, _texto(numero_ot), 5)
+        acumulado[MATERIALES_COSTE] += coste
+        acumulado[MATERIALES_VENTA] += venta
+
+        acumulado = self._acumulado(self.por_mes, _mes(fecha), 5)
+        acumulado[MATERIALES_COSTE] += coste
+        acumulado[MATERIALES_VENTA] += venta
+
+        acumulado = self.por_referencia.get(referencia)
+        if acumulado is None:
+            acumulado = self.por_referencia[referencia] = [0.0, 0.0, 0.0]
+            self.descripciones[referencia] = _texto(descripcion)
+        acumulado[CANTIDAD] += cantidad
+        acumulado[COSTE] += coste
+        acumulado[VENTA] += venta
+
+    def anade_fila_mano_obra(self, fila: Sequence[Any]) -> None:
+
+        # Fila de la hoja de mano de obra (ver COLUMNAS_MANO_OBRA), por ejemplo leida de un fichero OT
+
+        numero_ot, fecha, operario_id, operario_nombre, cantidad = fila[1], *fila[4:8]
+        coste, venta = fila[9], fila[13]
+
+        acumulado = self._acumulado(self.por_ot, _texto(numero_ot), 5)
+        acumulado[MANO_OBRA_COSTE] += coste
+        acumulado[MANO_OBRA_VENTA] += venta
+        acumulado[HORAS] += cantidad
+
+        acumulado = self._acumulado(self.por_mes, _mes(fecha), 5)
+        acumulado[MANO_OBRA_COSTE] += coste
+        acumulado[MANO_OBRA_VENTA] += venta
+        acumulado[HORAS] += cantidad
+
+        acumulado = self._acumulado(
+            self.por_operario, (_texto(operario_id), _texto(operario_nombre)), 3
+        )
+        acumulado[CANTIDAD] += cantidad
+        acumulado[COSTE] += coste
+        acumulado[VENTA] += venta
+
+    def junta(self, otro: ResumenCostes) -> None:
+
+        # Suma los totales de otro resumen, por ejemplo los de un fichero al fichero juntado
+
+        for tabla, tabla_otro in (
+            (self.por_ot, otro.por_ot),
+            (self.por_mes, otro.por_mes),
+            (self.por_operario, otro.por_operario),
+            (self.por_referencia, otro.por_referencia),
+        ):
+            for clave, valores in tabla_otro.items():
+                acumulado = self._acumulado(tabla, clave, len(valores))
+                for i, valor in enumerate(valores):
+                    acumulado[i] += valor
+
+        for referencia, descripcion in otro.descripciones.items():
+            self.descripciones.setdefault(referencia, descripcion)
+
+    def como_dict(self) -> dict:
+        return {
+            "ot": self.por_ot,
+            "mes": self.por_mes,
+            "operario": [
+                [operario_id, nombre, *valores]
+                for (operario_id, nombre), valores in self.por_operario.items()
+            ],
+            "referencia": [
+                [referencia, self.descripciones[referencia], *valores]
+                for referencia, valores in self.por_referencia.items()
+            ],
+        }
+
+    @classmethod
+    def de_dict(cls, datos: dict) -> ResumenCostes:
+        resumen = cls()
+        resumen.por_ot = {clave: list(valores) for clave, valores in datos["ot"].items()}
+        resumen.por_mes = {clave: list(valores) for clave, valores in datos["mes"].items()}
+        for operario_id, nombre, *valores in datos["operario"]:
+            resumen.por_operario[(operario_id, nombre)] = valores
+        for referencia, descripcion, *valores in datos["referencia"]:
+            resumen.por_referencia[referencia] = valores
+            resumen.descripciones[referencia] = descripcion
+        return resumen
+
+
+def _margen(coste: float, venta: float) -> list[Any]:
+
+    # Margen y margen sobre la venta (None si no hay venta)
+
+    return [round(venta - coste, 2), round((venta - coste) / venta, 4) if venta else None]
+
+
+def _orden_operario(operario: tuple[str, str]) -> tuple:
+
+    # Los identificadores de operario son numeros: el 9 va antes que el 10
+
+    operario_id = operario[0]
+    return (not operario_id.isdigit(), int(operario_id) if operario_id.isdigit() else 0, operario)
+
+
+def filas_por_ot(resumen: ResumenCostes) -> list[list[Any]]:
+    return [
+        [clave, *_filas_totales(valores)] for clave, valores in sorted(resumen.por_ot.items())
+    ]
+
+
+def filas_por_mes(resumen: ResumenCostes) -> list[list[Any]]:
+    return [
+        [clave, *_filas_totales(valores)] for clave, valores in sorted(resumen.por_mes.items())
+    ]
+
+
+def _filas_totales(valores: list[float]) -> list[Any]:
+    coste = valores[MATERIALES_COSTE] + valores[MANO_OBRA_COSTE]
+    venta = valores[MATERIALES_VENTA] + valores[MANO_OBRA_VENTA]
+    return [
+        round(valores[MATERIALES_COSTE], 2),
+        round(valores[MATERIALES_VENTA], 2),
+        round(valores[MANO_OBRA_COSTE], 2),
+        round(valores[MANO_OBRA_VENTA], 2),
+        round(valores[HORAS], 2),
+        round(coste, 2),
+        round(venta, 2),
+        *_margen(coste, venta),
+    ]
+
+
+def filas_por_operario(resumen: ResumenCostes) -> list[list[Any]]:
+    return [
+        [
+            operario_id,
+            nombre,
+            round(valores[CANTIDAD], 2),
+            round(valores[COSTE], 2),
+            round(valores[VENTA], 2),
+            *_margen(valores[COSTE], valores[VENTA]),
+        ]
+        for (operario_id, nombre), valores in sorted(
+            resumen.por_operario.items(), key=lambda item: _orden_operario(item[0])
+        )
+    ]
+
+
+def filas_por_referencia(resumen: ResumenCostes) -> list[list[Any]]:
+
+    # Las referencias con mas coste primero
+
+    return [
+        [
+            referencia,
+            resumen.descripciones[referencia],
+            round(valores[CANTIDAD], 2),
+            round(valores[COSTE], 2),
+            round(valores[VENTA], 2),
+            *_margen(valores[COSTE], valores[VENTA]),
+        ]
+        for referencia, valores in sorted(
+            resumen.por_referencia.items(), key=lambda item: (-item[1][COSTE], item[0])
+        )
+    ]
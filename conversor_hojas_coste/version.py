@@ -0,0 +1,6 @@
+# Version del conversor. Hay que cambiarla cuando cambie el xlsx generado, para que "todos" vuelva a convertir
+# los proyectos que ya tiene en la cache de conversiones.
+#
+# Esta en un modulo aparte, sin dependencias, para que main.py pueda mostrarla sin importar openpyxl.
+
+VERSION_CONVERSOR = "1.1.0"
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import Any, Iterator
+import datetime
+import sqlite3
+
+from batch_report import InformeConversiones
+from conversion_cache import hash_fichero
+from convert_join import convierte_proyectos
+from output_formats import CAMPOS_MANO_OBRA, CAMPOS_MATERIALES
+from project_files import FicherosProyecto
+from record_store import AlmacenColumnas
+from stage_timing import etapa
+from version import VERSION_CONVERSOR
+
+
+# Base de datos SQLite con las lineas de todos los proyectos convertidos (comandos "cargar" y "consultar").
+#
+# Para analizar varios proyectos a la vez no hace falta juntar todas las filas en un xlsx: las lineas de cada
+# proyecto se guardan en las tablas "materiales" y "mano_obra", con la clave (numero_ot, linea), y las consultas
+# se resuelven con indices sobre Referencia, Fecha y OperarioId. El numero de OT es el principio de la clave
+# primaria, asi que su indice es el de la clave.
+#
+# Las columnas tienen los mismos nombres que los campos de las lineas (MaterialLine, JobLine), y las fechas
+# se guardan como texto aaaa-mm-dd, para poder compararlas y agrupar por mes con substr(Fecha, 1, 7).
+#
+# En la tabla "proyectos" se guardan los hashes de los ficheros de cada proyecto, y los proyectos que no han
+# cambiado desde la ultima carga no se vuelven a cargar.
+
+FICHERO_BASE_DATOS = "costes.sqlite"
+
+# Filas que se insertan en cada executemany
+
+TAMANO_LOTE_CARGA = 10000
+
+_ESQUEMA = [
+    """CREATE TABLE IF NOT EXISTS proyectos (
+        numero_ot TEXT PRIMARY KEY,
+        archivo_coste TEXT NOT NULL,
+        archivo_venta TEXT NOT NULL,
+        hash_coste TEXT NOT NULL,
+        hash_venta TEXT NOT NULL,
+        version_conversor TEXT NOT NULL,
+        cargado TEXT NOT NULL
+    )""",
+    f"""CREATE TABLE IF NOT EXISTS materiales (
+        numero_ot TEXT NOT NULL,
+        linea INTEGER NOT NULL,
+        Referencia TEXT NOT NULL,
+        Descripcion TEXT NOT NULL,
+        Fecha TEXT NOT NULL,
+        {", ".join(f"{campo} REAL NOT NULL" for campo in CAMPOS_MATERIALES[3:])},
+        PRIMARY KEY (numero_ot, linea)
+    )""",
+    f"""CREATE TABLE IF NOT EXISTS mano_obra (
+        numero_ot TEXT NOT NULL,
+        linea INTEGER NOT NULL,
+        OperacionId TEXT NOT NULL,
+        Operacion TEXT NOT NULL,
+        Fecha TEXT NOT NULL,
+        OperarioId TEXT NOT NULL,
+        OperarioNombre TEXT NOT NULL,
+        {", ".join(f"{campo} REAL NOT NULL" for campo in CAMPOS_MANO_OBRA[5:])},
+        PRIMARY KEY (numero_ot, linea)
+    )""",
+    "CREATE INDEX IF NOT EXISTS materiales_referencia ON materiales (Referencia)",
+    "CREATE INDEX IF NOT EXISTS materiales_fecha ON materiales (Fecha)",
+    "CREATE INDEX IF NOT EXISTS mano_obra_operario ON mano_obra (OperarioId)",
+    "CREATE INDEX IF NOT EXISTS mano_obra_fecha ON mano_obra (Fecha)",
+]
+
+
+def _filas(
+    almacen: AlmacenColumnas, numero_ot: str, campos: list[str]
+) -> Iterator[tuple[Any, ...]]:
+
+    # Filas de la tabla desde las columnas del almacen: numero de OT, linea (desde 1) y los campos en orden
+
+    columnas = [
+        [fecha.isoformat() for fecha in almacen.columna(campo)]
+        if campo == "Fecha"
+        else almacen.columna(campo)
+        for campo in campos
+    ]
+    lineas = almacen.columna("line_number")
+    return zip([numero_ot] * len(lineas), [linea + 1 for linea in lineas], *columnas)
+
+
+class BaseDatosCostes:
+    """Base de datos SQLite con las lineas de materiales y mano de obra de los proyectos."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.conexion = sqlite3.connect(filename)
+        with self.conexion:
+            for sentencia in _ESQUEMA:
+                self.conexion.execute(sentencia)
+
+    def __enter__(self) -> BaseDatosCostes:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conexion.close()
+
+    def proyecto_al_dia(self, numero_ot: str, hash_coste: str, hash_venta: str) -> bool:
+
+        # El proyecto esta cargado desde los mismos ficheros y con la misma version del conversor
+
+        fila = self.conexion.execute(
+            "SELECT hash_coste, hash_venta, version_conversor FROM proyectos WHERE numero_ot = ?",
+            (numero_ot,),
+        ).fetchone()
+        return fila == (hash_coste, hash_venta, VERSION_CONVERSOR)
+
+    def _borra(self, numero_ot: str) -> None:
+        for tabla in ("materiales", "mano_obra", "proyectos"):
+            self.conexion.execute(f"DELETE FROM {tabla} WHERE numero_ot = ?", (numero_ot,))
+
+    def olvida_proyecto(self, numero_ot: str) -> None:
+        with self.conexion:
+            self._borra(numero_ot)
+
+    def carga_proyecto(
+        self,
+        archivos: FicherosProyecto,
+        numero_ot: str,
+        hash_coste: str,
+        hash_venta: str,
+        materiales: AlmacenColumnas,
+        mano_obra: AlmacenColumnas,
+    ) -> None:
+
+        # Sustituye las lineas del proyecto por las nuevas, todo en una transaccion:
+        # si algo falla, el proyecto se queda como estaba
+
+        with self.conexion:
+            self._borra(numero_ot)
+
+            for tabla, almacen, campos in (
+                ("materiales", materiales, CAMPOS_MATERIALES),
+                ("mano_obra", mano_obra, CAMPOS_MANO_OBRA),
+            ):
+                sentencia = (
+                    f"INSERT INTO {tabla} (numero_ot, linea, {', '.join(campos)}) "
+                    f"VALUES ({', '.join(['?'] * (len(campos) + 2))})"
+                )
+                filas = _filas(almacen, numero_ot, campos)
+                while lote := list(islice(filas, TAMANO_LOTE_CARGA)):
+                    self.conexion.executemany(sentencia, lote)
+
+            self.conexion.execute(
+                "INSERT INTO proyectos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    numero_ot,
+                    archivos.archivo_coste,
+                    archivos.archivo_venta,
+                    hash_coste,
+                    hash_venta,
+                    VERSION_CONVERSOR,
+                    datetime.datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+
+    def consulta(
+        self, sql: str, parametros: dict[str, Any] | tuple = ()
+    ) -> tuple[list[str], list[tuple]]:
+
+        # Devuelve los nombres de las columnas y las filas del resultado
+
+        cursor = self.conexion.execute(sql, parametros)
+        columnas = [descripcion[0] for descripcion in cursor.description or []]
+        return columnas, cursor.fetchall()
+
+
+def carga_proyectos(
+    proyectos: list[tuple[str, FicherosProyecto]],
+    base_datos: BaseDatosCostes,
+    errores: bool,
+    verboso: bool,
+    resultados: InformeConversiones,
+    jobs: int = 1,
+    forzar: bool = False,
+) -> dict[str, dict]:
+
+    # Convierte los proyectos que han cambiado desde la ultima carga y guarda sus lineas en la base de datos.
+    # Un proyecto que no se puede convertir se quita de la base de datos, para no dejar lineas que ya no
+    # corresponden a sus ficheros. Devuelve los tiempos de cada proyecto.
+
+    hashes: dict[str, tuple[str, str]] = {}
+    pendientes: list[tuple[str, FicherosProyecto]] = []
+
+    for proyecto_id, archivos in sorted(proyectos, key=lambda proyecto: proyecto[0]):
+        with etapa("comprobacion", 1):
+            hashes[proyecto_id] = (
+                hash_fichero(archivos.archivo_coste),
+                hash_fichero(archivos.archivo_venta),
+            )
+            al_dia = not forzar and base_datos.proyecto_al_dia(
+                proyecto_id, *hashes[proyecto_id]
+            )
+
+        if al_dia:
+            print(f"Proyecto {proyecto_id} sin cambios, ya cargado en: {base_datos.filename}")
+            resultados.sin_cambios(
+                proyecto_id, archivos.archivo_coste, archivos.archivo_venta, base_datos.filename
+            )
+        else:
+            pendientes.append((proyecto_id, archivos))
+
+    tiempos_por_proyecto: dict[str, dict] = {}
+
+    for proyecto_id, archivos, convertido in convierte_proyectos(
+        pendientes, errores, verboso, ".", False, "xlsx", jobs
+    ):
+        salida, _, tiempos, resultado, filas = convertido
+
+        print(salida, end="")
+        tiempos_por_proyecto[proyecto_id] = tiempos
+
+        if filas is None:
+            base_datos.olvida_proyecto(proyecto_id)
+        else:
+            materiales, mano_obra, _ = filas
+            with etapa("carga", len(materiales) + len(mano_obra)):
+                base_datos.carga_proyecto(
+                    archivos, proyecto_id, *hashes[proyecto_id], materiales, mano_obra
+                )
+            resultado["salida"] = base_datos.filename
+
+        resultados.convertido(
+            proyecto_id, archivos.archivo_coste, archivos.archivo_venta, resultado
+        )
+
+    return tiempos_por_proyecto
+
+
+# Consultas predefinidas de "consultar": descripcion y SQL. En {filtros} van las condiciones de los filtros
+# que se usan, para que SQLite pueda usar el indice de cada uno (con "(:ot IS NULL OR numero_ot = :ot)" no lo usa).
+
+CONSULTAS: dict[str, tuple[str, str]] = {
+    "operario-mes": (
+        "Horas e importes de mano de obra por operario y mes",
+        """SELECT OperarioId AS operario, OperarioNombre AS nombre, substr(Fecha, 1, 7) AS mes,
+            round(sum(Cantidad), 2) AS horas,
+            round(sum(ImporteTotalCoste), 2) AS coste,
+            round(sum(ImporteTotalVenta), 2) AS venta
+        FROM mano_obra
+        WHERE {filtros}
+        GROUP BY OperarioId, OperarioNombre, mes
+        ORDER BY OperarioId, mes""",
+    ),
+    "proyecto": (
+        "Coste y venta de materiales y mano de obra por proyecto",
+        """SELECT numero_ot AS ot,
+            round(sum(materiales_coste), 2) AS materiales_coste,
+            round(sum(materiales_venta), 2) AS materiales_venta,
+            round(sum(mano_obra_coste), 2) AS mano_obra_coste,
+            round(sum(mano_obra_venta), 2) AS mano_obra_venta
+        FROM (
+            SELECT numero_ot, ImporteTotalCoste AS materiales_coste, ImporteTotalVenta AS materiales_venta,
+                0 AS mano_obra_coste, 0 AS mano_obra_venta
+            FROM materiales WHERE {filtros}
+            UNION ALL
+            SELECT numero_ot, 0, 0, ImporteTotalCoste, ImporteTotalVenta
+            FROM mano_obra WHERE {filtros}
+        )
+        GROUP BY numero_ot
+        ORDER BY numero_ot""",
+    ),
+    "proyecto-mes": (
+        "Coste y venta de materiales y mano de obra por proyecto y mes",
+        """SELECT numero_ot AS ot, mes,
+            round(sum(materiales_coste), 2) AS materiales_coste,
+            round(sum(materiales_venta), 2) AS materiales_venta,
+            round(sum(mano_obra_coste), 2) AS mano_obra_coste,
+            round(sum(mano_obra_venta), 2) AS mano_obra_venta
+        FROM (
+            SELECT numero_ot, substr(Fecha, 1, 7) AS mes, ImporteTotalCoste AS materiales_coste,
+                ImporteTotalVenta AS materiales_venta, 0 AS mano_obra_coste, 0 AS mano_obra_venta
+            FROM materiales WHERE {filtros}
+            UNION ALL
+            SELECT numero_ot, substr(Fecha, 1, 7), 0, 0, ImporteTotalCoste, ImporteTotalVenta
+            FROM mano_obra WHERE {filtros}
+        )
+        GROUP BY numero_ot, mes
+        ORDER BY numero_ot, mes""",
+    ),
+    "referencia": (
+        "Cantidad e importes de materiales por referencia",
+        """SELECT Referencia AS referencia, min(Descripcion) AS descripcion,
+            round(sum(Cantidad), 2) AS cantidad,
+            round(sum(ImporteTotalCoste), 2) AS coste,
+            round(sum(ImporteTotalVenta), 2) AS venta
+        FROM materiales
+        WHERE {filtros}
+        GROUP BY Referencia
+        ORDER BY coste DESC""",
+    ),
+}
+
+
+def sql_consulta(
+    nombre: str, ot: str | None, desde: str | None, hasta: str | None
+) -> tuple[str, dict[str, Any]]:
+
+    # SQL y parametros de la consulta predefinida con los filtros dados (las fechas como aaaa-mm-dd)
+
+    condiciones = []
+    if ot is not None:
+        condiciones.append("numero_ot = :ot")
+    if desde is not None:
+        condiciones.append("Fecha >= :desde")
+    if hasta is not None:
+        condiciones.append("Fecha <= :hasta")
+
+    filtros = " AND ".join(condiciones) if condiciones else "1"
+    parametros = {"ot": ot, "desde": desde, "hasta": hasta}
+    return CONSULTAS[nombre][1].format(filtros=filtros), parametros
+
+
+def muestra_tabla(columnas: list[str], filas: list[tuple]) -> None:
+
+    # Tabla de texto con una columna por campo, los numeros alineados a la derecha
+
+    textos = [
+        [
+            ""
+            if valor is None
+            else f"{valor:.2f}"
+            if isinstance(valor, float)
+            else str(valor)
+            for valor in fila
+        ]
+        for fila in filas
+    ]
+    anchos = [
+        max([len(columna)] + [len(fila[i]) for fila in textos])
+        for i, columna in enumerate(columnas)
+    ]
+    numericas = [
+        bool(filas)
+        and all(
+            isinstance(fila[i], (int, float)) for fila in filas if fila[i] is not None
+        )
+        for i in range(len(columnas))
+    ]
+
+    def linea(valores: list[str]) -> str:
+        return "  ".join(
+            valor.rjust(ancho) if numerica else valor.ljust(ancho)
+            for valor, ancho, numerica in zip(valores, anchos, numericas)
+        ).rstrip()
+
+    print(linea(columnas))
+    print("  ".join("-" * ancho for ancho in anchos))
+    for fila in textos:
+        print(linea(fila))
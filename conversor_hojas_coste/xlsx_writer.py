@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+from typing import Any, Iterator, Sequence
+import datetime
+import os
+import warnings
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.utils import get_column_letter
+
+from record_store import AlmacenColumnas
+from summaries import (
+    ResumenCostes,
+    filas_por_mes,
+    filas_por_operario,
+    filas_por_ot,
+    filas_por_referencia,
+)
+
+
+# Escritor de los ficheros xlsx de salida en modo "write-only" de openpyxl.
+# En este modo las filas se escriben directamente a disco segun se añaden, por lo que la memoria
+# no crece con el numero de lineas de la OT. A cambio, los anchos de columna y el alto de la cabecera
+# deben fijarse antes de escribir la primera fila, y cada celda debe llevar su propio formato.
+#
+# Dos cosas dependen del funcionamiento interno de openpyxl, por lo que su version esta fijada en pyproject.toml:
+# - descarta() borra los ficheros temporales de las hojas con el escritor de cada hoja (ws._writer), porque
+#   openpyxl no tiene una forma publica de cerrar un workbook write-only sin guardarlo.
+# - El orden de los estilos se fija al crear el escritor, creando celdas solo para que openpyxl los registre
+#   (ver __init__). Si cambiara la forma de registrarlos, el juntar incremental veria estilos distintos
+#   y juntaria todo de nuevo: el resultado seria el mismo, solo mas lento.
+
+FORMATO_NUMERO = "#,##0.00#"
+FORMATO_FECHA = "dd/mm/yyyy"
+FORMATO_PORCENTAJE = "0.0%"
+
+HOJA_MATERIALES = "Materiales"
+HOJA_MANO_OBRA = "Mano de Obra"
+
+TABLA_MATERIALES = "materiales"
+TABLA_MANO_OBRA = "mano_obra"
+
+# Cabecera, ancho y formato de cada columna de las hojas de salida
+
+COLUMNAS_MATERIALES: list[tuple[str, int, str | None]] = [
+    ("Linea fichero original", 19, None),
+    ("Numero OT", 12, None),
+    ("Referencia", 20, None),
+    ("Descripcion", 50, None),
+    ("Fecha", 12, FORMATO_FECHA),
+    ("Cantidad", 10, FORMATO_NUMERO),
+    ("Precio Coste", 14, FORMATO_NUMERO),
+    ("Importe Coste", 14, FORMATO_NUMERO),
+    ("Precio Venta", 14, FORMATO_NUMERO),
+    ("Importe Venta", 14, FORMATO_NUMERO),
+]
+
+COLUMNAS_MANO_OBRA: list[tuple[str, int, str | None]] = [
+    ("Linea fichero original", 19, None),
+    ("Numero OT", 12, None),
+    ("Operacion Id", 14, None),
+    ("Operacion", 30, None),
+    ("Fecha", 12, FORMATO_FECHA),
+    ("Operario Id", 12, None),
+    ("Operario Nombre", 30, None),
+    ("Cantidad", 14, FORMATO_NUMERO),
+    ("Precio Coste", 14, FORMATO_NUMERO),
+    ("Importe Coste", 14, FORMATO_NUMERO),
+    ("Dietas Coste", 14, FORMATO_NUMERO),
+    ("Desplazamiento Coste", 14, FORMATO_NUMERO),
+    ("Precio Venta", 14, FORMATO_NUMERO),
+    ("Importe Venta", 14, FORMATO_NUMERO),
+    ("Dietas Venta", 14, FORMATO_NUMERO),
+    ("Desplazamiento Venta", 14, FORMATO_NUMERO),
+]
+
+
+# Hojas de resumen, despues de las de filas: totales de coste y venta ya calculados (ver summaries)
+
+_COLUMNAS_TOTALES: list[tuple[str, int, str | None]] = [
+    ("Materiales Coste", 14, FORMATO_NUMERO),
+    ("Materiales Venta", 14, FORMATO_NUMERO),
+    ("Mano de Obra Coste", 14, FORMATO_NUMERO),
+    ("Mano de Obra Venta", 14, FORMATO_NUMERO),
+    ("Horas", 10, FORMATO_NUMERO),
+    ("Coste Total", 14, FORMATO_NUMERO),
+    ("Venta Total", 14, FORMATO_NUMERO),
+    ("Margen", 14, FORMATO_NUMERO),
+    ("Margen %", 10, FORMATO_PORCENTAJE),
+]
+
+_COLUMNAS_IMPORTES: list[tuple[str, int, str | None]] = [
+    ("Coste", 14, FORMATO_NUMERO),
+    ("Venta", 14, FORMATO_NUMERO),
+    ("Margen", 14, FORMATO_NUMERO),
+    ("Margen %", 10, FORMATO_PORCENTAJE),
+]
+
+HOJAS_RESUMEN = [
+    ("Resumen OT", [("Numero OT", 12, None), *_COLUMNAS_TOTALES], filas_por_ot),
+    ("Resumen Mes", [("Mes", 10, None), *_COLUMNAS_TOTALES], filas_por_mes),
+    (
+        "Resumen Operario",
+        [
+            ("Operario Id", 12, None),
+            ("Operario Nombre", 30, None),
+            ("Horas", 10, FORMATO_NUMERO),
+            *_COLUMNAS_IMPORTES,
+        ],
+        filas_por_operario,
+    ),
+    (
+        "Resumen Referencia",
+        [
+            ("Referencia", 20, None),
+            ("Descripcion", 50, None),
+            ("Cantidad", 10, FORMATO_NUMERO),
+            *_COLUMNAS_IMPORTES,
+        ],
+        filas_por_referencia,
+    ),
+]
+
+
+def filas_materiales(
+    almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+) -> Iterator[list[Any]]:
+
+    # Filas de la hoja de materiales leidas de las columnas del almacen, a partir de la fila "desde"
+
+    for line_number, *valores in zip(
+        almacen.columna("line_number", desde),
+        almacen.columna("Referencia", desde),
+        almacen.columna("Descripcion", desde),
+        almacen.columna("Fecha", desde),
+        almacen.columna("Cantidad", desde),
+        almacen.columna("PrecioUnitarioCoste", desde),
+        almacen.columna("ImporteTotalCoste", desde),
+        almacen.columna("PrecioUnitarioVenta", desde),
+        almacen.columna("ImporteTotalVenta", desde),
+    ):
+        yield [line_number + 1, numero_ot, *valores]
+
+
+def filas_mano_obra(
+    almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+) -> Iterator[list[Any]]:
+
+    # Filas de la hoja de mano de obra leidas de las columnas del almacen, a partir de la fila "desde"
+
+    for line_number, *valores in zip(
+        almacen.columna("line_number", desde),
+        almacen.columna("OperacionId", desde),
+        almacen.columna("Operacion", desde),
+        almacen.columna("Fecha", desde),
+        almacen.columna("OperarioId", desde),
+        almacen.columna("OperarioNombre", desde),
+        almacen.columna("Cantidad", desde),
+        almacen.columna("PrecioUnitarioCoste", desde),
+        almacen.columna("ImporteTotalCoste", desde),
+        almacen.columna("DietasCoste", desde),
+        almacen.columna("DesplazamientoCoste", desde),
+        almacen.columna("PrecioUnitarioVenta", desde),
+        almacen.columna("ImporteTotalVenta", desde),
+        almacen.columna("DietasVenta", desde),
+        almacen.columna("DesplazamientoVenta", desde),
+    ):
+        yield [line_number + 1, numero_ot, *valores]
+
+
+class _HojaStreaming:
+    """Hoja en modo write-only con su cabecera, anchos y formatos por columna ya fijados."""
+
+    def __init__(
+        self,
+        wb: Workbook,
+        titulo: str,
+        columnas: list[tuple[str, int, str | None]],
+    ):
+        self.ws: WriteOnlyWorksheet = wb.create_sheet(title=titulo)
+        self.columnas = columnas
+        self.formatos = [formato for _, _, formato in columnas]
+        self.filas = 0
+
+        for i, (_, ancho, _) in enumerate(columnas, 1):
+            self.ws.column_dimensions[get_column_letter(i)].width = ancho
+
+        self.ws.row_dimensions[1].height = 36
+        self.ws.row_dimensions[1].alignment = Alignment(wrap_text=True)
+
+        self.ws.append([cabecera for cabecera, _, _ in columnas])
+
+    def append(self, valores: Sequence[Any]) -> None:
+        fila: list[Any] = []
+
+        for valor, formato in zip(valores, self.formatos):
+            if formato is None or valor is None:
+                fila.append(valor)
+            else:
+                cell = WriteOnlyCell(self.ws, value=valor)
+                cell.number_format = formato
+                fila.append(cell)
+
+        fila.extend(valores[len(self.formatos) :])
+
+        self.ws.append(fila)
+        self.filas += 1
+
+    def add_table(self, nombre: str, style: TableStyleInfo | None) -> None:
+        table = Table(
+            displayName=nombre,
+            ref="A1:"
+            + get_column_letter(len(self.columnas))
+            + str(self.filas + 1),
+        )
+
+        if style is not None:
+            table.tableStyleInfo = style
+
+        # En modo write-only openpyxl no puede leer la cabecera de la hoja, hay que dar los nombres de las columnas
+        # (y el filtro, que openpyxl solo crea junto con las columnas)
+
+        table.autoFilter = AutoFilter(ref=table.ref)
+        table.tableColumns = [
+            TableColumn(id=i, name=cabecera)
+            for i, (cabecera, _, _) in enumerate(self.columnas, 1)
+        ]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.ws.add_table(table)
+
+
+class XlsxWriter:
+    """Escribe un fichero xlsx con las hojas "Materiales" y "Mano de Obra" fila a fila.
+
+    Las filas se pueden añadir en cualquier orden entre hojas. El fichero no se crea hasta llamar a close(),
+    que añade al final las hojas de resumen con los totales dados con add_resumen().
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+        self.wb = Workbook(write_only=True)
+        self.materiales = _HojaStreaming(
+            self.wb, HOJA_MATERIALES, COLUMNAS_MATERIALES
+        )
+        self.mano_obra = _HojaStreaming(
+            self.wb, HOJA_MANO_OBRA, COLUMNAS_MANO_OBRA
+        )
+        self.resumen = ResumenCostes()
+
+        # Los formatos se registran siempre en el mismo orden, para que los estilos del fichero no dependan
+        # de las filas escritas: el juntar incremental copia filas y hojas de resumen entre ficheros.
+        # openpyxl registra tambien su formato por defecto de las fechas al crear una celda con una fecha,
+        # y el estilo de una celda al pedir su style_id, como hace al escribirla. Las celdas no se escriben.
+
+        for valor in (datetime.date(2000, 1, 1), datetime.datetime(2000, 1, 1)):
+            WriteOnlyCell(self.materiales.ws, value=valor)
+
+        for formato in (FORMATO_FECHA, FORMATO_NUMERO, FORMATO_PORCENTAJE):
+            cell = WriteOnlyCell(self.materiales.ws)
+            cell.number_format = formato
+            cell.style_id
+
+    def add_material_row(self, row: Sequence[Any]) -> None:
+        self.materiales.append(row)
+
+    def add_job_row(self, row: Sequence[Any]) -> None:
+        self.mano_obra.append(row)
+
+    def add_material_rows(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+        for fila in filas_materiales(almacen, numero_ot, desde):
+            self.materiales.append(fila)
+
+    def add_job_rows(
+        self, almacen: AlmacenColumnas, numero_ot: str, desde: int = 0
+    ) -> None:
+        for fila in filas_mano_obra(almacen, numero_ot, desde):
+            self.mano_obra.append(fila)
+
+    def add_resumen(self, resumen: ResumenCostes) -> None:
+        self.resumen = resumen
+
+    def close(self) -> None:
+        try:
+            for titulo, columnas, filas in HOJAS_RESUMEN:
+                hoja = _HojaStreaming(self.wb, titulo, columnas)
+                for fila in filas(self.resumen):
+                    hoja.append(fila)
+
+            self.materiales.add_table(
+                TABLA_MATERIALES,
+                TableStyleInfo(
+                    name="TableStyleMedium9",
+                    showFirstColumn=False,
+                    showLastColumn=False,
+                    showRowStripes=True,
+                    showColumnStripes=False,
+                ),
+            )
+            self.mano_obra.add_table(TABLA_MANO_OBRA, None)
+
+            self.wb.save(self.filename)
+        except BaseException:
+            self.descarta()
+            raise
+
+    def descarta(self) -> None:
+
+        # Cierra las hojas sin crear el fichero y borra los ficheros temporales donde openpyxl iba escribiendo las filas.
+        # Tambien sirve si ha fallado el guardado: openpyxl borra el temporal de cada hoja segun la guarda.
+
+        for ws in self.wb.worksheets:
+            escritor = ws._writer
+            if escritor is None:
+                continue
+            try:
+                if not ws.closed:
+                    ws.close()
+            finally:
+                if os.path.exists(escritor.out):
+                    escritor.cleanup()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Los modulos del conversor se importan sin paquete, como en main.py, y los de los benchmarks igual
+
+sys.path.insert(0, os.path.join(RAIZ, "conversor_hojas_coste"))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from genera_informe import genera_informe  # noqa: E402
+
+# Informes pequenos, pero con varias paginas en cada seccion
+
+MATERIALES = 150
+MANO_OBRA = 80
+
+
+@pytest.fixture
+def informes(tmp_path):
+
+    # Genera los informes de coste y venta de un proyecto con genera_informe y devuelve sus rutas
+
+    def genera(
+        numero_ot: str = "900000",
+        semilla: int = 0,
+        carpeta=None,
+        materiales: int = MATERIALES,
+        mano_obra: int = MANO_OBRA,
+    ) -> tuple[str, str]:
+        return genera_informe(
+            str(carpeta or tmp_path), numero_ot, materiales, mano_obra, semilla=semilla
+        )
+
+    return genera
@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+from bench_arranque import MAIN, PROHIBIDOS, importaciones
+
+# El tiempo de arranque se mide con benchmarks/bench_arranque.py; aqui solo se comprueba que la ayuda
+# no importa los modulos que solo hacen falta para convertir
+
+
+def test_ayuda_no_importa_modulos_de_conversion():
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN, "--help"], capture_output=True, text=True
+    )
+    assert proceso.returncode == 0, proceso.stderr
+    modulos = importaciones(proceso.stderr)
+
+    assert "cyclopts" in modulos
+    for prohibido in PROHIBIDOS:
+        assert prohibido not in modulos
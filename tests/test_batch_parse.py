@@ -0,0 +1,149 @@
+import os
+
+import pytest
+
+import job_line
+import material_line
+from job_line import JobLine
+from line_classifier import ClasificadorLineas, TipoLinea
+from material_line import MaterialLine
+from parse_file import TAMANO_LOTE
+
+EJEMPLO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ejemplos", "230838coste.txt")
+
+SECCIONES = [
+    (MaterialLine, TipoLinea.FILA_MATERIAL, material_line),
+    (JobLine, TipoLinea.FILA_MANO_OBRA, job_line),
+]
+
+FICHEROS = [(True, True), (True, False), (False, True)]
+
+
+def _lee(filename: str) -> list[str]:
+    with open(filename, "r", encoding="UTF-16LE") as file:
+        return file.readlines()
+
+
+def _filas(lineas: list[str], tipo: TipoLinea) -> list[int]:
+
+    # Indices de las lineas que el clasificador manda a parsear como filas de la seccion
+
+    clasificador = ClasificadorLineas()
+    return [
+        i
+        for tipo_segmento, desde, hasta in clasificador.segmentos(lineas)
+        if tipo_segmento is tipo
+        for i in range(desde, hasta)
+    ]
+
+
+def _cambia(linea: str, inicio: int, fin: int, texto: str) -> str:
+    return linea[:inicio] + texto.rjust(fin - inicio) + linea[fin:]
+
+
+def _estropea(coste: list[str], venta: list[str], modulo) -> None:
+
+    # Lineas con los errores que se tratan fuera del bloque: fechas invalidas o que solo acepta strptime,
+    # numeros que no lo son y campos comunes distintos en coste y venta
+
+    if modulo is material_line:
+        fecha = (material_line.DESCRIPCION_END, material_line.FECHA_END)
+        cantidad = (material_line.FECHA_END, material_line.CANTIDAD_END)
+        comun = (0, material_line.REFERENCIA_END)
+    else:
+        fecha = (job_line.OPERACION_END, job_line.FECHA_END)
+        cantidad = (job_line.OPERARIO_NOMBRE_END, job_line.CANTIDAD_END)
+        comun = (job_line.OPERACION_ID_END, job_line.OPERACION_END)
+
+    for lineas in (coste, venta):
+        lineas[1] = _cambia(lineas[1], *fecha, "32/13/2024")
+        lineas[3] = _cambia(lineas[3], *fecha, "1/5/2024")
+        lineas[5] = _cambia(lineas[5], *fecha, "")
+        lineas[7] = _cambia(lineas[7], *cantidad, "1,2x")
+    venta[9] = _cambia(venta[9], *comun, "DISTINTO")
+
+
+def _por_linea(clase, coste, venta, numeros, use_coste, use_venta):
+    filas, errores = [], []
+    for linea_coste, linea_venta, numero in zip(coste, venta, numeros):
+        try:
+            filas.append(
+                clase.parse(
+                    linea_coste if use_coste else linea_venta,
+                    linea_coste if use_coste else "",
+                    linea_venta if use_venta else "",
+                    numero,
+                    use_coste,
+                    use_venta,
+                )
+            )
+        except (clase.NotValidError, clase.IncongruentError) as e:
+            errores.append(e)
+    return filas, errores
+
+
+def _por_lotes(clase, coste, venta, numeros, use_coste, use_venta):
+    columnas: dict[str, list] = {}
+    errores = []
+    for inicio in range(0, len(numeros), TAMANO_LOTE):
+        fin = inicio + TAMANO_LOTE
+        lote, errores_lote = clase.parse_batch(
+            coste[inicio:fin] if use_coste else [""] * len(numeros[inicio:fin]),
+            venta[inicio:fin] if use_venta else [""] * len(numeros[inicio:fin]),
+            numeros[inicio:fin],
+            use_coste,
+            use_venta,
+        )
+        for nombre, valores in lote.items():
+            columnas.setdefault(nombre, []).extend(valores)
+        errores.extend(errores_lote)
+    return columnas, errores
+
+
+def _compara(clase, coste, venta, numeros, use_coste, use_venta):
+    filas, errores_linea = _por_linea(clase, coste, venta, numeros, use_coste, use_venta)
+    columnas, errores_lote = _por_lotes(clase, coste, venta, numeros, use_coste, use_venta)
+
+    assert len(filas) > 0
+    for nombre, valores in columnas.items():
+        assert valores == [getattr(fila, nombre) for fila in filas], nombre
+
+    assert [(type(e), str(e)) for e in errores_lote] == [
+        (type(e), str(e)) for e in errores_linea
+    ]
+
+    return errores_linea
+
+
+@pytest.mark.parametrize("use_coste,use_venta", FICHEROS)
+@pytest.mark.parametrize("clase,tipo,modulo", SECCIONES)
+def test_lotes_igual_que_por_linea_sintetico(informes, clase, tipo, modulo, use_coste, use_venta):
+    fichero_coste, fichero_venta = informes()
+    lineas_coste = _lee(fichero_coste)
+    lineas_venta = _lee(fichero_venta)
+
+    indices = _filas(lineas_coste, tipo)
+    coste = [lineas_coste[i] for i in indices]
+    venta = [lineas_venta[i] for i in indices]
+    _estropea(coste, venta, modulo)
+
+    # La fecha "1/5/2024" se acepta; las otras dos fechas y la cantidad no
+    # (y con los dos ficheros, tampoco la linea incongruente)
+
+    errores = _compara(clase, coste, venta, indices, use_coste, use_venta)
+    assert len(errores) == (4 if use_coste and use_venta else 3)
+
+
+@pytest.mark.parametrize("use_coste,use_venta", FICHEROS)
+@pytest.mark.parametrize("clase,tipo,modulo", SECCIONES)
+def test_lotes_igual_que_por_linea_ejemplo(clase, tipo, modulo, use_coste, use_venta):
+
+    # El ejemplo real solo tiene informe de coste, se usa tambien como informe de venta
+
+    lineas = _lee(EJEMPLO)
+
+    indices = _filas(lineas, tipo)
+    coste = [lineas[i] for i in indices]
+    venta = list(coste)
+
+    _compara(clase, coste, venta, indices, use_coste, use_venta)
@@ -0,0 +1,78 @@
+import os
+
+from conversion_cache import FICHERO_CACHE, CacheConversiones, hash_fichero
+from main import convierte_ficheros_directorio_actual
+from parse_file import fichero_salida
+
+
+def _todos(entrada: str, salida: str, capsys) -> str:
+
+    # Ejecuta "todos --si" en un solo proceso y devuelve lo que muestra
+
+    capsys.readouterr()
+    convierte_ficheros_directorio_actual(si=True, jobs=1, entrada=entrada, salida=salida)
+    return capsys.readouterr().out
+
+
+def _fecha_modificacion(filename: str) -> int:
+    return os.stat(filename).st_mtime_ns
+
+
+def test_todos_no_convierte_proyectos_sin_cambios(informes, tmp_path, capsys):
+    entrada = str(tmp_path / "informes")
+    salida = str(tmp_path / "ot")
+    os.mkdir(entrada)
+
+    proyectos = {
+        numero_ot: informes(numero_ot, semilla=semilla, carpeta=entrada)
+        for semilla, numero_ot in enumerate(["900000", "900001"])
+    }
+    salidas = {
+        numero_ot: fichero_salida(coste, venta, numero_ot, salida)
+        for numero_ot, (coste, venta) in proyectos.items()
+    }
+
+    resultado = _todos(entrada, salida, capsys)
+    assert "Procesando proyecto 900000" in resultado
+    assert "Procesando proyecto 900001" in resultado
+    fechas = {numero_ot: _fecha_modificacion(filename) for numero_ot, filename in salidas.items()}
+
+    # Sin cambios no se convierte nada
+
+    resultado = _todos(entrada, salida, capsys)
+    assert "Todos los proyectos están al día." in resultado
+    assert {numero_ot: _fecha_modificacion(filename) for numero_ot, filename in salidas.items()} == fechas
+
+    # Solo se convierte el proyecto con un informe nuevo
+
+    informes("900001", semilla=10, carpeta=entrada)
+    resultado = _todos(entrada, salida, capsys)
+    assert "Proyecto 900000 sin cambios" in resultado
+    assert "Procesando proyecto 900000" not in resultado
+    assert "Procesando proyecto 900001" in resultado
+    assert _fecha_modificacion(salidas["900000"]) == fechas["900000"]
+
+    # Y el proyecto cuyo xlsx se ha borrado
+
+    os.remove(salidas["900000"])
+    resultado = _todos(entrada, salida, capsys)
+    assert "Procesando proyecto 900000" in resultado
+    assert "Proyecto 900001 sin cambios" in resultado
+    assert os.path.isfile(salidas["900000"])
+
+
+def test_otra_version_del_conversor(informes, tmp_path):
+    coste, venta = informes()
+    salida = str(tmp_path / "900000.xlsx")
+    with open(salida, "wb") as file:
+        file.write(b"xlsx")
+    hashes = (hash_fichero(coste), hash_fichero(venta))
+    filename = str(tmp_path / FICHERO_CACHE)
+
+    cache = CacheConversiones("1.0.0", filename)
+    cache.guarda_proyecto("900000", coste, venta, *hashes, salida)
+    cache.guarda()
+
+    assert CacheConversiones("1.0.0", filename).salida_al_dia("900000", coste, venta, *hashes) == salida
+    assert CacheConversiones("1.1.0", filename).salida_al_dia("900000", coste, venta, *hashes) is None
+    assert CacheConversiones("1.0.0", filename, "csv").salida_al_dia("900000", coste, venta, *hashes) is None
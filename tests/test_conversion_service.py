@@ -0,0 +1,109 @@
+import http.client
+import io
+import json
+import os
+import threading
+
+import openpyxl
+import pytest
+
+import conversion_service
+from conversion_service import crea_servidor
+
+FRONTERA = "frontera-de-prueba"
+
+
+@pytest.fixture
+def servicio():
+
+    # Arranca servicios con un proceso en un puerto libre y devuelve una funcion que hace peticiones al ultimo
+
+    servidores = []
+
+    def arranca(host: str = "127.0.0.1"):
+        servidor = crea_servidor(host, 0, 1, 4)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        return servidor
+
+    def pide(ruta: str, cuerpo: bytes, tipo: str) -> tuple[int, bytes]:
+        conexion = http.client.HTTPConnection("127.0.0.1", servidores[-1].server_address[1], timeout=60)
+        try:
+            conexion.request("POST", ruta, cuerpo, {"Content-Type": tipo})
+            respuesta = conexion.getresponse()
+            return respuesta.status, respuesta.read()
+        finally:
+            conexion.close()
+
+    yield arranca, pide
+
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def _multipart(partes: list[tuple[str, str | None, bytes]]) -> tuple[bytes, str]:
+
+    # Cuerpo multipart/form-data con las cabeceras (Content-Disposition) y el contenido de cada parte
+
+    cuerpo = b""
+    for cabecera, nombre_fichero, contenido in partes:
+        if nombre_fichero is not None:
+            cabecera += f'; filename="{nombre_fichero}"'
+        cuerpo += f"--{FRONTERA}\r\nContent-Disposition: {cabecera}\r\n\r\n".encode() + contenido + b"\r\n"
+    cuerpo += f"--{FRONTERA}--\r\n".encode()
+    return cuerpo, f"multipart/form-data; boundary={FRONTERA}"
+
+
+def _lee(filename: str) -> bytes:
+    with open(filename, "rb") as file:
+        return file.read()
+
+
+def test_convertir_ficheros_subidos(informes, servicio, monkeypatch):
+    arranca, pide = servicio
+    arranca()
+    coste, venta = informes()
+
+    # Bloques pequenos, para que los separadores queden partidos entre bloques
+
+    monkeypatch.setattr(conversion_service, "BLOQUE_LECTURA", 7)
+    cuerpo, tipo = _multipart(
+        [
+            ('form-data; name="ot"', None, b"900000"),
+            ('form-data; name="coste"', os.path.basename(coste), _lee(coste)),
+            ('form-data; name="venta"', os.path.basename(venta), _lee(venta)),
+        ]
+    )
+    codigo, respuesta = pide("/convertir", cuerpo, tipo)
+    assert codigo == 200, respuesta
+
+    libro = openpyxl.load_workbook(io.BytesIO(respuesta), read_only=True)
+    try:
+        assert sum(1 for _ in libro["Materiales"].iter_rows(values_only=True)) > 1
+    finally:
+        libro.close()
+
+
+def test_parte_sin_nombre(informes, servicio):
+    arranca, pide = servicio
+    arranca()
+    coste, _ = informes()
+
+    cuerpo, tipo = _multipart([("form-data", os.path.basename(coste), _lee(coste))])
+    codigo, respuesta = pide("/convertir", cuerpo, tipo)
+    assert codigo == 400
+    assert "name" in json.loads(respuesta)["error"]
+
+
+def test_rutas_solo_en_direccion_local(informes, servicio):
+    arranca, pide = servicio
+    coste, venta = informes()
+    peticion = json.dumps({"coste": coste, "venta": venta, "ot": "900000"}).encode()
+
+    assert arranca("127.0.0.1").acepta_rutas
+
+    assert not arranca("0.0.0.0").acepta_rutas
+    codigo, respuesta = pide("/convertir", peticion, "application/json")
+    assert codigo == 403
+    assert "subir" in json.loads(respuesta)["error"]
@@ -0,0 +1,95 @@
+import os
+import time
+
+import openpyxl
+
+from folder_watch import VigilanteCarpeta
+
+
+def _cambia_fechas(filename: str, hasta: str) -> None:
+
+    # Como si el ERP volviera a exportar el informe con otro rango de fechas
+
+    with open(filename, "r", encoding="UTF-16LE", newline="") as file:
+        texto = file.read()
+    with open(filename, "w", encoding="UTF-16LE", newline="") as file:
+        file.write(texto.replace("Hasta Fecha  20/03/2025", f"Hasta Fecha  {hasta}", 1))
+
+
+def _espera(condicion, vigilante: VigilanteCarpeta) -> None:
+    limite = time.monotonic() + 60
+    while not condicion():
+        assert time.monotonic() < limite
+        vigilante.revisa()
+        time.sleep(0.05)
+
+
+def test_informe_exportado_durante_la_conversion(informes, tmp_path):
+    entrada = str(tmp_path / "informes")
+    salida = str(tmp_path / "ot")
+    os.mkdir(entrada)
+    os.mkdir(salida)
+    coste, venta = informes(carpeta=entrada)
+
+    vigilante = VigilanteCarpeta(entrada, salida, 1, espera=0.0)
+    try:
+        _espera(lambda: "900000" in vigilante.en_curso, vigilante)
+        vigilante.en_curso["900000"][-1].result()
+
+        for filename in (coste, venta):
+            _cambia_fechas(filename, "21/03/2025")
+
+        # La cache guarda el fichero que se ha generado, no el que corresponde a los informes nuevos
+
+        _espera(lambda: "900000" not in vigilante.en_curso, vigilante)
+        generado = os.path.join(salida, "900000_de_20032024_a_20032025.xlsx")
+        assert os.path.isfile(generado)
+        assert vigilante.cache.proyectos["900000"]["salida"] == generado
+
+        # Los informes nuevos se convierten en cuanto estan terminados
+
+        _espera(lambda: vigilante.convertidos == 2 and not vigilante.en_curso, vigilante)
+        nuevo = os.path.join(salida, "900000_de_20032024_a_21032025.xlsx")
+        assert vigilante.cache.proyectos["900000"]["salida"] == nuevo
+    finally:
+        vigilante.para()
+        vigilante.close()
+
+
+def _filas_materiales(filename: str) -> int:
+    libro = openpyxl.load_workbook(filename, read_only=True)
+    try:
+        return sum(1 for _ in libro["Materiales"].iter_rows(values_only=True)) - 1
+    finally:
+        libro.close()
+
+
+def test_juntar_solo_la_ultima_conversion(informes, tmp_path):
+    entrada = str(tmp_path / "informes")
+    salida = str(tmp_path / "ot")
+    os.mkdir(entrada)
+    os.mkdir(salida)
+    coste, venta = informes(carpeta=entrada)
+    informes("900001", semilla=1, carpeta=entrada)
+
+    vigilante = VigilanteCarpeta(entrada, salida, 1, juntar=True, espera=0.0)
+    try:
+        _espera(lambda: vigilante.convertidos == 2 and not vigilante.juntar_pendiente, vigilante)
+
+        # El proyecto se vuelve a exportar con otro rango de fechas: su xlsx anterior sigue en la carpeta
+
+        for filename in (coste, venta):
+            _cambia_fechas(filename, "21/03/2025")
+        _espera(lambda: vigilante.convertidos == 3 and not vigilante.juntar_pendiente, vigilante)
+    finally:
+        vigilante.para()
+        vigilante.close()
+
+    anterior = os.path.join(salida, "900000_de_20032024_a_20032025.xlsx")
+    nuevo = os.path.join(salida, "900000_de_20032024_a_21032025.xlsx")
+    otro = os.path.join(salida, "900001_de_20032024_a_20032025.xlsx")
+    assert os.path.isfile(anterior)
+
+    assert _filas_materiales(os.path.join(salida, "OT_juntadas.xlsx")) == (
+        _filas_materiales(nuevo) + _filas_materiales(otro)
+    )
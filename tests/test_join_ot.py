@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import openpyxl
+import pytest
+
+from join_ot import juntar_ficheros
+
+
+def test_juntar_con_error_no_deja_temporales(tmp_path, monkeypatch):
+
+    # Los temporales de openpyxl se crean en su propia carpeta para poder contarlos
+
+    temporales = tmp_path / "tmp"
+    temporales.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temporales))
+
+    fichero_ot = str(tmp_path / "900000_de_01012024_a_01012025.xlsx")
+    wb = openpyxl.Workbook()
+    wb.active.title = "Otra"
+    wb.save(fichero_ot)
+
+    salida = str(tmp_path / "OT_juntadas.xlsx")
+    with pytest.raises(KeyError, match="Materiales"):
+        juntar_ficheros([fichero_ot], salida, False, False)
+
+    assert os.listdir(temporales) == []
+    assert not os.path.exists(salida)
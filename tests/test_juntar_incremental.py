@@ -0,0 +1,62 @@
+import os
+import zipfile
+
+import openpyxl
+
+from join_manifest import ESTILOS, juntar_incremental
+from parse_file import convierte_proyecto, fichero_salida
+
+
+def _convierte(informes, carpeta: str, numero_ot: str, semilla: int) -> str:
+
+    # Genera los informes del proyecto y lo convierte; devuelve el fichero OT generado
+
+    coste, venta = informes(numero_ot, semilla=semilla, carpeta=os.path.join(carpeta, "informes"))
+    _, procesado, _, _, _ = convierte_proyecto(coste, venta, numero_ot, False, False, carpeta)
+    assert procesado
+    return fichero_salida(coste, venta, numero_ot, carpeta)
+
+
+def _contenido(filename: str) -> dict[str, list[tuple]]:
+    libro = openpyxl.load_workbook(filename, read_only=True)
+    try:
+        return {hoja.title: list(hoja.iter_rows(values_only=True)) for hoja in libro.worksheets}
+    finally:
+        libro.close()
+
+
+def _estilos(filename: str) -> bytes:
+    with zipfile.ZipFile(filename) as libro:
+        return libro.read(ESTILOS)
+
+
+def test_incremental_igual_que_forzado(informes, tmp_path, capsys):
+    carpeta = str(tmp_path)
+    os.mkdir(os.path.join(carpeta, "informes"))
+    juntadas = os.path.join(carpeta, "OT_juntadas.xlsx")
+    forzado = os.path.join(carpeta, "forzado.xlsx")
+
+    ficheros = [_convierte(informes, carpeta, f"90000{i}", i) for i in range(3)]
+    juntar_incremental(ficheros, juntadas, False, False)
+
+    # Un fichero OT modificado, uno nuevo y uno quitado
+
+    assert _convierte(informes, carpeta, "900001", 10) == ficheros[1]
+    ficheros = ficheros[1:] + [_convierte(informes, carpeta, "900003", 3)]
+    capsys.readouterr()
+
+    juntar_incremental(ficheros, juntadas, False, False)
+    assert "Ficheros OT nuevos o modificados: 2, quitados: 1, sin cambios: 1" in capsys.readouterr().out
+
+    juntar_incremental(ficheros, forzado, False, False, forzar=True)
+
+    contenido = _contenido(juntadas)
+    assert len(contenido["Materiales"]) > 1
+    assert contenido == _contenido(forzado)
+    assert _estilos(juntadas) == _estilos(forzado)
+
+    # Sin cambios no se vuelve a escribir
+
+    capsys.readouterr()
+    juntar_incremental(ficheros, juntadas, False, False)
+    assert "ya está al día" in capsys.readouterr().out
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from line_classifier import ClasificadorLineas, Estado, TipoLinea
+
+MATERIALES = 130
+MANO_OBRA = 70
+
+EJEMPLO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ejemplos", "230838coste.txt")
+
+
+def _lee(filename: str) -> list[str]:
+    with open(filename, "r", encoding="UTF-16LE") as file:
+        return file.readlines()
+
+
+def _por_linea(lineas: list[str]) -> list[TipoLinea]:
+    clasificador = ClasificadorLineas()
+    tipos = [clasificador.clasifica(linea, numero) for numero, linea in enumerate(lineas)]
+    assert clasificador.estado is Estado.FIN
+    return tipos
+
+
+def _por_segmentos(lineas: list[str], tamano: int) -> list[TipoLinea]:
+
+    # Como en ParseFile: por bloques de lineas, conservando el estado del clasificador entre bloques
+
+    clasificador = ClasificadorLineas()
+    tipos: list[TipoLinea] = []
+    for primera in range(0, len(lineas), tamano):
+        bloque = lineas[primera : primera + tamano]
+        for tipo, desde, hasta in clasificador.segmentos(bloque, primera):
+            tipos.extend([tipo] * (hasta - desde))
+    assert clasificador.estado is Estado.FIN
+    return tipos
+
+
+def test_secciones_del_informe_sintetico(informes):
+    fichero_coste, _ = informes(materiales=MATERIALES, mano_obra=MANO_OBRA)
+    tipos = _por_linea(_lee(fichero_coste))
+
+    assert tipos.count(TipoLinea.FILA_MATERIAL) == MATERIALES
+    assert tipos.count(TipoLinea.FILA_MANO_OBRA) == MANO_OBRA
+
+    # Las secciones van en orden y cada una tiene saltos de pagina
+
+    secciones = [
+        tipo
+        for tipo in dict.fromkeys(tipos)
+        if tipo not in (TipoLinea.EN_BLANCO, TipoLinea.CABECERA_PAGINA)
+    ]
+    assert secciones == [
+        TipoLinea.PREAMBULO,
+        TipoLinea.ENCABEZADO_MATERIALES,
+        TipoLinea.FILA_MATERIAL,
+        TipoLinea.TOTALES_MATERIALES,
+        TipoLinea.ENCABEZADO_MANO_OBRA,
+        TipoLinea.FILA_MANO_OBRA,
+        TipoLinea.TOTALES_MANO_OBRA,
+        TipoLinea.FIN,
+    ]
+    fin_materiales = tipos.index(TipoLinea.TOTALES_MATERIALES)
+    assert TipoLinea.CABECERA_PAGINA in tipos[:fin_materiales]
+    assert TipoLinea.CABECERA_PAGINA in tipos[fin_materiales:]
+
+
+@pytest.mark.parametrize("tamano", [1, 7, 64, 100_000])
+def test_segmentos_igual_que_por_linea(informes, tamano):
+    fichero_coste, _ = informes()
+    for lineas in (_lee(fichero_coste), _lee(EJEMPLO)):
+        assert _por_segmentos(lineas, tamano) == _por_linea(lineas)
+
+
+def test_encabezado_de_materiales_que_falta(informes):
+    fichero_coste, _ = informes()
+    lineas = _lee(fichero_coste)
+    inicio = lineas.index(next(linea for linea in lineas if "M A T E R I A L" in linea))
+
+    # Sin la seccion de materiales, el primer encabezado es el de mano de obra
+
+    fin = lineas.index(next(linea for linea in lineas if "M A N O   D E   O B R A" in linea))
+    clasificador = ClasificadorLineas()
+    with pytest.raises(ValueError, match="materiales"):
+        for numero, linea in enumerate(lineas[:inicio] + lineas[fin:]):
+            clasificador.clasifica(linea, numero)
+
+    # Sin ningun encabezado
+
+    clasificador = ClasificadorLineas()
+    for numero, linea in enumerate(lineas[:inicio]):
+        assert clasificador.clasifica(linea, numero) is TipoLinea.PREAMBULO
+    with pytest.raises(ValueError, match="materiales"):
+        clasificador.comprueba_fin()
+
+
+def test_informe_cortado(informes, capsys):
+    fichero_coste, _ = informes()
+    lineas = _lee(fichero_coste)
+    tipos = _por_linea(lineas)
+
+    # Cortado en medio de los materiales: faltan su final y la mano de obra
+
+    clasificador = ClasificadorLineas()
+    for numero, linea in enumerate(lineas[: tipos.index(TipoLinea.FILA_MATERIAL) + 10]):
+        clasificador.clasifica(linea, numero)
+    assert clasificador.estado is Estado.MATERIALES
+
+    clasificador.comprueba_fin()
+    salida = capsys.readouterr().out
+    assert "final de la sección de materiales" in salida
+    assert "sección de mano de obra" in salida